@@ -0,0 +1,63 @@
+import os
+import time
+import zipfile
+
+from api.storage import BlobStore, BLOB_CHUNK_SIZE
+
+# Zip archives of note groups, streamed by the download route (api/users.py) or built whole in a worker process of
+# api/jobs.py. Kept free of database and web imports so spawned workers start quickly; the blob store is pickled over
+# to the process pool in api/jobs.py
+
+# Deflate level of zip entries; like GZIP_LEVEL, level 1 gets most of the size reduction for a fraction of the CPU
+ZIP_COMPRESS_LEVEL = int(os.environ.get("ZIP_COMPRESS_LEVEL", 1))
+
+# Already compressed formats gain nothing from deflate but still cost its CPU time, they are stored as is
+STORED_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".heic", ".pdf", ".zip", ".gz", ".bz2", ".xz", ".7z", ".rar",
+    ".mp3", ".m4a", ".ogg", ".opus", ".flac", ".mp4", ".m4v", ".mov", ".webm", ".mkv", ".docx", ".xlsx", ".pptx",
+    ".epub", ".woff", ".woff2",
+}
+
+
+def zip_compress_type(file_name: str) -> int:
+    if os.path.splitext(file_name)[1].lower() in STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+# size (when known) lets zipfile decide up front whether the entry needs ZIP64 extensions
+def zip_entry(file_name: str, size: int = None) -> zipfile.ZipInfo:
+    zip_info = zipfile.ZipInfo(file_name, time.localtime()[:6])
+    zip_info.compress_type = zip_compress_type(file_name)
+    zip_info._compresslevel = ZIP_COMPRESS_LEVEL  # No public setter before Python 3.13
+    if size is not None:
+        zip_info.file_size = size
+    return zip_info
+
+
+# Copies one chunk of source into a zip entry, returns False once source is exhausted
+def copy_chunk(source, entry) -> bool:
+    chunk = source.read(BLOB_CHUNK_SIZE)
+    if not chunk:
+        return False
+    entry.write(chunk)
+    return True
+
+
+# Writes (file_name, content_hash) entries to a zip at path, returns its size in bytes
+# The archive is written next to its destination and moved into place once complete
+def build_zip_file(store: BlobStore, entries: list[tuple[str, str]], path: str) -> int:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".part"
+    try:
+        with zipfile.ZipFile(temp_path, "w") as zf:
+            for file_name, content_hash in entries:
+                with store.open(content_hash) as blob, zf.open(zip_entry(file_name), "w") as entry:
+                    while copy_chunk(blob, entry):
+                        pass
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return os.path.getsize(path)
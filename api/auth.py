@@ -0,0 +1,178 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Optional
+
+import jwt
+from fastapi import Depends, HTTPException, status
+from fastapi_users.authentication import BearerTransport, JWTStrategy
+from fastapi_users.jwt import decode_jwt, generate_jwt
+from sqlalchemy import delete, select
+
+from api.app import is_production
+from api.cache import cache
+from api.db import TokenRevocation, User, async_session_maker
+
+# Stateless authentication: access tokens carry the claims routes need (id, email, active, superuser, verified) so
+# current_active_user doesn't load the user row on every request. Tokens are revoked on logout, and all of a user's
+# older tokens are revoked when their account changes (deactivation, password, email, privileges)
+# AUTH_MODE=database restores the previous per-request user lookup; the fastapi-users routers always use the database
+JWT_SECRET = os.environ.get("JWT_SECRET", "")
+if not JWT_SECRET:
+    if is_production:
+        raise RuntimeError("JWT_SECRET must be set in production")
+    JWT_SECRET = "SECRET"  # Development only
+JWT_LIFETIME_SECONDS = int(os.environ.get("JWT_LIFETIME_SECONDS", 3600))
+USER_CACHE_TTL_SECONDS = float(os.environ.get("USER_CACHE_TTL_SECONDS", 30))
+AUTH_MODE = os.environ.get("AUTH_MODE", "stateless")
+REVOCATION_REFRESH_SECONDS = float(os.environ.get("REVOCATION_REFRESH_SECONDS", 5))
+
+bearer_transport = BearerTransport(tokenUrl="auth/jwt/login")
+
+
+# Revocations are stored in the token_revocations table, so they survive restarts and are shared by every worker,
+# and mirrored in memory so reading a token doesn't query the database. The mirror is never evicted, only expired
+# revocations are dropped; it picks up other workers' revocations every REVOCATION_REFRESH_SECONDS, the longest a
+# revoked token can still be accepted by another worker. Revocations made by this worker apply immediately
+class RevocationList:
+    # Rows are read again for this long after a refresh, in case a revocation committed later than its revoked_at
+    SYNC_GRACE_SECONDS = 60
+
+    def __init__(self):
+        self.tokens: dict[str, float] = {}  # jti -> expires at
+        self.users: dict[uuid.UUID, float] = {}  # user id -> tokens issued before this are revoked
+        self.expires_at: dict[uuid.UUID, float] = {}  # user id -> when the user's revocation can be dropped
+        self.synced_at = 0.0  # time.time() of the last refresh, 0 until the first one loads every revocation
+        self.refreshed_at: Optional[float] = None  # time.monotonic() of the last refresh
+        self.lock = asyncio.Lock()
+
+    def add(self, token_id: Optional[str], user_id: uuid.UUID, revoked_at: float, expires_at: float):
+        if token_id is not None:
+            self.tokens[token_id] = expires_at
+        elif revoked_at > self.users.get(user_id, 0):
+            self.users[user_id] = revoked_at
+            self.expires_at[user_id] = expires_at
+
+    def prune(self, now: float):
+        self.tokens = {token_id: expires_at for token_id, expires_at in self.tokens.items() if expires_at > now}
+        for user_id in [user_id for user_id, expires_at in self.expires_at.items() if expires_at <= now]:
+            del self.users[user_id], self.expires_at[user_id]
+
+    async def refresh(self):
+        if self.refreshed_at is not None and time.monotonic() - self.refreshed_at < REVOCATION_REFRESH_SECONDS:
+            return
+        async with self.lock:
+            if self.refreshed_at is not None and time.monotonic() - self.refreshed_at < REVOCATION_REFRESH_SECONDS:
+                return
+            now = time.time()
+            async with async_session_maker() as session:
+                rows = await session.execute(
+                    select(TokenRevocation.token_id, TokenRevocation.user_id, TokenRevocation.revoked_at,
+                           TokenRevocation.expires_at)
+                    .where(TokenRevocation.expires_at > now,
+                           TokenRevocation.revoked_at >= self.synced_at - self.SYNC_GRACE_SECONDS)
+                )
+                for row in rows:
+                    self.add(*row)
+            self.prune(now)
+            self.synced_at = now
+            self.refreshed_at = time.monotonic()
+
+    async def revoke(self, token_id: Optional[str], user_id: uuid.UUID, revoked_at: float, expires_at: float):
+        async with async_session_maker() as session:
+            session.add(TokenRevocation(token_id=token_id, user_id=user_id, revoked_at=revoked_at,
+                                        expires_at=expires_at))
+            await session.execute(delete(TokenRevocation).where(TokenRevocation.expires_at <= revoked_at))
+            await session.commit()
+        self.add(token_id, user_id, revoked_at, expires_at)
+
+    async def is_revoked(self, claims: dict, user_id: uuid.UUID) -> bool:
+        await self.refresh()
+        if "jti" in claims and claims["jti"] in self.tokens:
+            return True
+        return claims.get("iat", 0) < self.users.get(user_id, 0)
+
+
+revocations = RevocationList()
+
+
+def user_key(user_id: uuid.UUID) -> str:
+    return f"user:{user_id}"
+
+
+class ClaimsJWTStrategy(JWTStrategy):
+    async def write_token(self, user: User) -> str:
+        data = {
+            "sub": str(user.id), "aud": self.token_audience, "jti": uuid.uuid4().hex, "iat": time.time(),
+            "email": user.email, "active": user.is_active, "superuser": user.is_superuser, "verified": user.is_verified,
+        }
+        return generate_jwt(data, self.encode_key, self.lifetime_seconds, algorithm=self.algorithm)
+
+    # Used by the fastapi-users routers, which still load the user from the database
+    async def read_token(self, token: Optional[str], user_manager) -> Optional[User]:
+        if await self.read_claims(token) is None:
+            return None
+        return await super().read_token(token, user_manager)
+
+    async def destroy_token(self, token: str, user: User):
+        claims = await self.read_claims(token)
+        if claims is not None and "jti" in claims:
+            await revocations.revoke(claims["jti"], uuid.UUID(claims["sub"]), time.time(), claims["exp"])
+
+    # Verified, unexpired and unrevoked claims, or None
+    async def read_claims(self, token: Optional[str]) -> Optional[dict]:
+        if token is None:
+            return None
+        try:
+            claims = decode_jwt(token, self.decode_key, self.token_audience, algorithms=[self.algorithm])
+            user_id = uuid.UUID(claims["sub"])
+        except (jwt.PyJWTError, KeyError, ValueError):
+            return None
+        if await revocations.is_revoked(claims, user_id):
+            return None
+        return claims
+
+
+def get_jwt_strategy() -> ClaimsJWTStrategy:
+    return ClaimsJWTStrategy(secret=JWT_SECRET, lifetime_seconds=JWT_LIFETIME_SECONDS)
+
+
+jwt_strategy = get_jwt_strategy()
+
+
+# Revokes every token issued to the user so far, e.g. after deactivation or a password change
+async def revoke_user_tokens(user_id: uuid.UUID):
+    revoked_at = time.time()
+    await revocations.revoke(None, user_id, revoked_at, revoked_at + JWT_LIFETIME_SECONDS)
+    await cache.delete(user_key(user_id))
+
+
+# Tokens issued before claims were added only carry the user id, their user is looked up through a short-lived cache
+async def get_cached_user_claims(user_id: uuid.UUID) -> Optional[dict]:
+    cached = await cache.get(user_key(user_id))
+    if cached is not None:
+        return json.loads(cached)
+    async with async_session_maker() as session:
+        user = await session.get(User, user_id)
+        if user is None:
+            return None
+        claims = {"email": user.email, "active": user.is_active, "superuser": user.is_superuser,
+                  "verified": user.is_verified}
+    await cache.set(user_key(user_id), json.dumps(claims), USER_CACHE_TTL_SECONDS)
+    return claims
+
+
+# Detached User built from the token, enough for routes that use the id, email and flags (never add it to a session)
+async def current_token_user(token: Optional[str] = Depends(bearer_transport.scheme)) -> User:
+    claims = await jwt_strategy.read_claims(token)
+    if claims is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    user_id = uuid.UUID(claims["sub"])
+    if "active" not in claims:
+        claims = await get_cached_user_claims(user_id)
+    if claims is None or not claims["active"]:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return User(id=user_id, email=claims["email"], is_active=claims["active"], is_superuser=claims["superuser"],
+                is_verified=claims["verified"])
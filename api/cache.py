@@ -0,0 +1,119 @@
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+
+# Shared cache for hot, rarely changing lookups (community membership/ownership)
+# CACHE_URL selects the backend: empty for the in-process LRU, redis://host:port/db for a Redis compatible server
+CACHE_URL = os.environ.get("CACHE_URL", "")
+CACHE_TTL_SECONDS = float(os.environ.get("CACHE_TTL_SECONDS", 60))
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 100000))
+
+
+# Backends store string values under string keys with a TTL, mirroring GET / SET EX / DEL
+class CacheBackend(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: float):
+        ...
+
+    @abstractmethod
+    async def delete(self, *keys: str):
+        ...
+
+    @abstractmethod
+    async def clear(self):
+        ...
+
+
+class MemoryCacheBackend(CacheBackend):
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple[str, float]] = OrderedDict()  # key -> (value, expires_at)
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    async def set(self, key: str, value: str, ttl: float):
+        self.entries[key] = (value, time.monotonic() + ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)  # Evict least recently used
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self.entries.pop(key, None)
+
+    async def clear(self):
+        self.entries.clear()
+
+
+# Optional, needs the redis package (pip install redis); shares the cache between workers
+class RedisCacheBackend(CacheBackend):
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CACHE_URL points at Redis but the redis package is not installed")
+        self.client = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self.client.set(key, value, px=int(ttl * 1000))
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self.client.delete(*keys)
+
+    async def clear(self):
+        await self.client.flushdb()
+
+
+class Cache:
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str, ttl: float = None):
+        await self.backend.set(key, value, self.ttl if ttl is None else ttl)
+
+    async def delete(self, *keys: str):
+        await self.backend.delete(*keys)
+
+    async def clear(self):
+        await self.backend.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def get_cache_backend(url: str) -> CacheBackend:
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCacheBackend(url)
+    return MemoryCacheBackend(CACHE_MAX_ENTRIES)
+
+
+cache = Cache(get_cache_backend(CACHE_URL), CACHE_TTL_SECONDS)
@@ -1,88 +1,151 @@
 import os
 import uuid
-from typing import AsyncGenerator, List
+from datetime import datetime, timezone
+from typing import AsyncGenerator, List, Optional
 
+from alembic import command
+from alembic.config import Config
 from fastapi import Depends, File
 from fastapi_users.db import SQLAlchemyBaseUserTableUUID, SQLAlchemyUserDatabase
-from sqlalchemy import Column, String, UUID, ARRAY, Integer, Table, ForeignKey, LargeBinary, VARBINARY, Boolean
+from fastapi_users_db_sqlalchemy.generics import GUID
+from sqlalchemy import (
+    Column, String, UUID, ARRAY, Integer, Float, Table, ForeignKey, LargeBinary, Boolean, Index, JSON, DateTime, event,
+    inspect
+)
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
 from sqlalchemy.orm import sessionmaker, relationship, Mapped
 from sqlalchemy.sql.annotation import Annotated
 
-from api import users
 
 DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+# Plain Postgres URLs (e.g. from a hosting provider) are pointed at the asyncpg driver
+if DATABASE_URL.startswith(("postgres://", "postgresql://")):
+    DATABASE_URL = "postgresql+asyncpg://" + DATABASE_URL.split("://", 1)[1]
+
+# Connection pool settings, in-memory SQLite uses a single static connection so it takes no pool sizing
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+
 Base: DeclarativeMeta = declarative_base()
 
-engine = create_async_engine(DATABASE_URL)
+
+def get_engine_options(url: str) -> dict:
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    if ":memory:" not in url:
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+
+engine = create_async_engine(DATABASE_URL, **get_engine_options(DATABASE_URL))
 async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-session = None
+
+
+# WAL lets SQLite readers proceed while another pooled connection writes
+# SQLite only enforces foreign keys (and so ON DELETE CASCADE) when asked to, per connection
+@event.listens_for(engine.sync_engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if engine.dialect.name != "sqlite":
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+# Deleting a parent row deletes its dependents in the database (ON DELETE CASCADE): a community takes its memberships,
+# note groups and set links with it, a note group its notes, a flashcard set its cards and links, a user everything
+# they own except communities and shared notes, which are kept with the owner/author cleared (SET NULL)
+# Columns referencing user.id use the user table's GUID type so they match its storage format (dashed on SQLite)
 
 # User - Community Relationship Table
 class UserCommunityTable(Base):
     __tablename__ = "user_communities_table"
-    user_id = Column(UUID, ForeignKey("user.id"), primary_key=True)
-    community_id = Column(UUID, ForeignKey("communities.id"), primary_key=True)
+    user_id = Column(GUID, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
+    community_id = Column(UUID, ForeignKey("communities.id", ondelete="CASCADE"), primary_key=True, index=True)
 
 # User - FlashCardSet Relationship Table
 class FlashCardSetUserTable(Base):
     __tablename__ = "flashcard_sets_user_table"
-    user_id = Column(UUID, ForeignKey("user.id"), primary_key=True)
-    flashcard_set_id = Column(UUID, ForeignKey("flashcard_sets.id"), primary_key=True)
+    user_id = Column(GUID, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
+    flashcard_set_id = Column(UUID, ForeignKey("flashcard_sets.id", ondelete="CASCADE"), primary_key=True)
 
 # FlashCardSet - Community Relationship Table
 class FlashCardSetCommunityTable(Base):
     __tablename__ = "flashcard_set_community_table"
-    community_id = Column(UUID, ForeignKey("communities.id"), primary_key=True)
-    flashcard_set_id = Column(UUID, ForeignKey("flashcard_sets.id"), primary_key=True)
+    community_id = Column(UUID, ForeignKey("communities.id", ondelete="CASCADE"), primary_key=True)
+    flashcard_set_id = Column(UUID, ForeignKey("flashcard_sets.id", ondelete="CASCADE"), primary_key=True, index=True)
 
 
 class SharedNoteGroupTable(Base):
     __tablename__ = "shared_note_groups"
     id = Column(UUID, primary_key=True, index=True, default=uuid.uuid4)
-    community_id = Column(UUID, ForeignKey("communities.id"))
+    community_id = Column(UUID, ForeignKey("communities.id", ondelete="CASCADE"))
     name = Column(String, nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Bumped whenever the group's notes change
+    __table_args__ = (Index("ix_shared_note_groups_community_id_id", "community_id", "id"),)  # Keyset pagination
     def _asdict(self):  # Required to json formatting
         return {
             "id": str(self.id),
             "community_id": str(self.community_id),
             "name": self.name,
+            "version": self.version,
         }
 
+# Relationships are lazy="raise": nothing is loaded implicitly, queries that need related rows must opt in
+# with .options(selectinload(...)) / joinedload(...) so a plain Community or FlashCardSet fetch stays one row
+# passive_deletes leaves the link rows of a deleted object to the database's ON DELETE CASCADE instead of loading them
 class User(SQLAlchemyBaseUserTableUUID, Base):
-    communities = relationship("Community", secondary="user_communities_table", back_populates="members")
-    flash_card_sets = relationship("FlashCardSet", secondary="flashcard_sets_user_table", back_populates="user")
+    communities = relationship("Community", secondary="user_communities_table", back_populates="members", lazy="raise",
+                               passive_deletes=True)
+    flash_card_sets = relationship("FlashCardSet", secondary="flashcard_sets_user_table", back_populates="user",
+                                   lazy="raise", passive_deletes=True)
 
 class Community(Base):
     __tablename__ = "communities"
     id = Column(UUID, primary_key=True, index=True, default=uuid.uuid4)
     name = Column(String, index=True, nullable=False)
-    members: Mapped[List["User"]] = relationship("User", secondary="user_communities_table", back_populates="communities", lazy="selectin")
-    owner = Column(UUID, ForeignKey("user.id"))
+    members: Mapped[List["User"]] = relationship("User", secondary="user_communities_table", back_populates="communities", lazy="raise",
+                                                 passive_deletes=True)
+    owner = Column(GUID, ForeignKey("user.id", ondelete="SET NULL"))
     description = Column(String, nullable=True)
     flashcard_sets: Mapped[List["FlashCardSet"]] = relationship(
         "FlashCardSet",
         secondary="flashcard_set_community_table",
         back_populates="communities",
-        lazy="selectin"
+        lazy="raise",
+        passive_deletes=True
     )
 
 class Note(Base):
     __tablename__ = "notes"
     id = Column(UUID, primary_key=True, index=True, default=uuid.uuid4)
-    shared_id = Column(UUID, ForeignKey("shared_note_groups.id"))
-    user_id = Column(UUID, ForeignKey("user.id"))
-    content = Column(VARBINARY, nullable=False)
+    shared_id = Column(UUID, ForeignKey("shared_note_groups.id", ondelete="CASCADE"), index=True)
+    user_id = Column(GUID, ForeignKey("user.id", ondelete="SET NULL"))
+    content_hash = Column(String(64), index=True, nullable=False)  # SHA-256 key into api.storage.blob_store
+    size = Column(Integer, nullable=False)
+    mime_type = Column(String, nullable=True)
     file_name = Column(String, nullable=False)
+    def _asdict(self):  # Required to json formatting
+        return {
+            "id": str(self.id),
+            "shared_id": str(self.shared_id),
+            "file_name": self.file_name,
+            "content_hash": self.content_hash,
+            "size": self.size,
+            "mime_type": self.mime_type,
+        }
 
 class FlashCard(Base):
     __tablename__ = "flashcards"
     id = Column(UUID, primary_key=True, index=True, default=uuid.uuid4)
-    user_id = Column(UUID, ForeignKey("user.id"))
+    user_id = Column(GUID, ForeignKey("user.id", ondelete="CASCADE"))
     question = Column(String, nullable=False)
     answer = Column(String, nullable=False)
-    flashcard_set_id = Column(UUID, ForeignKey("flashcard_sets.id"))
+    flashcard_set_id = Column(UUID, ForeignKey("flashcard_sets.id", ondelete="CASCADE"), index=True)
     def _asdict(self):  # Required to json formatting
         return {
             "id": str(self.id),
@@ -93,37 +156,154 @@ class FlashCard(Base):
 class FlashCardSet(Base):
     __tablename__ = "flashcard_sets"
     id = Column(UUID, primary_key=True, index=True, default=uuid.uuid4)
-    user_id = Column(UUID, ForeignKey("user.id"))
+    user_id = Column(GUID, ForeignKey("user.id", ondelete="CASCADE"))
     name = Column(String, nullable=False)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Bumped whenever the set or its cards change
+    __table_args__ = (Index("ix_flashcard_sets_user_id_id", "user_id", "id"),)  # Keyset pagination
     communities: Mapped[List["Community"]] = relationship(
         "Community",
         secondary="flashcard_set_community_table",
         back_populates="flashcard_sets",
-        lazy="selectin"
+        lazy="raise",
+        passive_deletes=True
     )
-    user = relationship("User", secondary="flashcard_sets_user_table", back_populates="flash_card_sets", lazy="selectin")
+    user = relationship("User", secondary="flashcard_sets_user_table", back_populates="flash_card_sets", lazy="raise",
+                        passive_deletes=True)
     def _asdict(self):  # Required to json formatting
         return {
             "id": str(self.id),
             "user_id": str(self.user_id),
-            "name": self.name
+            "name": self.name,
+            "version": self.version,
         }
 
 
+# Timestamps are stored in UTC, SQLite hands them back without a timezone
+def isoformat_utc(value: Optional[datetime]) -> Optional[str]:
+    if value is None:
+        return None
+    return value.replace(tzinfo=value.tzinfo or timezone.utc).isoformat()
+
+
+# Background job (see api/jobs.py): parameters in, status and result out, polled through GET /jobs/{id}
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(UUID, primary_key=True, default=uuid.uuid4)
+    user_id = Column(GUID, ForeignKey("user.id", ondelete="CASCADE"), index=True, nullable=False)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued")  # queued -> running -> succeeded / failed
+    params = Column(JSON, nullable=False)
+    result = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    __table_args__ = (Index("ix_jobs_status_created_at", "status", "created_at"),)  # Pending jobs, expired jobs
+    def _asdict(self):  # Required to json formatting
+        return {
+            "id": str(self.id),
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": isoformat_utc(self.created_at),
+            "finished_at": isoformat_utc(self.finished_at),
+        }
+
+
+# Spaced repetition state of one card for one user (see api/study.py), created by the card's first review
+# Kept to a few integers per row: a user studying every card they can see may have hundreds of thousands of them
+class ReviewState(Base):
+    __tablename__ = "review_states"
+    user_id = Column(GUID, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
+    flashcard_id = Column(UUID, ForeignKey("flashcards.id", ondelete="CASCADE"), primary_key=True, index=True)
+    ease = Column(Integer, nullable=False)  # SM-2 ease factor in thousandths (2500 = 2.5)
+    interval = Column(Integer, nullable=False)  # Days until the next review
+    repetitions = Column(Integer, nullable=False)  # Successful reviews in a row
+    lapses = Column(Integer, nullable=False)  # Times forgotten after being learned
+    due_at = Column(DateTime(timezone=True), nullable=False)
+    reviewed_at = Column(DateTime(timezone=True), nullable=False)
+    __table_args__ = (Index("ix_review_states_user_id_due_at", "user_id", "due_at"),)  # Due cards, soonest first
+    def _asdict(self):  # Required to json formatting
+        return {
+            "flashcard_id": str(self.flashcard_id),
+            "ease": self.ease / 1000,
+            "interval": self.interval,
+            "repetitions": self.repetitions,
+            "lapses": self.lapses,
+            "due_at": isoformat_utc(self.due_at),
+            "reviewed_at": isoformat_utc(self.reviewed_at),
+        }
+
+
+# A user's changes to the scheduler parameters (api/study.py SchedulerParams), users without a row use the defaults
+class StudySettings(Base):
+    __tablename__ = "study_settings"
+    user_id = Column(GUID, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
+    interval_modifier = Column(Float, nullable=False)
+    maximum_interval = Column(Integer, nullable=False)
+
+
+# Revoked access tokens (see api/auth.py): one token by its jti on logout, or every token a user was issued before
+# revoked_at when token_id is empty. Times are Unix timestamps, compared with the tokens' iat and exp claims
+# user_id has no foreign key: deleting a user revokes their tokens after the user row is gone
+# Rows are only needed until the tokens they revoke have expired, expired rows are pruned as new ones are written
+class TokenRevocation(Base):
+    __tablename__ = "token_revocations"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    token_id = Column(String, nullable=True)
+    user_id = Column(GUID, nullable=False)
+    revoked_at = Column(Float, nullable=False, index=True)
+    expires_at = Column(Float, nullable=False, index=True)
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), "migrations")
+
+
+# Brings the schema up to date through the Alembic migrations in api/migrations
+def run_migrations(connection):
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    config.attributes["connection"] = connection
+
+    # Databases created with create_all before migrations existed match the initial revision, the original schema
+    # with note contents in notes.content. 0002 moves those into the blob store (and skips tables that already
+    # have the blob columns, from create_all runs after the blob store was added)
+    tables = inspect(connection).get_table_names()
+    if tables and "alembic_version" not in tables:
+        command.stamp(config, "0001")
+    command.upgrade(config, "head")
+
+
+# SQLite migrations run with foreign keys off: batch operations rebuild a table by copying it and dropping the
+# original, which would otherwise cascade into every table referencing it. The pragma is a no-op inside a
+# transaction, so it is switched before the migrations write anything and back on once they've committed
 async def create_db_and_tables():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    async with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            await conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        await conn.run_sync(run_migrations)
+        await conn.commit()
+        if engine.dialect.name == "sqlite":
+            await conn.exec_driver_sql("PRAGMA foreign_keys=ON")
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
-    global session
-    if session:
-        yield session
-        return
-    async with async_session_maker() as new_session:
-        session = new_session
+    async with async_session_maker() as session:
         yield session
 
+# Ends the read transaction after a user lookup so authentication doesn't pin a pooled connection for the whole request
+class UserDatabase(SQLAlchemyUserDatabase):
+    async def get(self, id):
+        user = await super().get(id)
+        await self.session.commit()
+        return user
+
+    async def get_by_email(self, email: str):
+        user = await super().get_by_email(email)
+        await self.session.commit()
+        return user
+
+
 async def get_user_db(session: AsyncSession = Depends(get_async_session)):
-    yield SQLAlchemyUserDatabase (session, User)
+    yield UserDatabase(session, User)
 
 
@@ -0,0 +1,32 @@
+from typing import Optional
+
+from fastapi import Response
+
+ETAG_HEADER = "ETag"
+# Clients may keep a copy but must revalidate it with If-None-Match before reuse
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+
+# Weak validator built from a row's version column, bumped by every write path that changes the representation
+def make_etag(resource_id, version: int) -> str:
+    return f'W/"{resource_id}-{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored on both sides
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def set_etag(response: Response, etag: str) -> Response:
+    response.headers[ETAG_HEADER] = etag
+    response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+    return response
+
+
+def not_modified(etag: str) -> Response:
+    return set_etag(Response(status_code=304), etag)
@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import select, update, delete
+
+from api import users
+from api.archive import build_zip_file
+from api.db import async_session_maker, Job, User
+from api.storage import blob_store, BLOB_STORAGE_DIR
+
+# In-process background jobs for operations too slow to run inside a request (note group zips, large deck imports,
+# bulk deletes). Routes insert a row in the jobs table and answer 202 with its id, a few worker tasks per server
+# process run the jobs from an asyncio queue and record their status and result, clients poll GET /jobs/{id}
+# CPU-bound work (zip compression) runs in a process pool so it doesn't stall the event loop for other requests
+# Jobs still queued when a server stops are picked up again at the next start, claiming a job is a conditional
+# UPDATE so with several server processes each job runs once
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))  # Jobs run concurrently per server process
+JOB_PROCESSES = int(os.environ.get("JOB_PROCESSES", 2))  # Size of the process pool for CPU-bound work
+JOB_RESULTS_DIR = os.environ.get("JOB_RESULTS_DIR", os.path.join(BLOB_STORAGE_DIR, "jobs"))
+JOB_RETENTION_SECONDS = int(os.environ.get("JOB_RETENTION_SECONDS", 24 * 3600))  # Finished or not, then deleted
+JOB_PURGE_INTERVAL_SECONDS = 3600
+
+logger = logging.getLogger("api.jobs")
+
+JobHandler = Callable[[Job, User], Awaitable[dict]]
+handlers: dict[str, JobHandler] = {}
+
+queue: Optional[asyncio.Queue] = None
+tasks: list[asyncio.Task] = []
+process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def job_handler(kind: str):
+    def register(handler: JobHandler) -> JobHandler:
+        handlers[kind] = handler
+        return handler
+    return register
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def job_result_path(job_id: uuid.UUID) -> str:
+    return os.path.join(JOB_RESULTS_DIR, f"{job_id}.zip")
+
+
+# Spawned rather than forked: the server process runs driver threads (aiosqlite) that a fork would copy mid-state
+def get_process_pool() -> ProcessPoolExecutor:
+    global process_pool
+    if process_pool is None:
+        process_pool = ProcessPoolExecutor(JOB_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    return process_pool
+
+
+# A worker process that dies (e.g. killed for memory) breaks the whole pool, the next call starts a new one
+async def run_in_process(function, *args):
+    global process_pool
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_process_pool(), function, *args)
+    except BrokenProcessPool:
+        process_pool = None
+        raise
+
+
+# ------------------------------------------------------ Submitting ------------------------------------------------------
+async def enqueue_job(user: User, kind: str, params: dict) -> Job:
+    job = Job(id=uuid.uuid4(), user_id=user.id, kind=kind, status="queued", params=params, created_at=utcnow())
+    async with async_session_maker() as session:
+        session.add(job)
+        await session.commit()
+    if queue is not None:
+        queue.put_nowait(job.id)
+    return job
+
+
+async def get_job(user: User, job_id: uuid.UUID):
+    async with async_session_maker() as session:
+        job = await session.get(Job, job_id)
+    if job is None or job.user_id != user.id:
+        return {"error": "Job not found"}
+    return job
+
+
+async def submit_note_group_zip(user: User, community_id: uuid.UUID, note_group_id: uuid.UUID):
+    access = await users.get_community_access(user.id, community_id)
+    if not access.exists:
+        return {"error": "Community not found"}
+    if not access.is_member:
+        return {"error": "User is not a member of the community"}
+    if await users.get_note_group(community_id, note_group_id) is None:
+        return {"error": "Note group not found"}
+    return await enqueue_job(user, "note_group_zip", {
+        "community_id": str(community_id), "note_group_id": str(note_group_id)
+    })
+
+
+async def submit_flashcard_import(user: User, set_name: str, flashcards: list[list[str]],
+                                  community_id: uuid.UUID = None):
+    return await enqueue_job(user, "flashcard_import", {
+        "set_name": set_name, "flashcards": flashcards, "community_id": str(community_id) if community_id else None
+    })
+
+
+async def submit_flashcard_sets_delete(user: User, flashcard_set_ids: list[uuid.UUID]):
+    return await enqueue_job(user, "flashcard_sets_delete", {
+        "flashcard_set_ids": [str(flashcard_set_id) for flashcard_set_id in flashcard_set_ids]
+    })
+
+
+# ------------------------------------------------------ Handlers ------------------------------------------------------
+# Handlers return the job's result, or an {"error": ...} dict like the functions in api/users.py to fail it
+@job_handler("note_group_zip")
+async def zip_note_group(job: Job, user: User) -> dict:
+    note_group = await users.get_note_group(uuid.UUID(job.params["community_id"]),
+                                            uuid.UUID(job.params["note_group_id"]))
+    if note_group is None:
+        return {"error": "Note group not found"}
+    entries = [(file_name, content_hash)
+               for file_name, content_hash, size in await users.get_note_entries_by_group_id(note_group.id)]
+    size = await run_in_process(build_zip_file, blob_store, entries, job_result_path(job.id))
+    return {
+        "file_name": f"{note_group.name}.zip",
+        "size": size,
+        "version": note_group.version,
+        "download": f"/jobs/{job.id}/download",
+    }
+
+
+@job_handler("flashcard_import")
+async def import_flashcard_set(job: Job, user: User) -> dict:
+    community_id = job.params["community_id"]
+    return await users.upload_flashcard_set(
+        job.params["set_name"], [tuple(flashcard) for flashcard in job.params["flashcards"]], user,
+        uuid.UUID(community_id) if community_id else None
+    )
+
+
+@job_handler("flashcard_sets_delete")
+async def delete_flashcard_sets(job: Job, user: User) -> dict:
+    return await users.delete_flashcard_sets(
+        user, [uuid.UUID(flashcard_set_id) for flashcard_set_id in job.params["flashcard_set_ids"]]
+    )
+
+
+# ------------------------------------------------------ Running ------------------------------------------------------
+async def run_job(job_id: uuid.UUID):
+    async with async_session_maker() as session:
+        claimed = await session.execute(
+            update(Job).where(Job.id == job_id, Job.status == "queued").values(status="running").returning(Job)
+        )
+        job = claimed.scalar_one_or_none()
+        await session.commit()
+    if job is None:  # Already claimed by another server process, or purged
+        return
+
+    user = await users.get_user_by_id(job.user_id)
+    try:
+        result = await handlers[job.kind](job, user)
+    except Exception:
+        logger.exception("Job %s (%s) failed", job.id, job.kind)
+        result = {"error": "Job failed"}
+    await finish_job(job.id, result)
+
+
+# Parameters are only needed until the job has run (and can be large, e.g. a whole deck)
+async def finish_job(job_id: uuid.UUID, result: dict):
+    failed = isinstance(result, dict) and bool(result.get("error"))
+    async with async_session_maker() as session:
+        await session.execute(update(Job).where(Job.id == job_id).values(
+            status="failed" if failed else "succeeded",
+            result=None if failed else result,
+            error=result["error"] if failed else None,
+            params={},
+            finished_at=utcnow(),
+        ))
+        await session.commit()
+
+
+async def job_worker():
+    while True:
+        job_id = await queue.get()
+        try:
+            await run_job(job_id)
+        except Exception:  # Keep the worker alive if the database is briefly unavailable
+            logger.exception("Job %s could not be run", job_id)
+        finally:
+            queue.task_done()
+
+
+# Jobs interrupted while running stay "running" until purged, their side effects may be partially applied
+async def purge_expired_jobs():
+    async with async_session_maker() as session:
+        expired = await session.execute(
+            delete(Job).where(Job.created_at < utcnow() - timedelta(seconds=JOB_RETENTION_SECONDS)).returning(Job.id)
+        )
+        expired_ids = expired.scalars().all()
+        await session.commit()
+    for job_id in expired_ids:
+        try:
+            os.remove(job_result_path(job_id))
+        except FileNotFoundError:
+            pass
+
+
+async def job_janitor():
+    while True:
+        try:
+            await purge_expired_jobs()
+        except Exception:
+            logger.exception("Purging expired jobs failed")
+        await asyncio.sleep(JOB_PURGE_INTERVAL_SECONDS)
+
+
+async def start_job_workers():
+    global queue
+    queue = asyncio.Queue()
+    async with async_session_maker() as session:
+        pending = await session.execute(select(Job.id).filter_by(status="queued").order_by(Job.created_at))
+        for job_id in pending.scalars():
+            queue.put_nowait(job_id)
+    tasks.extend(asyncio.create_task(job_worker()) for _ in range(JOB_WORKERS))
+    tasks.append(asyncio.create_task(job_janitor()))
+
+
+async def stop_job_workers():
+    global queue, process_pool
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    tasks.clear()
+    queue = None
+    if process_pool is not None:
+        process_pool.shutdown(cancel_futures=True)
+        process_pool = None
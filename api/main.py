@@ -1,11 +1,21 @@
 import uuid
-from fastapi import Depends, UploadFile, Form, Header
-from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional, Literal
+from fastapi import Depends, UploadFile, File, Form, Header, Response, Query
+from fastapi.responses import PlainTextResponse, FileResponse
+from pydantic import BaseModel, Field
 from starlette.middleware.cors import CORSMiddleware
 
-from api import users
+from api import users, search, jobs, study, workers
 from api.app import app
 from api.db import User
+from api.compression import CompressionMiddleware
+from api.etag import ETAG_HEADER, make_etag, etag_matches, set_etag, not_modified
+from api.metrics import MetricsMiddleware, render_metrics
+from api.pagination import (
+    PageParams, OffsetPageParams, get_page_params, get_offset_page_params, page_response, NEXT_CURSOR_HEADER
+)
+from api.responses import json_response
 from api.schemas import UserRead, UserCreate, UserUpdate
 from api.users import fastapi_users, auth_backend, get_user_by_email, current_active_user
 
@@ -22,8 +32,11 @@ app.add_middleware(
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER]
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)  # Added last so it wraps everything, including CORS preflights
 
 app.include_router(
     fastapi_users.get_auth_router(auth_backend), prefix="/auth/jwt", tags=["auth"]
@@ -64,25 +77,43 @@ async def post_community_note(community_id: uuid.UUID, group_name: str, files: l
     return response
 
 
-# Get all notes from a community
+# Get all notes from a community - paginated, the next page cursor is returned in the X-Next-Cursor header
 @app.get("/community/{community_id}/shared-notes")
-async def get_all_community_notes(community_id: uuid.UUID, user: User = Depends(current_active_user)):
-    notes = await users.get_all_community_notes(user, community_id)
-    return notes
+async def get_all_community_notes(community_id: uuid.UUID, response: Response,
+                                  page: PageParams = Depends(get_page_params),
+                                  user: User = Depends(current_active_user)):
+    notes = await users.get_all_community_notes(user, community_id, page)
+    return page_response(notes, response)
 
 
 # Get all notes from a community by group id
+# Supports If-None-Match: an unchanged group costs one lookup and returns 304 without building the zip
 @app.get("/community/{community_id}/shared-notes/{note_group_id}")
-async def get_notes_by_group_id(community_id: uuid.UUID, note_group_id: uuid.UUID):
-    notes = await users.get_notes_by_group_id(community_id, note_group_id)
-    return await users.zip_files(*notes)
+async def get_notes_by_group_id(community_id: uuid.UUID, note_group_id: uuid.UUID,
+                                if_none_match: Optional[str] = Header(None),
+                                user: User = Depends(current_active_user)):
+    access = await users.get_community_access(user.id, community_id)
+    if not access.exists:
+        return {"error": "Community not found"}
+    if not access.is_member:
+        return {"error": "User is not a member of the community"}
+    note_group = await users.get_note_group(community_id, note_group_id)
+    if note_group is None:
+        return {"error": "Note group not found"}
+    etag = make_etag(note_group.id, note_group.version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    return set_etag(users.zip_files(await users.get_note_entries_by_group_id(note_group.id), note_group.name), etag)
 
 
 # Add and Delete Notes in a community
 @app.put("/community/{community_id}/shared-notes/{file_group_id}")
-async def add_and_delete_notes(community_id: uuid.UUID, file_group_id: uuid.UUID, note_ids: list[uuid.UUID],
-                               files: list[UploadFile], user: User = Depends(current_active_user)):
-    await users.add_and_delete_notes(note_ids, files, community_id, file_group_id, user)
+async def add_and_delete_notes(community_id: uuid.UUID, file_group_id: uuid.UUID,
+                               note_ids: list[uuid.UUID] = Form([]), files: list[UploadFile] = File([]),
+                               user: User = Depends(current_active_user)):
+    result = await users.add_and_delete_notes(note_ids, files, community_id, file_group_id, user)
+    if result.get("error"):
+        return result
     return {"message": "Note edited"}
 
 
@@ -114,16 +145,51 @@ async def remove_user_from_community(community_id: uuid.UUID, user: User = Depen
 
 # Get all communities a user is in
 @app.get("/communities/user/{user_id}")
-async def get_user_communities(user_id: uuid.UUID):
-    communities = await users.get_user_communities(user_id)
-    return communities
+async def get_user_communities(user_id: uuid.UUID, response: Response, page: PageParams = Depends(get_page_params)):
+    communities = await users.get_user_communities(user_id, page)
+    return page_response(communities, response)
+
+
+# Sync a note group: send the notes you already have, get back what was added, changed or deleted
+class NoteManifestEntry(BaseModel):
+    id: uuid.UUID
+    content_hash: str
+
+
+class NoteGroupManifest(BaseModel):
+    notes: list[NoteManifestEntry] = []
+
+
+@app.post("/community/{community_id}/shared-notes/{note_group_id}/sync")
+async def sync_note_group(community_id: uuid.UUID, note_group_id: uuid.UUID, manifest: NoteGroupManifest,
+                          user: User = Depends(current_active_user)):
+    known_notes = {note.id: note.content_hash for note in manifest.notes}
+    result = await users.sync_note_group(user, community_id, note_group_id, known_notes)
+    return result
+
+
+# Download a single note
+@app.get("/communities/note/{note_id}")
+async def get_note_file(note_id: uuid.UUID, user: User = Depends(current_active_user)):
+    note = await users.get_note_file(user, note_id)
+    if isinstance(note, dict):
+        return note
+    return users.note_file_response(note)
 
 
-# Delete a note by note id
+# Delete a note by note id, from a community the user is a member of
 @app.delete("/communities/note/delete/{note_id}")
-async def delete_note_by_id(note_id: uuid.UUID):
-    await users.delete_note_by_id(note_id)
-    return {"message": "Note deleted"}
+async def delete_note_by_id(note_id: uuid.UUID, user: User = Depends(current_active_user)):
+    return await users.delete_note_by_id(user, note_id)
+
+
+class NoteIds(BaseModel):
+    note_ids: list[uuid.UUID]
+
+# Delete many notes of a community at once, note groups left empty are deleted too
+@app.post("/community/{community_id}/shared-notes/delete")
+async def delete_notes(community_id: uuid.UUID, notes: NoteIds, user: User = Depends(current_active_user)):
+    return await users.delete_notes(user, community_id, notes.note_ids)
 
 
 # ------------------------------------------------------ Misc. User Routes ------------------------------------------------------
@@ -144,6 +210,13 @@ async def get_user_info(user_email: str):
         }
 
 
+# Bootstrap for the plugin views: the user, their communities and each community's note groups and flashcard sets
+# (names, versions and counts) in one request
+@app.get("/me/dashboard")
+async def get_dashboard(user: User = Depends(current_active_user)):
+    return json_response(await users.get_dashboard(user))
+
+
 # ----------------------------------------------------- Misc. Community Management Routes ---------------------------------------------------
 # Check if user is owner of community
 @app.post("/communities/is_owner/{community_id}")
@@ -202,6 +275,15 @@ async def is_existing_community(community_id: uuid.UUID):
 #    Flashcard set implemented as list of tuples (Data type abstracted due to unknown final data type)
 # *****************************************************************************************************
 
+# Sends formatted JSON file of all FlashcardSet by a user
+# Declared before the /{flashcard_set_id} routes so "user" isn't parsed as a set id
+@app.get("/flashcards/flashcard-sets/user/{user_id}")
+async def get_flashcard_sets_by_user(response: Response, page: PageParams = Depends(get_page_params),
+                                     user: User = Depends(current_active_user)):
+    flashcard_sets = await users.get_all_flashcard_sets_from_user(user, page)
+    return page_response(flashcard_sets, response)
+
+
 # Gets flashcard set by combination of name and user_id
 @app.get("/flashcards/flashcard-sets/{flashcard_set_id}/{user_id}")
 async def get_flashcard_set_by_id(flashcard_set_id: uuid.UUID, user_id: uuid.UUID):
@@ -236,30 +318,36 @@ async def upload_flashcard_set_to_user(set_name: str, flashcards: FlashCardSetUp
 # formatted JSON file  = Formats each object with respect to its hierarchy
 #i.e Flashcard Set --> FlashCard --> attributes
 @app.get("/communities/{community_id}/flashcard-sets")
-async def get_flashcard_sets_from_community(community_id: uuid.UUID, user: User = Depends(current_active_user)):
-    flashcard_sets = await users.get_all_flashcard_sets_from_community(user, community_id)
-    return flashcard_sets
+async def get_flashcard_sets_from_community(community_id: uuid.UUID, response: Response,
+                                            page: PageParams = Depends(get_page_params),
+                                            user: User = Depends(current_active_user)):
+    flashcard_sets = await users.get_all_flashcard_sets_from_community(user, community_id, page)
+    return page_response(flashcard_sets, response)
 
 
-# Sends formatted JSON file of a FlashcardSet by ID
+# Sends formatted JSON file of a FlashcardSet by ID, to its owner and the members of communities it is shared with
+# Supports If-None-Match: an unchanged set costs one lookup and returns 304 without loading the cards
+# The version is read before the set, so a concurrent write can only make the ETag older than the body (never newer)
 @app.get("/flashcards/flashcard-sets/{flashcard_set_id}")
-async def get_flashcard_set_from_community(flashcard_set_id: uuid.UUID):
-    flashcard_set = await users.get_specified_flashcard_set(flashcard_set_id=flashcard_set_id)
-    return flashcard_set
+async def get_flashcard_set_from_community(flashcard_set_id: uuid.UUID, response: Response,
+                                           if_none_match: Optional[str] = Header(None),
+                                           user: User = Depends(current_active_user)):
+    version = await users.get_flashcard_set_version(user, flashcard_set_id)
+    if version is None:
+        return {"error": "Flashcard set not found"}
+    etag = make_etag(flashcard_set_id, version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    flashcard_set = await users.get_visible_flashcard_set(user, flashcard_set_id)
+    return json_response(flashcard_set, response)
 
 
 # Sends formatted JSON file of a FlashcardSet by Name
 @app.get("/flashcards/flashcard-sets/name/{flashcard_set_name}")
 async def get_flashcard_set_from_community_by_name(flashcard_set_name: str):
     flashcard_set = await users.get_specified_flashcard_set(flashcard_set_name=flashcard_set_name)
-    return flashcard_set
-
-
-# Sends formatted JSON file of all FlashcardSet by a user
-@app.get("/flashcards/flashcard-sets/user/{user_id}")
-async def get_flashcard_sets_by_user(user: User = Depends(current_active_user)):
-    flashcard_sets = await users.get_all_flashcard_sets_from_user(user)
-    return flashcard_sets
+    return json_response(flashcard_set)
 
 
 # Adds specified community to list of communities that can access a flashcard set - Dependent on privacy_state
@@ -280,6 +368,139 @@ async def delete_flashcard_set(flashcard_set_id: uuid.UUID, user: User = Depends
     return response
 
 
+class FlashCardSetIds(BaseModel):
+    flashcard_set_ids: list[uuid.UUID]
+
+# Deletes many of the user's flashcard sets at once, ids of sets owned by someone else are skipped
+@app.post("/flashcards/flashcard-sets/delete")
+async def delete_flashcard_sets(flashcard_sets: FlashCardSetIds, user: User = Depends(current_active_user)):
+    return await users.delete_flashcard_sets(user, flashcard_sets.flashcard_set_ids)
+
+
+# ----------------------------------------------------------- Search -----------------------------------------------------------
+# Full-text search over flashcards in your own sets and sets shared with your communities, or over notes (file names
+# and text) in your communities. Results are ranked by relevance and paginated with limit/cursor like the list routes
+@app.get("/search")
+async def search_content(q: str, response: Response, scope: Literal["flashcards", "notes"] = "flashcards",
+                         page: OffsetPageParams = Depends(get_offset_page_params),
+                         user: User = Depends(current_active_user)):
+    if scope == "notes":
+        results = await search.search_notes(user.id, q, page)
+    else:
+        results = await search.search_flashcards(user.id, q, page)
+    return page_response(results, response)
+
+
+# ----------------------------------------------------------- Study -----------------------------------------------------------
+# Spaced repetition (see api/study.py): the cards due for review soonest first, then new cards, optionally from one set
+@app.get("/study/due")
+async def get_due_cards(limit: int = Query(study.DEFAULT_DUE_LIMIT, ge=1, le=study.MAX_DUE_LIMIT),
+                        flashcard_set_id: Optional[uuid.UUID] = None, include_new: bool = True,
+                        user: User = Depends(current_active_user)):
+    return json_response(await study.get_due_cards(user, limit, flashcard_set_id, include_new))
+
+
+# grade: 0-5, below 3 the card was forgotten. reviewed_at defaults to when the batch is received
+class Review(BaseModel):
+    flashcard_id: uuid.UUID
+    grade: int = Field(ge=0, le=5)
+    reviewed_at: Optional[datetime] = None
+
+
+class ReviewBatch(BaseModel):
+    reviews: list[Review]
+
+# Records a study session's reviews at once and reschedules the cards, ids of cards the user can't see are skipped
+@app.post("/study/reviews")
+async def record_reviews(batch: ReviewBatch, user: User = Depends(current_active_user)):
+    return await study.record_reviews(
+        user, [(review.flashcard_id, review.grade, review.reviewed_at) for review in batch.reviews]
+    )
+
+
+# interval_modifier scales the intervals of learned cards (below 1 for more reviews, above 1 for fewer),
+# maximum_interval caps them, in days
+class StudySettingsUpdate(BaseModel):
+    interval_modifier: float = Field(gt=0, le=10)
+    maximum_interval: int = Field(ge=1, le=study.DEFAULT_SCHEDULER_PARAMS.maximum_interval)
+
+
+@app.get("/study/settings")
+async def get_study_settings(user: User = Depends(current_active_user)):
+    return await study.get_study_settings(user)
+
+
+# Changing the settings reschedules every card the user has reviewed, the response counts how many moved
+@app.put("/study/settings")
+async def update_study_settings(settings: StudySettingsUpdate, user: User = Depends(current_active_user)):
+    return await study.update_study_settings(user, settings.interval_modifier, settings.maximum_interval)
+
+
+# ----------------------------------------------------------- Jobs -----------------------------------------------------------
+# Slow operations run in the background (see api/jobs.py): submitting answers 202 with the job, whose Location is
+# polled until its status is "succeeded" (with a result) or "failed" (with an error)
+def accepted(job, response: Response):
+    if isinstance(job, dict):
+        return job
+    response.status_code = 202
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return job._asdict()
+
+
+# Builds a compressed zip of a note group, downloaded from the job's result.download once it succeeded
+@app.post("/jobs/note-group-zip/{community_id}/{note_group_id}")
+async def submit_note_group_zip(community_id: uuid.UUID, note_group_id: uuid.UUID, response: Response,
+                                user: User = Depends(current_active_user)):
+    return accepted(await jobs.submit_note_group_zip(user, community_id, note_group_id), response)
+
+
+# Same as the flashcard upload routes, for decks too large to import within a request
+@app.post("/jobs/flashcard-import/{set_name}")
+async def submit_flashcard_import(set_name: str, flashcards: FlashCardSetUpload, response: Response,
+                                  community_id: Optional[uuid.UUID] = None,
+                                  user: User = Depends(current_active_user)):
+    return accepted(await jobs.submit_flashcard_import(user, set_name, flashcards.flashcards, community_id), response)
+
+
+@app.post("/jobs/flashcard-sets-delete")
+async def submit_flashcard_sets_delete(flashcard_sets: FlashCardSetIds, response: Response,
+                                       user: User = Depends(current_active_user)):
+    return accepted(await jobs.submit_flashcard_sets_delete(user, flashcard_sets.flashcard_set_ids), response)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: uuid.UUID, user: User = Depends(current_active_user)):
+    job = await jobs.get_job(user, job_id)
+    if isinstance(job, dict):
+        return job
+    return job._asdict()
+
+
+@app.get("/jobs/{job_id}/download")
+async def download_job_result(job_id: uuid.UUID, user: User = Depends(current_active_user)):
+    job = await jobs.get_job(user, job_id)
+    if isinstance(job, dict):
+        return job
+    if job.kind != "note_group_zip" or job.status != "succeeded":
+        return {"error": "Job has no download"}
+    return FileResponse(jobs.job_result_path(job.id), media_type="application/x-zip-compressed",
+                        filename=job.result["file_name"])
+
+
+# ----------------------------------------------------------- Metrics -----------------------------------------------------------
+# Prometheus text format: per-route latency, SQL statements/time and bytes, plus cache and connection pool counters
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.on_event("startup")
 async def on_startup():
     await users.setup_db()
+    await jobs.start_job_workers()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await jobs.stop_job_workers()
+    workers.shutdown_workers()
@@ -0,0 +1,179 @@
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event
+
+from api.cache import cache
+from api.db import engine
+
+# Request metrics in the Prometheus text format, served on /metrics
+# Per route: latency, SQL statements and SQL time per request, request/response bytes
+# Queries longer than SLOW_QUERY_MS (disabled when 0) are logged with their SQL, parameters are left out on purpose
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 0))
+slow_query_logger = logging.getLogger("api.slow_query")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+UNMATCHED_ROUTE = "unmatched"  # 404s share one label so random paths can't blow up the series count
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+@dataclass
+class RouteMetrics:
+    latency: Histogram
+    queries: Histogram
+    query_seconds: Histogram
+    bytes_in: int = 0
+    bytes_out: int = 0
+
+
+@dataclass
+class RequestStats:
+    request: str  # Method and path, for the slow query log
+    route: str = UNMATCHED_ROUTE  # Only filled in once the request finished
+    queries: int = 0
+    query_seconds: float = 0.0
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+route_metrics: dict[tuple[str, str, int], RouteMetrics] = {}
+totals = {"queries": 0, "query_seconds": 0.0, "slow_queries": 0}
+
+
+# ------------------------------------------------------ SQL ------------------------------------------------------
+# Engine events run in the greenlet of the awaiting task, so the request's contextvar is visible here
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_times"].pop()
+    totals["queries"] += 1
+    totals["query_seconds"] += elapsed
+
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += elapsed
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        totals["slow_queries"] += 1
+        slow_query_logger.warning("%.1fms %s %s", elapsed * 1000, stats.request if stats else "-", " ".join(statement.split()))
+
+
+# ------------------------------------------------------ HTTP ------------------------------------------------------
+# Plain ASGI middleware (not BaseHTTPMiddleware) so streamed responses such as zips are measured until the last chunk
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(f"{scope['method']} {scope['path']}")
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        status = 500
+        bytes_in = 0
+        bytes_out = 0
+
+        async def counting_receive():
+            nonlocal bytes_in
+            message = await receive()
+            if message["type"] == "http.request":
+                bytes_in += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status, bytes_out
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                bytes_out += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            current_request.reset(token)
+            route = scope.get("route")  # Set by FastAPI once the path matched
+            if route is not None:
+                stats.route = route.path
+            metrics = get_route_metrics(scope["method"], stats.route, status)
+            metrics.latency.observe(time.perf_counter() - start)
+            metrics.queries.observe(stats.queries)
+            metrics.query_seconds.observe(stats.query_seconds)
+            metrics.bytes_in += bytes_in
+            metrics.bytes_out += bytes_out
+
+
+def get_route_metrics(method: str, route: str, status: int) -> RouteMetrics:
+    key = (method, route, status)
+    if key not in route_metrics:
+        route_metrics[key] = RouteMetrics(Histogram(LATENCY_BUCKETS), Histogram(QUERY_COUNT_BUCKETS),
+                                          Histogram(LATENCY_BUCKETS))
+    return route_metrics[key]
+
+
+# ------------------------------------------------------ Exposition ------------------------------------------------------
+# Each family is one block, its TYPE line followed by the samples of every route, as the text format requires
+def render_metrics() -> str:
+    routes = [(f'method="{method}",route="{route}",status="{status}"', metrics)
+              for (method, route, status), metrics in sorted(route_metrics.items())]
+    lines = []
+    for name, histogram in (("http_request_duration_seconds", "latency"), ("http_request_db_queries", "queries"),
+                            ("http_request_db_seconds", "query_seconds")):
+        lines.append(f"# TYPE {name} histogram")
+        for labels, metrics in routes:
+            lines += getattr(metrics, histogram).render(name, labels)
+    for name, counter in (("http_request_bytes_total", "bytes_in"), ("http_response_bytes_total", "bytes_out")):
+        lines.append(f"# TYPE {name} counter")
+        lines += [f"{name}{{{labels}}} {getattr(metrics, counter)}" for labels, metrics in routes]
+
+    cache_stats = cache.stats()
+    lines += [
+        "# TYPE db_queries_total counter",
+        f"db_queries_total {totals['queries']}",
+        "# TYPE db_query_seconds_total counter",
+        f"db_query_seconds_total {totals['query_seconds']}",
+        "# TYPE db_slow_queries_total counter",
+        f"db_slow_queries_total {totals['slow_queries']}",
+        "# TYPE cache_hits_total counter",
+        f"cache_hits_total {cache_stats['hits']}",
+        "# TYPE cache_misses_total counter",
+        f"cache_misses_total {cache_stats['misses']}",
+    ]
+    checked_out = getattr(engine.pool, "checkedout", None)
+    if checked_out is not None:
+        lines += ["# TYPE db_pool_checked_out gauge", f"db_pool_checked_out {checked_out()}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,63 @@
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from api.db import Base, DATABASE_URL
+from api.search import SEARCH_TABLES, SEARCH_COLUMNS, SEARCH_INDEXES
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+# Search tables/columns are maintained by hand (FTS5 and tsvector have no model equivalent), keep autogenerate off them
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == "table":
+        return not name.startswith(SEARCH_TABLES)
+    if type_ == "column":
+        return name not in SEARCH_COLUMNS
+    if type_ == "index":
+        return name not in SEARCH_INDEXES
+    return True
+
+
+def run_migrations_offline():
+    context.configure(url=DATABASE_URL, target_metadata=target_metadata, literal_binds=True, render_as_batch=True,
+                      include_object=include_object)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection):
+    # Batch mode lets ALTER-style operations work on SQLite by recreating the table
+    # SQLite reflects UUID columns as NUMERIC, so type comparison would only produce noise there
+    context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=True,
+                      compare_type=connection.dialect.name != "sqlite", include_object=include_object)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations():
+    engine = create_async_engine(DATABASE_URL)
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await engine.dispose()
+
+
+# create_db_and_tables passes its own connection in, the alembic CLI connects from DATABASE_URL
+def run_migrations_online():
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        do_run_migrations(connection)
+    else:
+        asyncio.run(run_async_migrations())
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,86 @@
+"""note blob storage
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+
+"""
+import mimetypes
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from api.storage import blob_store
+
+
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+notes = sa.table(
+    "notes", sa.column("id", sa.UUID()), sa.column("file_name", sa.String()), sa.column("content", sa.VARBINARY()),
+    sa.column("content_hash", sa.String()), sa.column("size", sa.Integer()), sa.column("mime_type", sa.String())
+)
+
+
+def note_columns() -> set[str]:
+    return {column["name"] for column in sa.inspect(op.get_bind()).get_columns("notes")}
+
+
+# SQLite reflects the UUID columns as NUMERIC, whose affinity could turn ids that look like numbers into numbers
+# while the table is rebuilt, so the rebuilt table declares them (and their foreign keys) explicitly
+def reflect_args() -> list[sa.Column]:
+    return [
+        sa.Column("id", sa.UUID(), primary_key=True),
+        sa.Column("shared_id", sa.UUID(), sa.ForeignKey("shared_note_groups.id")),
+        sa.Column("user_id", sa.UUID(), sa.ForeignKey("user.id")),
+    ]
+
+
+# Note files move from the notes.content column of the initial schema into the content-addressed blob store
+# (api/storage.py), one row at a time so large files aren't all held in memory. Databases created with create_all
+# after the blob store was added, but before migrations existed, already have the blob columns and are skipped
+def upgrade() -> None:
+    if "content" not in note_columns():
+        return
+    bind = op.get_bind()
+    with op.batch_alter_table("notes") as batch_op:
+        batch_op.add_column(sa.Column("content_hash", sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column("size", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("mime_type", sa.String(), nullable=True))
+
+    for note_id in bind.execute(sa.select(notes.c.id)).scalars().all():
+        file_name, content = bind.execute(
+            sa.select(notes.c.file_name, notes.c.content).where(notes.c.id == note_id)
+        ).one()
+        bind.execute(notes.update().where(notes.c.id == note_id).values(
+            content_hash=blob_store.put(content), size=len(content), mime_type=mimetypes.guess_type(file_name)[0]
+        ))
+
+    with op.batch_alter_table("notes", recreate="always", reflect_args=reflect_args()) as batch_op:
+        batch_op.alter_column("content_hash", existing_type=sa.String(length=64), nullable=False)
+        batch_op.alter_column("size", existing_type=sa.Integer(), nullable=False)
+        batch_op.drop_column("content")
+        batch_op.create_index(batch_op.f("ix_notes_content_hash"), ["content_hash"], unique=False)
+
+
+# The contents are copied back out of the blob store, the blobs themselves are left in place
+def downgrade() -> None:
+    bind = op.get_bind()
+    with op.batch_alter_table("notes") as batch_op:
+        batch_op.add_column(sa.Column("content", sa.VARBINARY(), nullable=True))
+
+    for note_id in bind.execute(sa.select(notes.c.id)).scalars().all():
+        content_hash = bind.execute(sa.select(notes.c.content_hash).where(notes.c.id == note_id)).scalar_one()
+        with blob_store.open(content_hash) as blob:
+            bind.execute(notes.update().where(notes.c.id == note_id).values(content=blob.read()))
+
+    with op.batch_alter_table("notes", recreate="always", reflect_args=reflect_args()) as batch_op:
+        batch_op.alter_column("content", existing_type=sa.VARBINARY(), nullable=False)
+        batch_op.drop_index(batch_op.f("ix_notes_content_hash"))
+        batch_op.drop_column("mime_type")
+        batch_op.drop_column("size")
+        batch_op.drop_column("content_hash")
@@ -0,0 +1,36 @@
+"""foreign key indexes
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import fastapi_users_db_sqlalchemy
+
+
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_flashcard_set_community_table_flashcard_set_id'), 'flashcard_set_community_table', ['flashcard_set_id'], unique=False)
+    op.create_index(op.f('ix_flashcard_sets_user_id'), 'flashcard_sets', ['user_id'], unique=False)
+    op.create_index(op.f('ix_flashcards_flashcard_set_id'), 'flashcards', ['flashcard_set_id'], unique=False)
+    op.create_index(op.f('ix_notes_shared_id'), 'notes', ['shared_id'], unique=False)
+    op.create_index(op.f('ix_shared_note_groups_community_id'), 'shared_note_groups', ['community_id'], unique=False)
+    op.create_index(op.f('ix_user_communities_table_community_id'), 'user_communities_table', ['community_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_user_communities_table_community_id'), table_name='user_communities_table')
+    op.drop_index(op.f('ix_shared_note_groups_community_id'), table_name='shared_note_groups')
+    op.drop_index(op.f('ix_notes_shared_id'), table_name='notes')
+    op.drop_index(op.f('ix_flashcards_flashcard_set_id'), table_name='flashcards')
+    op.drop_index(op.f('ix_flashcard_sets_user_id'), table_name='flashcard_sets')
+    op.drop_index(op.f('ix_flashcard_set_community_table_flashcard_set_id'), table_name='flashcard_set_community_table')
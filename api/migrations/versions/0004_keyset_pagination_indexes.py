@@ -0,0 +1,33 @@
+"""keyset pagination indexes
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (parent, id) indexes serve both the foreign key lookups and WHERE parent = ? AND id > ? ORDER BY id,
+# so they replace the single column indexes from 0003
+def upgrade() -> None:
+    op.create_index('ix_shared_note_groups_community_id_id', 'shared_note_groups', ['community_id', 'id'], unique=False)
+    op.create_index('ix_flashcard_sets_user_id_id', 'flashcard_sets', ['user_id', 'id'], unique=False)
+    op.drop_index('ix_shared_note_groups_community_id', table_name='shared_note_groups')
+    op.drop_index('ix_flashcard_sets_user_id', table_name='flashcard_sets')
+
+
+def downgrade() -> None:
+    op.create_index('ix_flashcard_sets_user_id', 'flashcard_sets', ['user_id'], unique=False)
+    op.create_index('ix_shared_note_groups_community_id', 'shared_note_groups', ['community_id'], unique=False)
+    op.drop_index('ix_flashcard_sets_user_id_id', table_name='flashcard_sets')
+    op.drop_index('ix_shared_note_groups_community_id_id', table_name='shared_note_groups')
@@ -0,0 +1,58 @@
+"""full text search
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Search structures aren't part of the models (see api/search.py), so they are written by hand per dialect
+# Existing notes are indexed by file name only, their contents are indexed when they're next uploaded
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(
+            "ALTER TABLE flashcards ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+            "(to_tsvector('simple', coalesce(question, '') || ' ' || coalesce(answer, ''))) STORED"
+        )
+        op.execute("CREATE INDEX ix_flashcards_search_vector ON flashcards USING gin (search_vector)")
+        op.execute(
+            "CREATE TABLE note_search ("
+            "note_id uuid PRIMARY KEY REFERENCES notes (id), "
+            "file_name varchar, "
+            "content text, "
+            "document tsvector GENERATED ALWAYS AS "
+            "(to_tsvector('simple', coalesce(file_name, '') || ' ' || coalesce(content, ''))) STORED)"
+        )
+        op.execute("CREATE INDEX ix_note_search_document ON note_search USING gin (document)")
+        op.execute("INSERT INTO note_search (note_id, file_name, content) SELECT id, file_name, '' FROM notes")
+    else:
+        op.execute(
+            "CREATE VIRTUAL TABLE flashcards_fts USING fts5("
+            "question, answer, content='flashcards', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute("INSERT INTO flashcards_fts (flashcards_fts) VALUES ('rebuild')")
+        op.execute(
+            "CREATE VIRTUAL TABLE notes_fts USING fts5(file_name, content, tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute("INSERT INTO notes_fts (rowid, file_name, content) SELECT rowid, file_name, '' FROM notes")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP TABLE note_search")
+        op.execute("DROP INDEX ix_flashcards_search_vector")
+        op.execute("ALTER TABLE flashcards DROP COLUMN search_vector")
+    else:
+        op.execute("DROP TABLE notes_fts")
+        op.execute("DROP TABLE flashcards_fts")
@@ -0,0 +1,168 @@
+"""cascade deletes
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import fastapi_users_db_sqlalchemy
+import sqlalchemy as sa
+
+
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (table, column, referred table, ON DELETE action)
+FOREIGN_KEYS = [
+    ("communities", "owner", "user", "SET NULL"),
+    ("flashcard_sets", "user_id", "user", "CASCADE"),
+    ("flashcard_set_community_table", "community_id", "communities", "CASCADE"),
+    ("flashcard_set_community_table", "flashcard_set_id", "flashcard_sets", "CASCADE"),
+    ("flashcard_sets_user_table", "user_id", "user", "CASCADE"),
+    ("flashcard_sets_user_table", "flashcard_set_id", "flashcard_sets", "CASCADE"),
+    ("flashcards", "user_id", "user", "CASCADE"),
+    ("flashcards", "flashcard_set_id", "flashcard_sets", "CASCADE"),
+    ("shared_note_groups", "community_id", "communities", "CASCADE"),
+    ("user_communities_table", "user_id", "user", "CASCADE"),
+    ("user_communities_table", "community_id", "communities", "CASCADE"),
+    ("notes", "shared_id", "shared_note_groups", "CASCADE"),
+    ("notes", "user_id", "user", "SET NULL"),
+]
+def fk_name(table: str, column: str, referred: str) -> str:
+    return f"fk_{table}_{column}_{referred}"
+
+
+def tables():
+    return list(dict.fromkeys(table for table, *_ in FOREIGN_KEYS))
+
+
+# SQLite reflects the UUID columns as NUMERIC, so the rebuilt tables declare them explicitly: UUID, or the user
+# table's GUID for user references. Retyping through alter_column would copy the data with a CAST, which under
+# NUMERIC affinity turns hex ids into numbers. The existing foreign keys are declared under their convention names
+# so they can be dropped
+def reflect_args(table: str, user_type) -> list[sa.Column]:
+    inspector = sa.inspect(op.get_bind())
+    primary_key = inspector.get_pk_constraint(table)["constrained_columns"]
+    foreign_keys = {column: referred for fk_table, column, referred, _ in FOREIGN_KEYS if fk_table == table}
+    columns = []
+    for column in inspector.get_columns(table):
+        name = column["name"]
+        if name in foreign_keys:
+            referred = foreign_keys[name]
+            columns.append(sa.Column(
+                name, user_type if referred == "user" else sa.UUID(),
+                sa.ForeignKey(f"{referred}.id", name=fk_name(table, name, referred)),
+                primary_key=name in primary_key
+            ))
+        elif isinstance(column["type"], sa.Numeric):
+            columns.append(sa.Column(name, sa.UUID(), primary_key=name in primary_key))
+    return columns
+
+
+# Postgres named the original constraints {table}_{column}_fkey and already enforced them, so only the ON DELETE
+# actions change. SQLite never enforced them: rows left behind by earlier deletes are removed (or their user cleared)
+# first, and user references written in the UUID hex format are rewritten in the dashed format of user.id
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        for table, column, referred, ondelete in FOREIGN_KEYS:
+            op.drop_constraint(f"{table}_{column}_fkey", table, type_="foreignkey")
+            op.create_foreign_key(fk_name(table, column, referred), table, referred, [column], ["id"],
+                                  ondelete=ondelete)
+        op.drop_constraint("note_search_note_id_fkey", "note_search", type_="foreignkey")
+        op.create_foreign_key("fk_note_search_note_id_notes", "note_search", "notes", ["note_id"], ["id"],
+                              ondelete="CASCADE")
+        return
+
+    for table, column, referred, ondelete in FOREIGN_KEYS:
+        if referred == "user":
+            op.execute(
+                f"UPDATE {table} SET {column} = lower(substr({column}, 1, 8) || '-' || substr({column}, 9, 4) || '-' "
+                f"|| substr({column}, 13, 4) || '-' || substr({column}, 17, 4) || '-' || substr({column}, 21)) "
+                f"WHERE length({column}) = 32"
+            )
+    # Parents before children, so rows orphaned by an earlier cleanup step are caught by a later one
+    for table, column, referred, ondelete in FOREIGN_KEYS:
+        orphaned = f"{column} IS NOT NULL AND {column} NOT IN (SELECT id FROM \"{referred}\")"
+        if ondelete == "SET NULL":
+            op.execute(f"UPDATE {table} SET {column} = NULL WHERE {orphaned}")
+        else:
+            op.execute(f"DELETE FROM {table} WHERE {orphaned}")
+
+    # Rebuilding notes renumbers its rowids, which key notes_fts, so the index is carried across by note id
+    op.execute(
+        "CREATE TEMP TABLE notes_fts_backup AS SELECT notes.id AS note_id, notes_fts.file_name, notes_fts.content "
+        "FROM notes_fts JOIN notes ON notes.rowid = notes_fts.rowid"
+    )
+    for table in tables():
+        with op.batch_alter_table(table, recreate="always",
+                                  reflect_args=reflect_args(table, fastapi_users_db_sqlalchemy.generics.GUID())) as batch_op:
+            for fk_table, column, referred, ondelete in FOREIGN_KEYS:
+                if fk_table != table:
+                    continue
+                batch_op.drop_constraint(fk_name(table, column, referred), type_="foreignkey")
+                batch_op.create_foreign_key(fk_name(table, column, referred), referred, [column], ["id"],
+                                            ondelete=ondelete)
+
+    op.execute("INSERT INTO flashcards_fts (flashcards_fts) VALUES ('rebuild')")
+    op.execute("DELETE FROM notes_fts")
+    op.execute(
+        "INSERT INTO notes_fts (rowid, file_name, content) SELECT notes.rowid, notes_fts_backup.file_name, "
+        "notes_fts_backup.content FROM notes_fts_backup JOIN notes ON notes.id = notes_fts_backup.note_id"
+    )
+    op.execute("DROP TABLE notes_fts_backup")
+    create_sqlite_search_triggers()
+
+
+# Rows deleted by a cascade never pass through the application, so the FTS5 tables drop them in triggers
+# (external content flashcards_fts needs the old values to remove a row)
+def create_sqlite_search_triggers():
+    op.execute(
+        "CREATE TRIGGER flashcards_fts_delete AFTER DELETE ON flashcards BEGIN "
+        "INSERT INTO flashcards_fts (flashcards_fts, rowid, question, answer) "
+        "VALUES ('delete', old.rowid, old.question, old.answer); END"
+    )
+    op.execute(
+        "CREATE TRIGGER notes_fts_delete AFTER DELETE ON notes BEGIN "
+        "DELETE FROM notes_fts WHERE rowid = old.rowid; END"
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_constraint("fk_note_search_note_id_notes", "note_search", type_="foreignkey")
+        op.create_foreign_key("note_search_note_id_fkey", "note_search", "notes", ["note_id"], ["id"])
+        for table, column, referred, ondelete in FOREIGN_KEYS:
+            op.drop_constraint(fk_name(table, column, referred), table, type_="foreignkey")
+            op.create_foreign_key(f"{table}_{column}_fkey", table, referred, [column], ["id"])
+        return
+
+    op.execute("DROP TRIGGER flashcards_fts_delete")
+    op.execute("DROP TRIGGER notes_fts_delete")
+    op.execute(
+        "CREATE TEMP TABLE notes_fts_backup AS SELECT notes.id AS note_id, notes_fts.file_name, notes_fts.content "
+        "FROM notes_fts JOIN notes ON notes.rowid = notes_fts.rowid"
+    )
+    for table in tables():
+        with op.batch_alter_table(table, recreate="always", reflect_args=reflect_args(table, sa.UUID())) as batch_op:
+            for fk_table, column, referred, ondelete in FOREIGN_KEYS:
+                if fk_table != table:
+                    continue
+                batch_op.drop_constraint(fk_name(table, column, referred), type_="foreignkey")
+                batch_op.create_foreign_key(fk_name(table, column, referred), referred, [column], ["id"])
+    for table, column, referred, ondelete in FOREIGN_KEYS:
+        if referred == "user":
+            op.execute(f"UPDATE {table} SET {column} = replace({column}, '-', '') WHERE length({column}) = 36")
+
+    op.execute("INSERT INTO flashcards_fts (flashcards_fts) VALUES ('rebuild')")
+    op.execute("DELETE FROM notes_fts")
+    op.execute(
+        "INSERT INTO notes_fts (rowid, file_name, content) SELECT notes.rowid, notes_fts_backup.file_name, "
+        "notes_fts_backup.content FROM notes_fts_backup JOIN notes ON notes.id = notes_fts_backup.note_id"
+    )
+    op.execute("DROP TABLE notes_fts_backup")
@@ -0,0 +1,46 @@
+"""review states
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import fastapi_users_db_sqlalchemy
+
+
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('review_states',
+    sa.Column('user_id', fastapi_users_db_sqlalchemy.generics.GUID(), nullable=False),
+    sa.Column('flashcard_id', sa.UUID(), nullable=False),
+    sa.Column('ease', sa.Integer(), nullable=False),
+    sa.Column('interval', sa.Integer(), nullable=False),
+    sa.Column('repetitions', sa.Integer(), nullable=False),
+    sa.Column('lapses', sa.Integer(), nullable=False),
+    sa.Column('due_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('reviewed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['flashcard_id'], ['flashcards.id'], name='fk_review_states_flashcard_id_flashcards',
+                            ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_review_states_user_id_user', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'flashcard_id')
+    )
+    with op.batch_alter_table('review_states', schema=None) as batch_op:
+        batch_op.create_index('ix_review_states_user_id_due_at', ['user_id', 'due_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_review_states_flashcard_id'), ['flashcard_id'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('review_states', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_review_states_flashcard_id'))
+        batch_op.drop_index('ix_review_states_user_id_due_at')
+
+    op.drop_table('review_states')
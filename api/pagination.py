@@ -0,0 +1,105 @@
+import base64
+import binascii
+import uuid
+from dataclasses import dataclass
+from typing import Optional, Callable
+
+from fastapi import Query, HTTPException, Response
+
+from api.responses import json_response
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+# Cursors are the last returned id, base64 encoded so clients treat them as opaque
+def encode_cursor(last_id: uuid.UUID) -> str:
+    return base64.urlsafe_b64encode(last_id.bytes).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> uuid.UUID:
+    try:
+        return uuid.UUID(bytes=base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+@dataclass
+class Page:
+    items: list
+    next_cursor: Optional[str]
+
+
+# Keyset pagination over a unique, indexed id column: WHERE id > :after ORDER BY id LIMIT :limit + 1
+@dataclass(frozen=True)
+class PageParams:
+    limit: int = DEFAULT_PAGE_SIZE
+    after: Optional[uuid.UUID] = None
+
+    def apply(self, statement, column):
+        if self.after is not None:
+            statement = statement.where(column > self.after)
+        return statement.order_by(column).limit(self.limit + 1)  # One extra row tells us if there's a next page
+
+    def page(self, items: list, key: Callable) -> Page:
+        if len(items) <= self.limit:
+            return Page(items, None)
+        items = items[:self.limit]
+        return Page(items, encode_cursor(key(items[-1])))
+
+
+# Ranked results (e.g. search) have no stable key to seek from, their cursor is the opaque offset of the next page
+@dataclass(frozen=True)
+class OffsetPageParams:
+    limit: int = DEFAULT_PAGE_SIZE
+    offset: int = 0
+
+    def apply(self, statement):
+        return statement.offset(self.offset).limit(self.limit + 1)
+
+    def page(self, items: list) -> Page:
+        if len(items) <= self.limit:
+            return Page(items, None)
+        return Page(items[:self.limit], encode_offset_cursor(self.offset + self.limit))
+
+
+def encode_offset_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"offset:{offset}".encode()).rstrip(b"=").decode()
+
+
+def decode_offset_cursor(cursor: str) -> int:
+    try:
+        prefix, offset = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        if prefix != "offset" or int(offset) < 0:
+            raise ValueError
+        return int(offset)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def get_page_params(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    if not cursor:
+        return PageParams(limit)
+    try:
+        return PageParams(limit, decode_cursor(cursor))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def get_offset_page_params(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    if not cursor:
+        return OffsetPageParams(limit)
+    try:
+        return OffsetPageParams(limit, decode_offset_cursor(cursor))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# List routes keep returning a plain JSON list, the cursor for the next page travels in a header
+def page_response(result, response: Response):
+    if not isinstance(result, Page):
+        return result
+    if result.next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = result.next_cursor
+    return json_response(result.items, response)
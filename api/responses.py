@@ -0,0 +1,16 @@
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+
+
+# For large payloads (card lists, note group listings): orjson serializes dicts, UUIDs and datetimes natively,
+# skipping FastAPI's jsonable_encoder pass over every value
+# FastAPI doesn't copy headers set on an injected Response onto a returned one, so they are passed along here
+def json_response(content, response: Response = None) -> ORJSONResponse:
+    json = ORJSONResponse(content)
+    if response is not None:
+        for name, value in response.headers.items():
+            if name != "content-length":
+                json.headers.append(name, value)
+        if response.status_code:
+            json.status_code = response.status_code
+    return json
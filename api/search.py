@@ -0,0 +1,218 @@
+import os
+import re
+
+from sqlalchemy import select, insert, delete, table, column, literal_column, bindparam, func, or_, UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.db import (
+    engine, async_session_maker, FlashCard, FlashCardSet, FlashCardSetCommunityTable, Note, SharedNoteGroupTable,
+    UserCommunityTable
+)
+from api.pagination import OffsetPageParams
+from api.storage import blob_store
+from api.workers import run_blocking
+
+# Full-text search over flashcards and shared notes
+# SQLite: FTS5 tables keyed by the rowid of the indexed row - flashcards_fts reads its text from flashcards
+# (external content), notes_fts stores note file names and extracted text
+# Postgres: a generated tsvector column on flashcards and a note_search side table, both with GIN indexes
+# The tables are created in migration 0006. Inserts are indexed by the write paths in api/users.py, deletes (including
+# cascades) are removed by the database: delete triggers on SQLite (migration 0007), ON DELETE CASCADE on note_search
+IS_POSTGRES = engine.dialect.name == "postgresql"
+SEARCH_TABLES = ("flashcards_fts", "notes_fts", "note_search")
+SEARCH_COLUMNS = ("search_vector",)
+SEARCH_INDEXES = ("ix_flashcards_search_vector", "ix_note_search_document")
+
+# Only the start of large notes is indexed
+MAX_INDEXED_NOTE_BYTES = int(os.environ.get("MAX_INDEXED_NOTE_BYTES", 1024 * 1024))
+TEXT_MIME_TYPES = {"application/json", "application/xml", "application/x-yaml"}
+TEXT_EXTENSIONS = {".md", ".markdown", ".txt", ".csv", ".json", ".canvas", ".yaml", ".yml", ".html", ".xml"}
+MAX_QUERY_TERMS = 16
+
+flashcards_fts = table("flashcards_fts", column("flashcards_fts"), column("rowid"), column("question"),
+                       column("answer"))
+notes_fts = table("notes_fts", column("notes_fts"), column("rowid"), column("file_name"), column("content"))
+note_search = table("note_search", column("note_id", UUID), column("file_name"), column("content"),
+                    column("document"))
+flashcard_rowid = literal_column("flashcards.rowid")
+note_rowid = literal_column("notes.rowid")
+
+
+# ------------------------------------------------------ Indexing ------------------------------------------------------
+# Called inside the writer's transaction so the index commits (or rolls back) together with the rows
+async def index_flashcard_set(session: AsyncSession, flashcard_set_id):
+    if IS_POSTGRES:  # search_vector is a generated column
+        return
+    await session.execute(insert(flashcards_fts).from_select(
+        ["rowid", "question", "answer"],
+        select(flashcard_rowid, FlashCard.question, FlashCard.answer).where(FlashCard.flashcard_set_id == flashcard_set_id)
+    ))
+
+
+# Notes must be flushed first so their ids (and rowids) exist
+async def index_notes(session: AsyncSession, notes: list[Note]):
+    if not notes:
+        return
+    contents = await run_blocking(extract_notes_text, notes)
+    rows = [{"note_id": note.id, "file_name": note.file_name, "content": content}
+            for note, content in zip(notes, contents)]
+    if IS_POSTGRES:
+        await session.execute(insert(note_search), rows)
+        return
+    await session.execute(insert(notes_fts).from_select(
+        ["rowid", "file_name", "content"],
+        select(note_rowid, bindparam("file_name"), bindparam("content")).where(Note.id == bindparam("note_id"))
+    ), rows)
+
+
+def is_text_note(note: Note) -> bool:
+    if note.mime_type and (note.mime_type.startswith("text/") or note.mime_type in TEXT_MIME_TYPES):
+        return True
+    return os.path.splitext(note.file_name or "")[1].lower() in TEXT_EXTENSIONS
+
+
+def extract_note_text(note: Note) -> str:
+    if not is_text_note(note):
+        return ""
+    with blob_store.open(note.content_hash) as blob:
+        return blob.read(MAX_INDEXED_NOTE_BYTES).decode("utf-8", errors="ignore")
+
+
+# Runs on a worker thread: the notes' columns are already loaded, so no lazy load touches the session from there
+def extract_notes_text(notes: list[Note]) -> list[str]:
+    return [extract_note_text(note) for note in notes]
+
+
+# ------------------------------------------------------ Queries ------------------------------------------------------
+# User input is reduced to plain words so it can't inject query syntax; every word must match, the last one as a
+# prefix so results show up while the user is still typing
+def parse_query(query: str) -> list[str]:
+    return re.findall(r"\w+", query.lower())[:MAX_QUERY_TERMS]
+
+
+def fts5_query(terms: list[str]) -> str:
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+
+def ts_query(terms: list[str]):
+    return func.to_tsquery("simple", " & ".join(terms) + ":*")
+
+
+def member_community_ids(user_id):
+    return select(UserCommunityTable.community_id).where(UserCommunityTable.user_id == user_id)
+
+
+# Own sets plus sets shared with any community the user belongs to
+def visible_flashcard_sets(user_id):
+    return or_(
+        FlashCardSet.user_id == user_id,
+        FlashCardSet.id.in_(
+            select(FlashCardSetCommunityTable.flashcard_set_id)
+            .where(FlashCardSetCommunityTable.community_id.in_(member_community_ids(user_id)))
+        )
+    )
+
+
+async def search_flashcards(user_id, query: str, page: OffsetPageParams = OffsetPageParams()):
+    terms = parse_query(query)
+    if not terms:
+        return {"error": "Search query must contain at least one word"}
+
+    statement = select(FlashCard.id, FlashCard.flashcard_set_id, FlashCard.question, FlashCard.answer,
+                       FlashCardSet.name.label("flashcard_set_name"))
+    if IS_POSTGRES:
+        search_vector = literal_column("flashcards.search_vector")
+        statement = (
+            statement.join(FlashCardSet, FlashCardSet.id == FlashCard.flashcard_set_id)
+            .where(search_vector.op("@@")(ts_query(terms)))
+            .order_by(func.ts_rank(search_vector, ts_query(terms)).desc())
+        )
+    else:
+        statement = (
+            statement.select_from(flashcards_fts)
+            .join(FlashCard, flashcard_rowid == flashcards_fts.c.rowid)
+            .join(FlashCardSet, FlashCardSet.id == FlashCard.flashcard_set_id)
+            .where(flashcards_fts.c.flashcards_fts.op("MATCH")(fts5_query(terms)))
+            .order_by(func.bm25(literal_column("flashcards_fts")))  # Calling bm25() directly beats ORDER BY rank here
+        )
+
+    async with async_session_maker() as session:
+        results = await session.execute(page.apply(statement.where(visible_flashcard_sets(user_id))))
+        return page.page([{
+            "type": "flashcard",
+            "id": str(result.id),
+            "flashcard_set_id": str(result.flashcard_set_id),
+            "flashcard_set_name": result.flashcard_set_name,
+            "question": result.question,
+            "answer": result.answer,
+        } for result in results])
+
+
+async def search_notes(user_id, query: str, page: OffsetPageParams = OffsetPageParams()):
+    terms = parse_query(query)
+    if not terms:
+        return {"error": "Search query must contain at least one word"}
+
+    statement = select(Note.id, Note.shared_id, Note.file_name, SharedNoteGroupTable.community_id,
+                       SharedNoteGroupTable.name.label("note_group_name"))
+    if IS_POSTGRES:
+        statement = (
+            statement.add_columns(func.ts_headline(
+                "simple", note_search.c.content, ts_query(terms), "MaxWords=24, MinWords=8"
+            ).label("snippet"))
+            .select_from(note_search)
+            .join(Note, Note.id == note_search.c.note_id)
+            .where(note_search.c.document.op("@@")(ts_query(terms)))
+            .order_by(func.ts_rank(note_search.c.document, ts_query(terms)).desc())
+        )
+    else:
+        statement = (
+            statement.add_columns(func.snippet(literal_column("notes_fts"), 1, "[", "]", "...", 16).label("snippet"))
+            .select_from(notes_fts)
+            .join(Note, note_rowid == notes_fts.c.rowid)
+            .where(notes_fts.c.notes_fts.op("MATCH")(fts5_query(terms)))
+            .order_by(func.bm25(literal_column("notes_fts")))
+        )
+    statement = (
+        statement.join(SharedNoteGroupTable, SharedNoteGroupTable.id == Note.shared_id)
+        .where(SharedNoteGroupTable.community_id.in_(member_community_ids(user_id)))
+    )
+
+    async with async_session_maker() as session:
+        results = await session.execute(page.apply(statement))
+        return page.page([{
+            "type": "note",
+            "id": str(result.id),
+            "shared_id": str(result.shared_id),
+            "file_name": result.file_name,
+            "community_id": str(result.community_id),
+            "note_group_name": result.note_group_name,
+            "snippet": result.snippet,
+        } for result in results])
+
+
+# ------------------------------------------------------ Maintenance ------------------------------------------------------
+# Rebuilds both indexes from scratch, e.g. to index the contents of notes uploaded before search existed
+# SQLite keys the FTS tables by rowid, which VACUUM or a table rebuild may renumber - run this afterwards (a migration
+# rebuilding flashcards or notes must also recreate their delete triggers, see migration 0007)
+async def rebuild_search_index(batch_size: int = 500):
+    async with async_session_maker() as session:
+        if IS_POSTGRES:
+            await session.execute(delete(note_search))
+        else:
+            await session.execute(insert(flashcards_fts).values(flashcards_fts="rebuild"))
+            await session.execute(delete(notes_fts))
+
+        notes = await session.stream_scalars(select(Note).execution_options(yield_per=batch_size))
+        async for batch in notes.partitions():
+            await index_notes(session, batch)
+        await session.commit()
+
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("Usage: python -m api.search rebuild")
+    asyncio.run(rebuild_search_index())
@@ -0,0 +1,169 @@
+import hashlib
+import os
+import tempfile
+import uuid
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Optional
+
+BLOB_STORAGE_DIR = os.environ.get("BLOB_STORAGE_DIR", "./blobs")
+BLOB_CHUNK_SIZE = 1024 * 1024
+
+# Upload limits in bytes, enforced while files are read so oversized uploads are rejected before being stored
+MAX_NOTE_FILE_SIZE = int(os.environ.get("MAX_NOTE_FILE_SIZE", 50 * 1024 * 1024))
+MAX_NOTE_REQUEST_SIZE = int(os.environ.get("MAX_NOTE_REQUEST_SIZE", 500 * 1024 * 1024))
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+# Content-addressed storage for note files, blobs are keyed by the SHA-256 hex digest of their content
+# Backends implement the abstract methods, path() is optional for zero-copy file responses
+class BlobStore(ABC):
+    @abstractmethod
+    def writer(self) -> "BlobWriter":
+        ...
+
+    @abstractmethod
+    def open(self, content_hash: str) -> BinaryIO:
+        ...
+
+    @abstractmethod
+    def exists(self, content_hash: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, content_hash: str):
+        ...
+
+    # Deleting in two steps, so a blob that turns out to be referenced after all can be put back (see
+    # delete_unreferenced_blobs in api/users.py): detach() moves it out of the store and returns a handle for
+    # restore() or discard(), or None if there was no such blob
+    @abstractmethod
+    def detach(self, content_hash: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def restore(self, content_hash: str, detached: str):
+        ...
+
+    @abstractmethod
+    def discard(self, detached: str):
+        ...
+
+    def path(self, content_hash: str) -> Optional[str]:
+        return None
+
+    def put(self, data: bytes) -> str:
+        writer = self.writer()
+        writer.write(data)
+        content_hash = writer.commit()[0]
+        writer.release()
+        return content_hash
+
+
+# Receives a blob chunk by chunk, hashing as it goes; commit() returns (content_hash, newly_created)
+# release() is called once the rows referencing the blob are committed (or have failed to be): until then, the
+# blob may be deleted as unreferenced, so a writer whose content was already stored keeps its copy to put it back
+class BlobWriter(ABC):
+    def __init__(self):
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self.hash.update(chunk)
+        self.size += len(chunk)
+
+    @abstractmethod
+    def commit(self) -> tuple[str, bool]:
+        ...
+
+    def release(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+class LocalBlobWriter(BlobWriter):
+    def __init__(self, store: "LocalBlobStore"):
+        super().__init__()
+        self.store = store
+        os.makedirs(store.root, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(dir=store.root, suffix=".part")
+        self.file = os.fdopen(fd, "wb")
+        self.kept_hash: Optional[str] = None  # Set while the copy of an already stored blob is kept
+
+    def write(self, chunk: bytes):
+        super().write(chunk)
+        self.file.write(chunk)
+
+    def commit(self) -> tuple[str, bool]:
+        self.file.close()
+        content_hash = self.hash.hexdigest()
+        path = self.store.path(content_hash)
+        if os.path.exists(path):  # Same content already stored (possibly by another community)
+            self.kept_hash = content_hash
+            return content_hash, False
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(self.temp_path, path)
+        return content_hash, True
+
+    def release(self):
+        if self.kept_hash is None:
+            return
+        path = self.store.path(self.kept_hash)
+        self.kept_hash = None
+        if os.path.exists(path):
+            os.remove(self.temp_path)
+        else:  # Deleted since commit()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self.temp_path, path)
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, content_hash: str) -> str:
+        return os.path.join(self.root, content_hash[:2], content_hash[2:4], content_hash)
+
+    def writer(self) -> LocalBlobWriter:
+        return LocalBlobWriter(self)
+
+    def open(self, content_hash: str) -> BinaryIO:
+        return open(self.path(content_hash), "rb")
+
+    def exists(self, content_hash: str) -> bool:
+        return os.path.exists(self.path(content_hash))
+
+    def delete(self, content_hash: str):
+        try:
+            os.remove(self.path(content_hash))
+        except FileNotFoundError:
+            pass
+
+    def detach(self, content_hash: str) -> Optional[str]:
+        detached = f"{self.path(content_hash)}.{uuid.uuid4().hex}.detached"
+        try:
+            os.replace(self.path(content_hash), detached)
+        except FileNotFoundError:
+            return None
+        return detached
+
+    def restore(self, content_hash: str, detached: str):
+        os.replace(detached, self.path(content_hash))
+
+    def discard(self, detached: str):
+        os.remove(detached)
+
+
+blob_store: BlobStore = LocalBlobStore(BLOB_STORAGE_DIR)
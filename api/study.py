@@ -0,0 +1,281 @@
+import uuid
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import select, update, exists
+from sqlalchemy.dialects import postgresql, sqlite
+
+from api.db import async_session_maker, engine, FlashCard, FlashCardSet, ReviewState, StudySettings, User
+from api.search import visible_flashcard_sets
+
+try:  # Optional (pip install numpy), rescheduling loops over the states in Python without it
+    import numpy as np
+except ImportError:
+    np = None
+
+# Spaced repetition over the flashcards a user can see (their own sets and sets shared with their communities)
+# Each review grades how well a card was remembered and reschedules it with SM-2: the interval grows by the card's
+# ease factor while it is remembered, and restarts while the ease drops when it is forgotten. A card's state
+# (review_states) is created by its first review, until then it is a new card
+IS_POSTGRES = engine.dialect.name == "postgresql"
+DEFAULT_DUE_LIMIT = 50
+MAX_DUE_LIMIT = 500
+MAX_REVIEWS_PER_BATCH = 1000
+
+# Grades are SM-2's 0-5 scale, below PASSING_GRADE the card was forgotten
+PASSING_GRADE = 3
+# Change of the ease factor (in thousandths) per grade, SM-2's 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02)
+EASE_CHANGES = {5: 100, 4: 0, 3: -140, 2: -320, 1: -540, 0: -800}
+STATE_COLUMNS = ("ease", "interval", "repetitions", "lapses", "due_at", "reviewed_at")
+
+
+@dataclass(frozen=True)
+class SchedulerParams:
+    initial_ease: int = 2500
+    minimum_ease: int = 1300
+    learning_intervals: tuple[int, ...] = (1, 6)  # Days after the first successful reviews, before the ease applies
+    interval_modifier: float = 1.0  # Scales the intervals after learning: below 1 for more reviews, above for fewer
+    maximum_interval: int = 36500
+
+
+DEFAULT_SCHEDULER_PARAMS = SchedulerParams()
+SETTINGS_COLUMNS = ("interval_modifier", "maximum_interval")  # The parameters users can change
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# Naive timestamps from clients are taken as UTC
+def as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+# ------------------------------------------------------ Scheduling ------------------------------------------------------
+# Takes the card's current state (None for a new card) and returns its state after the review
+def schedule(state: Optional[dict], grade: int, reviewed_at: datetime,
+             params: SchedulerParams = DEFAULT_SCHEDULER_PARAMS) -> dict:
+    ease = state["ease"] if state else params.initial_ease
+    interval = state["interval"] if state else 0
+    repetitions = state["repetitions"] if state else 0
+    lapses = state["lapses"] if state else 0
+
+    if grade < PASSING_GRADE:
+        if repetitions:
+            lapses += 1
+        repetitions = 0
+        interval = params.learning_intervals[0]
+    else:
+        repetitions += 1
+        if repetitions <= len(params.learning_intervals):
+            interval = params.learning_intervals[repetitions - 1]
+        else:
+            interval = round(interval * ease / 1000 * params.interval_modifier)
+        interval = min(max(interval, 1), params.maximum_interval)
+    ease = max(params.minimum_ease, ease + EASE_CHANGES[grade])
+
+    return {
+        "ease": ease,
+        "interval": interval,
+        "repetitions": repetitions,
+        "lapses": lapses,
+        "due_at": reviewed_at + timedelta(days=interval),
+        "reviewed_at": reviewed_at,
+    }
+
+
+# ------------------------------------------------------ Studying ------------------------------------------------------
+def study_card(flashcard_id, flashcard_set_id, question: str, answer: str, state: Optional[ReviewState]) -> dict:
+    return {
+        "id": str(flashcard_id),
+        "flashcard_set_id": str(flashcard_set_id),
+        "question": question,
+        "answer": answer,
+        "review": state._asdict() if state else None,
+    }
+
+
+# The cards due for review soonest first (an index range scan on user_id, due_at), then as many new cards as fit
+# Cards of sets the user can no longer see keep their state but aren't returned
+async def get_due_cards(user: User, limit: int = DEFAULT_DUE_LIMIT, flashcard_set_id: uuid.UUID = None,
+                        include_new: bool = True) -> list[dict]:
+    criteria = [visible_flashcard_sets(user.id)]
+    if flashcard_set_id is not None:
+        criteria.append(FlashCardSet.id == flashcard_set_id)
+
+    async with async_session_maker() as session:
+        due = await session.execute(
+            select(ReviewState, FlashCard.flashcard_set_id, FlashCard.question, FlashCard.answer)
+            .join(FlashCard, FlashCard.id == ReviewState.flashcard_id)
+            .join(FlashCardSet, FlashCardSet.id == FlashCard.flashcard_set_id)
+            .where(ReviewState.user_id == user.id, ReviewState.due_at <= utcnow(), *criteria)
+            .order_by(ReviewState.due_at)
+            .limit(limit)
+        )
+        cards = [study_card(state.flashcard_id, flashcard_set_id, question, answer, state)
+                 for state, flashcard_set_id, question, answer in due]
+        if not include_new or len(cards) >= limit:
+            return cards
+
+        new = await session.execute(
+            select(FlashCard.id, FlashCard.flashcard_set_id, FlashCard.question, FlashCard.answer)
+            .join(FlashCardSet, FlashCardSet.id == FlashCard.flashcard_set_id)
+            .where(~exists().where(ReviewState.user_id == user.id, ReviewState.flashcard_id == FlashCard.id),
+                   *criteria)
+            .order_by(FlashCard.flashcard_set_id, FlashCard.id)
+            .limit(limit - len(cards))
+        )
+        cards.extend(study_card(*card, None) for card in new)
+        return cards
+
+
+# Applies a batch of (flashcard id, grade, reviewed at) reviews, e.g. a whole study session sent at once, in one
+# transaction: one query checks which cards the user can see, one loads their states (and one the user's scheduler
+# parameters) and one upsert writes them back
+# Reviews are applied in the order they happened, so a card reviewed twice in the batch is rescheduled twice
+async def record_reviews(user: User, reviews: list[tuple[uuid.UUID, int, Optional[datetime]]]):
+    if len(reviews) > MAX_REVIEWS_PER_BATCH:
+        return {"error": f"At most {MAX_REVIEWS_PER_BATCH} reviews can be recorded at once"}
+    if not reviews:
+        return {"message": "Reviews recorded", "recorded": 0, "skipped": []}
+
+    now = utcnow()
+    reviews = sorted(
+        ((flashcard_id, grade, min(as_utc(reviewed_at), now) if reviewed_at else now)
+         for flashcard_id, grade, reviewed_at in reviews),
+        key=lambda review: review[2]
+    )
+    flashcard_ids = {flashcard_id for flashcard_id, _, _ in reviews}
+
+    async with async_session_maker() as session:
+        visible = await session.execute(
+            select(FlashCard.id).join(FlashCardSet, FlashCardSet.id == FlashCard.flashcard_set_id)
+            .where(FlashCard.id.in_(flashcard_ids), visible_flashcard_sets(user.id))
+        )
+        visible_ids = set(visible.scalars())
+        current = await session.execute(
+            select(ReviewState.flashcard_id, ReviewState.ease, ReviewState.interval, ReviewState.repetitions,
+                   ReviewState.lapses)
+            .where(ReviewState.user_id == user.id, ReviewState.flashcard_id.in_(visible_ids))
+        )
+        states = {row.flashcard_id: row._asdict() for row in current}
+        params = await load_scheduler_params(session, user.id)
+
+        recorded = 0
+        rescheduled = {}
+        for flashcard_id, grade, reviewed_at in reviews:
+            if flashcard_id in visible_ids:
+                state = rescheduled.get(flashcard_id) or states.get(flashcard_id)
+                rescheduled[flashcard_id] = schedule(state, grade, reviewed_at, params)
+                recorded += 1
+        if rescheduled:
+            await session.execute(upsert_review_states(), [
+                {"user_id": user.id, "flashcard_id": flashcard_id, **state}
+                for flashcard_id, state in rescheduled.items()
+            ])
+        await session.commit()
+
+    return {
+        "message": "Reviews recorded",
+        "recorded": recorded,
+        "skipped": [str(flashcard_id) for flashcard_id in flashcard_ids - visible_ids],
+    }
+
+
+# INSERT ... ON CONFLICT (user_id, flashcard_id) DO UPDATE, same syntax on SQLite and Postgres
+def upsert_review_states():
+    statement = (postgresql.insert if IS_POSTGRES else sqlite.insert)(ReviewState)
+    return statement.on_conflict_do_update(
+        index_elements=[ReviewState.user_id, ReviewState.flashcard_id],
+        set_={column: statement.excluded[column] for column in STATE_COLUMNS}
+    )
+
+
+# ------------------------------------------------------ Settings ------------------------------------------------------
+async def load_scheduler_params(session, user_id) -> SchedulerParams:
+    settings = await session.get(StudySettings, user_id)
+    if settings is None:
+        return DEFAULT_SCHEDULER_PARAMS
+    return replace(DEFAULT_SCHEDULER_PARAMS, **{column: getattr(settings, column) for column in SETTINGS_COLUMNS})
+
+
+def settings_dict(params: SchedulerParams) -> dict:
+    return {column: getattr(params, column) for column in SETTINGS_COLUMNS}
+
+
+async def get_study_settings(user: User) -> dict:
+    async with async_session_maker() as session:
+        return settings_dict(await load_scheduler_params(session, user.id))
+
+
+# Saves the user's parameters and reschedules every card they have reviewed with them, in the same transaction
+async def update_study_settings(user: User, interval_modifier: float, maximum_interval: int) -> dict:
+    async with async_session_maker() as session:
+        old = await load_scheduler_params(session, user.id)
+        new = replace(old, interval_modifier=interval_modifier, maximum_interval=maximum_interval)
+        await session.merge(StudySettings(user_id=user.id, **settings_dict(new)))
+        rescheduled = await reschedule_review_states(session, user.id, old, new)
+        await session.commit()
+    return {**settings_dict(new), "rescheduled": rescheduled}
+
+
+# ------------------------------------------------------ Rescheduling ------------------------------------------------------
+# The interval a card would have had under the new parameters: cards past the learning steps are scaled by the change
+# of interval modifier and capped by the new maximum interval, cards still learning keep their fixed step
+def rescale_interval(interval: int, repetitions: int, old: SchedulerParams, new: SchedulerParams) -> int:
+    if repetitions <= len(new.learning_intervals):
+        return interval
+    return min(max(round(interval * (new.interval_modifier / old.interval_modifier)), 1), new.maximum_interval)
+
+
+# rescale_interval over whole columns (np.rint rounds halves to even like round())
+def rescale_intervals(intervals, repetitions, old: SchedulerParams, new: SchedulerParams):
+    scaled = np.clip(np.rint(intervals * (new.interval_modifier / old.interval_modifier)), 1, new.maximum_interval)
+    return np.where(repetitions > len(new.learning_intervals), scaled.astype(intervals.dtype), intervals)
+
+
+# SQLite hands timestamps back naive (in UTC), Postgres aware; numpy datetimes have no timezone
+def to_datetime64(values: list[datetime]):
+    if IS_POSTGRES:
+        values = [value.astimezone(timezone.utc).replace(tzinfo=None) for value in values]
+    return np.array(values, dtype="datetime64[us]")
+
+
+def from_datetime64(values) -> list[datetime]:
+    return [value.replace(tzinfo=timezone.utc) for value in values.astype("datetime64[us]").tolist()]
+
+
+# Loads the user's review states as columns, recomputes the intervals and due dates of them all at once and writes the
+# changed ones back in one bulk UPDATE (executemany by primary key). Returns the number of rescheduled cards
+async def reschedule_review_states(session, user_id, old: SchedulerParams, new: SchedulerParams) -> int:
+    states = (await session.execute(
+        select(ReviewState.flashcard_id, ReviewState.interval, ReviewState.repetitions, ReviewState.reviewed_at)
+        .where(ReviewState.user_id == user_id)
+    )).all()
+    if not states:
+        return 0
+    flashcard_ids, intervals, repetitions, reviewed_at = zip(*states)
+
+    if np is None:
+        changes = [
+            (flashcard_id, new_interval, as_utc(reviewed) + timedelta(days=new_interval))
+            for flashcard_id, interval, repetition, reviewed in states
+            if (new_interval := rescale_interval(interval, repetition, old, new)) != interval
+        ]
+    else:
+        intervals = np.array(intervals, dtype=np.int64)
+        new_intervals = rescale_intervals(intervals, np.array(repetitions, dtype=np.int64), old, new)
+        changed = np.flatnonzero(new_intervals != intervals)
+        due_at = to_datetime64([reviewed_at[i] for i in changed]) + new_intervals[changed].astype("timedelta64[D]")
+        changes = zip([flashcard_ids[i] for i in changed], new_intervals[changed].tolist(), from_datetime64(due_at))
+
+    rows = [
+        {"user_id": user_id, "flashcard_id": flashcard_id, "interval": interval, "due_at": due_at}
+        for flashcard_id, interval, due_at in changes
+    ]
+    if rows:
+        await session.execute(update(ReviewState), rows)
+    return len(rows)
@@ -1,19 +1,33 @@
 import asyncio
 import contextlib
 import io
+import mimetypes
 import uuid
 import zipfile
+from dataclasses import dataclass
 from typing import Optional
 
-from fastapi import Depends, Request, UploadFile, Response
+from fastapi import Depends, Request, UploadFile
+from fastapi.responses import StreamingResponse, FileResponse
 from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin
-from fastapi_users.authentication import AuthenticationBackend, BearerTransport, JWTStrategy
+from fastapi_users.authentication import AuthenticationBackend
 from fastapi_users.db import SQLAlchemyUserDatabase
 from fastapi_users.exceptions import UserAlreadyExists
-from sqlalchemy import select, delete, and_
+from sqlalchemy import select, insert, delete, update, and_, func, exists
 
 from api.app import is_production
+from api.archive import zip_entry, copy_chunk
+from api.auth import (
+    AUTH_MODE, JWT_SECRET, bearer_transport, current_token_user, get_jwt_strategy, revoke_user_tokens
+)
+from api.cache import cache
+from api.pagination import Page, PageParams
 from api.schemas import UserCreate
+from api.search import index_flashcard_set, index_notes, member_community_ids, visible_flashcard_sets
+from api.storage import (
+    blob_store, BlobWriter, BLOB_CHUNK_SIZE, MAX_NOTE_FILE_SIZE, MAX_NOTE_REQUEST_SIZE, UploadTooLargeError
+)
+from api.workers import run_blocking
 from api.db import (
     User, get_user_db, create_db_and_tables, async_session_maker, get_async_session,
     Community, UserCommunityTable, Note, SharedNoteGroupTable, FlashCard, FlashCardSet, FlashCardSetCommunityTable,
@@ -25,27 +39,25 @@ async def get_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_user_db
     yield UserManager(user_db)
 
 
-def get_jwt_strategy() -> JWTStrategy:
-    return JWTStrategy(secret=SECRET, lifetime_seconds=3600)
-
-
-SECRET = "SECRET"
-bearer_transport = BearerTransport(tokenUrl="auth/jwt/login")
 auth_backend = AuthenticationBackend(
     name="jwt",
     transport=bearer_transport,
     get_strategy=get_jwt_strategy,
 )
 fastapi_users = FastAPIUsers[User, uuid.UUID](get_user_manager, [auth_backend])
-current_active_user = fastapi_users.current_user(active=True)
+# Stateless by default: verifies the token's claims instead of loading the user row (see api/auth.py)
+current_active_user = current_token_user if AUTH_MODE == "stateless" else fastapi_users.current_user(active=True)
 get_async_session_context = contextlib.asynccontextmanager(get_async_session)
 get_user_db_context = contextlib.asynccontextmanager(get_user_db)
 get_user_manager_context = contextlib.asynccontextmanager(get_user_manager)
 
 
+REVOKING_UPDATES = {"email", "password", "is_active", "is_superuser"}
+
+
 class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
-    reset_password_token_secret = SECRET
-    verification_token_secret = SECRET
+    reset_password_token_secret = JWT_SECRET
+    verification_token_secret = JWT_SECRET
 
     async def on_after_register(self, user: User, request: Optional[Request] = None):
         print(f"User {user.id} has registered.")
@@ -60,6 +72,18 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     ):
         print(f"Verification requested for user {user.id}. Verification token: {token}")
 
+    async def on_after_update(self, user: User, update_dict: dict, request: Optional[Request] = None):
+        if "email" in update_dict:  # The owner's email is part of every flashcard set response
+            await bump_flashcard_set_versions(FlashCardSet.user_id == user.id)
+        if REVOKING_UPDATES & update_dict.keys():  # Tokens carry these as claims
+            await revoke_user_tokens(user.id)
+
+    async def on_after_reset_password(self, user: User, request: Optional[Request] = None):
+        await revoke_user_tokens(user.id)
+
+    async def on_after_delete(self, user: User, request: Optional[Request] = None):
+        await revoke_user_tokens(user.id)
+
 
 # ------------------------------------------------------ User Management ------------------------------------------------------
 
@@ -91,37 +115,36 @@ async def create_community(community_name: str, user: User):
         new_community = Community(name=community_name, owner=user.id)
         session.add(new_community)
         await session.commit()
-        await session.refresh(new_community)
-        await add_user_to_community(user, new_community.id)
 
+    await cache.delete(community_owner_key(new_community.id))
+    await add_user_to_community(user, new_community.id)
     return {"Community Created": new_community.id}
 
 
 async def add_user_to_community(user: User, community_id: uuid.UUID):
-    async with get_async_session_context() as session:
-
-        if not await is_existing_community(community_id):
-            return {"error": "Community not found"}
-
-        if not await is_community_member(user.id, community_id):
-            return {"error": "User is already a member"}
+    access = await get_community_access(user.id, community_id)
+    if not access.exists:
+        return {"error": "Community not found"}
+    if access.is_member:
+        return {"error": "User is already a member"}
 
-        community = await session.get(Community, community_id)
+    async with get_async_session_context() as session:
         user_community = UserCommunityTable(user_id=user.id, community_id=community_id)
         session.add(user_community)
         await session.commit()
 
-        return {"message": f"User {user.email} joined the community"}
+    await cache.delete(community_member_key(user.id, community_id))
+    return {"message": f"User {user.email} joined the community"}
 
 
 async def remove_user_from_community(user_id: uuid.UUID, community_id: uuid.UUID):
-    async with get_async_session_context() as session:
-
-        if not await is_existing_community(community_id):
-            return {"error": "Community not found"}
-        if not await is_community_member(user_id, community_id):
-            return {"error": "User is not a member of the community"}
+    access = await get_community_access(user_id, community_id)
+    if not access.exists:
+        return {"error": "Community not found"}
+    if not access.is_member:
+        return {"error": "User is not a member of the community"}
 
+    async with get_async_session_context() as session:
         stmt = delete(UserCommunityTable).where(and_(
             UserCommunityTable.user_id == user_id,
             UserCommunityTable.community_id == community_id
@@ -129,159 +152,326 @@ async def remove_user_from_community(user_id: uuid.UUID, community_id: uuid.UUID
         )
         await session.execute(stmt)
         await session.commit()
-        return {"message": "User removed from community"}
+
+    await cache.delete(community_member_key(user_id, community_id))
+    return {"message": "User removed from community"}
 
 
 # ------------------------------------------------------ Community Misc. Options ------------------------------------------------------
 async def update_community_name(user: User, community_id: uuid.UUID, new_name: str):
-    async with get_async_session_context() as session:
-
-        if not await is_existing_community(community_id):
-            return {"error": "Community not found"}
-        if not await is_community_owner(user, community_id):
-            return {"error": "User is not the owner of the community"}
+    access = await get_community_access(user.id, community_id)
+    if not access.exists:
+        return {"error": "Community not found"}
+    if not access.is_owner:
+        return {"error": "User is not the owner of the community"}
 
-        community = await session.get(Community, community_id)
-        community.name = new_name
+    async with get_async_session_context() as session:
+        await session.execute(update(Community).filter_by(id=community_id).values(name=new_name))
         await session.commit()
         return {"message": "Community name changed"}
 
 
 async def update_community_description(user: User, community_id: uuid.UUID, description: str):
-    async with get_async_session_context() as session:
-
-        if not await is_existing_community(community_id):
-            return {"error": "Community not found"}
-        if not await is_community_owner(user, community_id):
-            return {"error": "User is not the owner of the community"}
+    access = await get_community_access(user.id, community_id)
+    if not access.exists:
+        return {"error": "Community not found"}
+    if not access.is_owner:
+        return {"error": "User is not the owner of the community"}
 
-        community = await session.get(Community, community_id)
-        community.description = description
+    async with get_async_session_context() as session:
+        await session.execute(update(Community).filter_by(id=community_id).values(description=description))
         await session.commit()
         return {"message": "Community description changed"}
 
 
 async def update_community_owner(user: User, community_id: uuid.UUID, new_owner_id: uuid.UUID):
-    async with get_async_session_context() as session:
-
-        if not await is_existing_community(community_id):
-            return {"error": "Community not found"}
-        if not await is_community_owner(user, community_id):
-            return {"error": "User is not the owner of the community"}
+    access = await get_community_access(user.id, community_id)
+    if not access.exists:
+        return {"error": "Community not found"}
+    if not access.is_owner:
+        return {"error": "User is not the owner of the community"}
+    if not (await get_community_access(new_owner_id, community_id)).is_member:
+        return {"error": "New owner is not a member of the community"}
 
-        new_owner_user = get_user_by_id(new_owner_id)
-        if not await is_community_member(new_owner_user, community_id):
-            return {"error": "New owner is not a member of the community"}
-
-        community = await session.get(Community, community_id)
-        community.owner = new_owner_id
+    async with get_async_session_context() as session:
+        await session.execute(update(Community).filter_by(id=community_id).values(owner=new_owner_id))
         await session.commit()
-        return {"message": "Community owner changed"}
+
+    await cache.delete(community_owner_key(community_id))
+    return {"message": "Community owner changed"}
 
 
 # ------------------------------------------------------ Notes Functions ------------------------------------------------------
 
 async def post_community_note(user: User, community_id: uuid.UUID, note: list[UploadFile], group_name: str):
-    async with get_async_session_context() as session:
+    access = await get_community_access(user.id, community_id)
+    if not access.exists:
+        return {"error": "Community not found"}
+    if not access.is_member:
+        return {"error": "User is not a member of the community"}
 
-        if not await is_existing_community(community_id):
-            return {"error": "Community not found"}
-        if not await is_community_member(user.id, community_id):
-            return {"error": "User is not a member of the community"}
+    shared_note = SharedNoteGroupTable(id=uuid.uuid4(), community_id=community_id, name=group_name)
+    uploads = await ingest_note_uploads(user, shared_note.id, note)
+    if isinstance(uploads, dict):
+        return uploads
 
-        community = await session.get(Community, community_id)
-        shared_note = SharedNoteGroupTable(community_id=community_id, name=group_name)
-        session.add(shared_note)
-        await session.commit()
+    try:
+        async with get_async_session_context() as session:
+            session.add(shared_note)
+            await session.flush()  # The notes reference the group, which has no relationship() to order the inserts by
+            session.add_all(uploads.notes)
+            await session.flush()
+            await index_notes(session, uploads.notes)
+            await session.commit()
+    finally:
+        uploads.release()
+    return {"message": "Note posted"}
 
-        for file in note:
-            content = await file.read()
-            note = Note(user_id=user.id, shared_id=shared_note.id, content=content, file_name=file.filename)
-            session.add(note)
 
-        await session.commit()
-        return {"message": "Note posted"}
+# Notes read by ingest_note_uploads, release() once they are committed (or have failed to be, see BlobWriter)
+@dataclass
+class NoteUploads:
+    notes: list[Note]
+    writers: list[BlobWriter]
 
+    def release(self):
+        for writer in self.writers:
+            writer.release()
+
+
+# Streams uploads into the blob store in fixed-size chunks, enforcing the per-file and per-request limits
+# Returns the (unsaved) Note rows for the group, or an error dict after removing any blobs it created
+async def ingest_note_uploads(user: User, shared_id: uuid.UUID, files: list[UploadFile]):
+    if any(file.size is not None and file.size > MAX_NOTE_FILE_SIZE for file in files):
+        return {"error": f"Files must be at most {MAX_NOTE_FILE_SIZE} bytes"}
+    if sum(file.size or 0 for file in files) > MAX_NOTE_REQUEST_SIZE:
+        return {"error": f"Uploads must total at most {MAX_NOTE_REQUEST_SIZE} bytes"}
+
+    uploads = NoteUploads([], [])
+    created_blobs = []
+    request_size = 0
+    try:
+        for file in files:
+            writer = blob_store.writer()
+            try:
+                while chunk := await file.read(BLOB_CHUNK_SIZE):
+                    await run_blocking(writer.write, chunk)  # Hashing and the file write
+                    request_size += len(chunk)
+                    if writer.size > MAX_NOTE_FILE_SIZE:
+                        raise UploadTooLargeError(f"Files must be at most {MAX_NOTE_FILE_SIZE} bytes")
+                    if request_size > MAX_NOTE_REQUEST_SIZE:
+                        raise UploadTooLargeError(f"Uploads must total at most {MAX_NOTE_REQUEST_SIZE} bytes")
+            except BaseException:
+                writer.abort()
+                raise
+
+            content_hash, created = writer.commit()
+            uploads.writers.append(writer)
+            if created:
+                created_blobs.append(content_hash)
+            uploads.notes.append(Note(user_id=user.id, shared_id=shared_id, content_hash=content_hash,
+                                      size=writer.size, mime_type=get_mime_type(file), file_name=file.filename))
+    except UploadTooLargeError as e:
+        uploads.release()
+        await delete_unreferenced_blobs(created_blobs)  # Another upload may have committed the same content since
+        return {"error": str(e)}
+    except BaseException:
+        uploads.release()
+        raise
+
+    return uploads
+
+
+async def get_all_community_notes(user: User, community_id: uuid.UUID, page: PageParams = PageParams()):
+    access = await get_community_access(user.id, community_id)
+    if not access.exists:
+        return {"error": "Community not found"}
+    if not access.is_member:
+        return {"error": "User is not a member of the community"}
 
-async def get_all_community_notes(user: User, community_id: uuid.UUID):
     async with get_async_session_context() as session:
+        groups = await session.execute(
+            page.apply(select(SharedNoteGroupTable).filter_by(community_id=community_id), SharedNoteGroupTable.id)
+        )
+        return page.page([group._asdict() for group in groups.scalars()], key=lambda group: uuid.UUID(group["id"]))
 
-        if not await is_existing_community(community_id):
-            return {"error": "Community not found"}
-        if not await is_community_member(user.id, community_id):
-            return {"error": "User is not a member of the community"}
 
-        group_notes = await session.execute(
-            select(SharedNoteGroupTable).filter_by(community_id=community_id)
+async def get_note_group(community_id: uuid.UUID, note_group_id: uuid.UUID):
+    async with get_async_session_context() as session:
+        note_group = await session.execute(
+            select(SharedNoteGroupTable).filter_by(id=note_group_id, community_id=community_id)
         )
-        # group_notes = group_notes.fetchall()
-        notes = []
+        return note_group.scalar_one_or_none()
 
-        for group in group_notes.fetchall():
-            print(group)
-            notes.append(group._asdict()["SharedNoteGroupTable"])
 
-        return notes
+# Returns the group's (file_name, content_hash, size) list, contents are read from the blob store when zipping
+# The list is small and fetched up front so no session or connection is held while the zip streams to the client
+async def get_note_entries_by_group_id(note_group_id: uuid.UUID) -> list[tuple[str, str, int]]:
+    async with get_async_session_context() as session:
+        notes = await session.execute(
+            select(Note.file_name, Note.content_hash, Note.size).filter_by(shared_id=note_group_id)
+        )
+        return [tuple(note) for note in notes]
+
 
+# Compares the client's {note id: content hash} manifest with the group and returns only the differences
+# No file contents are sent, added/changed notes are then downloaded one by one from GET /communities/note/{note_id}
+async def sync_note_group(user: User, community_id: uuid.UUID, note_group_id: uuid.UUID, manifest: dict[uuid.UUID, str]):
+    access = await get_community_access(user.id, community_id)
+    if not access.exists:
+        return {"error": "Community not found"}
+    if not access.is_member:
+        return {"error": "User is not a member of the community"}
 
-async def get_notes_by_group_id(community_id: uuid.UUID, note_group_id: uuid.UUID):
     async with get_async_session_context() as session:
-        group_notes = await session.execute(
-            select(Note).filter_by(shared_id=note_group_id)
+        note_group = await session.execute(
+            select(SharedNoteGroupTable).filter_by(id=note_group_id, community_id=community_id)
         )
-        notes = [note._asdict() for note in group_notes.fetchall()]
+        note_group = note_group.scalar_one_or_none()
+        if note_group is None:
+            return {"error": "Note group not found"}
 
-        group_name = await session.execute(select(SharedNoteGroupTable).filter_by(id=note_group_id))
+        notes = await session.execute(select(Note).filter_by(shared_id=note_group_id))
+        unseen = dict(manifest)
+        added = []
+        changed = []
+        for note in notes.scalars():
+            known_hash = unseen.pop(note.id, None)
+            if known_hash is None:
+                added.append(note._asdict())
+            elif known_hash != note.content_hash:
+                changed.append(note._asdict())
 
-        return notes, group_name.fetchone()[0].name
+        return {
+            "version": note_group.version,
+            "added": added,
+            "changed": changed,
+            "deleted": [str(note_id) for note_id in unseen],
+        }
 
 
-async def delete_note_by_id(note_id: uuid.UUID):  # TODO: Check if no notes are left in group, if so then delete group
+async def get_note_file(user: User, note_id: uuid.UUID):
     async with get_async_session_context() as session:
-
-        if not await existing_note(note_id):
+        result = await session.execute(
+            select(Note, SharedNoteGroupTable.community_id)
+            .join(SharedNoteGroupTable, SharedNoteGroupTable.id == Note.shared_id)
+            .where(Note.id == note_id)
+        )
+        row = result.first()
+        if row is None:
             return {"error": "Note not found"}
 
-        note_group = await get_note_group_by_note_id(note_id)
-        if note_group is None:
-            return {"error": "Note group not found"}
+    note, community_id = row
+    if not (await get_community_access(user.id, community_id)).is_member:
+        return {"error": "User is not a member of the community"}
+    return note
 
-        note = await session.get(Note, note_id)
-        await session.delete(note)
+
+# Single DELETE ... RETURNING, the search index entry goes with the row (see api/search.py)
+# Only notes in a community the user belongs to are deleted, any other note is reported as not found
+async def delete_note_by_id(user: User, note_id: uuid.UUID):
+    async with get_async_session_context() as session:
+        deleted = await session.execute(
+            delete(Note).where(
+                Note.id == note_id,
+                Note.shared_id.in_(
+                    select(SharedNoteGroupTable.id)
+                    .where(SharedNoteGroupTable.community_id.in_(member_community_ids(user.id)))
+                )
+            ).returning(Note.shared_id, Note.content_hash)
+        )
+        note = deleted.first()
+        if note is None:
+            return {"error": "Note not found"}
+        await bump_or_delete_note_groups(session, [note.shared_id])
         await session.commit()
 
-        # CHecking if note group is empty for deletion
-        remaining_notes = await session.execute(
-            select(Note).filter_by(shared_id=note_group.id)
+    await delete_unreferenced_blobs([note.content_hash])
+    return {"message": "Note deleted"}
+
+
+# Bulk version of delete_note_by_id for notes anywhere in one community, ids outside it are ignored
+async def delete_notes(user: User, community_id: uuid.UUID, note_ids: list[uuid.UUID]):
+    access = await get_community_access(user.id, community_id)
+    if not access.exists:
+        return {"error": "Community not found"}
+    if not access.is_member:
+        return {"error": "User is not a member of the community"}
+
+    async with get_async_session_context() as session:
+        deleted = await session.execute(
+            delete(Note).where(
+                Note.id.in_(note_ids),
+                Note.shared_id.in_(select(SharedNoteGroupTable.id).filter_by(community_id=community_id))
+            ).returning(Note.shared_id, Note.content_hash)
         )
-        if not remaining_notes.fetchall():
-            await session.delete(note_group)
-            await session.commit()
+        notes = deleted.all()
+        await bump_or_delete_note_groups(session, {note.shared_id for note in notes})
+        await session.commit()
 
-        return {"message": "Note deleted"}
+    if notes:
+        await delete_unreferenced_blobs([note.content_hash for note in notes])
+    return {"message": "Notes deleted", "deleted": len(notes)}
 
 
-# TODO: Review file_group_id usage
+# After notes are removed from groups: a group left without notes is deleted, the others get their version bumped
+async def bump_or_delete_note_groups(session, note_group_ids):
+    if not note_group_ids:
+        return
+    await session.execute(
+        delete(SharedNoteGroupTable).where(
+            SharedNoteGroupTable.id.in_(note_group_ids),
+            ~exists().where(Note.shared_id == SharedNoteGroupTable.id)
+        )
+    )
+    await session.execute(
+        update(SharedNoteGroupTable).where(SharedNoteGroupTable.id.in_(note_group_ids))
+        .values(version=SharedNoteGroupTable.version + 1)
+    )
+
+
+# Edits a note group in one transaction: one DELETE ... WHERE id IN (...) for the removed notes and one bulk insert
+# of the new files into the same group (uploads are streamed to the blob store before the transaction starts)
 async def add_and_delete_notes(note_ids_to_delete: list[uuid.UUID], files_to_add: list[UploadFile],
                                community_id: uuid.UUID, file_group_id: uuid.UUID, user: User):
-    async with get_async_session_context() as session:
-
-        if not await is_existing_community(community_id):
-            return {"message": "Community Not Found"}
+    access = await get_community_access(user.id, community_id)
+    if not access.exists:
+        return {"error": "Community not found"}
+    if not access.is_member:
+        return {"error": "User is not a member of the community"}
 
-        group_notes_result = await session.execute(
-            select(SharedNoteGroupTable).filter_by(community_id=community_id, id=file_group_id)
+    async with get_async_session_context() as session:
+        note_group = await session.execute(
+            select(SharedNoteGroupTable.id).filter_by(community_id=community_id, id=file_group_id)
         )
-        group_notes = group_notes_result.scalars().first()
+        if note_group.scalar_one_or_none() is None:
+            return {"error": "Note group not found"}
 
-        for note_id in note_ids_to_delete:
-            await delete_note_by_id(note_id)
+    uploads = await ingest_note_uploads(user, file_group_id, files_to_add)
+    if isinstance(uploads, dict):
+        return uploads
 
-        for file in files_to_add:
-            await post_community_note(user, community_id, [file], group_notes.name)
+    try:
+        async with get_async_session_context() as session:
+            deleted_hashes = []
+            if note_ids_to_delete:
+                deleted = await session.execute(
+                    delete(Note).where(Note.shared_id == file_group_id, Note.id.in_(note_ids_to_delete))
+                    .returning(Note.content_hash)
+                )
+                deleted_hashes = deleted.scalars().all()
+            session.add_all(uploads.notes)
+            await session.flush()
+            await index_notes(session, uploads.notes)
 
-        await session.commit()
-        return {"message": "Notes updated"}
+            await bump_or_delete_note_groups(session, [file_group_id])
+            await session.commit()
+    finally:
+        uploads.release()
+
+    if deleted_hashes:
+        await delete_unreferenced_blobs(deleted_hashes)
+    return {"message": "Notes updated", "added": len(uploads.notes), "deleted": len(deleted_hashes)}
 
 
 # ------------------------------------------------------ Utils ------------------------------------------------------
@@ -300,8 +490,36 @@ async def get_note_group_by_note_id(note_id: uuid.UUID):
 
 async def is_existing_community(community_id: uuid.UUID) -> bool:
     async with get_async_session_context() as session:
-        community = await session.get(Community, community_id)
-        return community is not None
+        community = await session.execute(select(Community.id).filter_by(id=community_id))
+        return community.first() is not None
+
+
+def get_mime_type(file: UploadFile):
+    return file.content_type or mimetypes.guess_type(file.filename)[0]
+
+
+async def get_referenced_blobs(content_hashes) -> set[str]:
+    async with get_async_session_context() as session:
+        referenced = await session.execute(
+            select(Note.content_hash).where(Note.content_hash.in_(content_hashes)).distinct()
+        )
+        return set(referenced.scalars())
+
+
+# Blobs are shared between notes with identical content, only remove the ones no note points to anymore
+# An upload of the same content can commit its notes between the check and the removal, so the blobs are detached
+# first and references checked again: the ones referenced by then are put back. An upload that committed after
+# the second check puts the content back itself when it's released (see BlobWriter)
+async def delete_unreferenced_blobs(content_hashes: list[str]):
+    unreferenced = set(content_hashes) - await get_referenced_blobs(content_hashes)
+    detached = {content_hash: blob_store.detach(content_hash) for content_hash in unreferenced}
+    detached = {content_hash: handle for content_hash, handle in detached.items() if handle is not None}
+    if not detached:
+        return
+    for content_hash in await get_referenced_blobs(list(detached)):
+        blob_store.restore(content_hash, detached.pop(content_hash))
+    for handle in detached.values():
+        blob_store.discard(handle)
 
 
 async def existing_note(note_id: uuid.UUID):
@@ -310,28 +528,77 @@ async def existing_note(note_id: uuid.UUID):
         return note is not None
 
 
-async def is_community_owner(user: User, community_id: uuid.UUID):
-    async with get_async_session_context() as session:
-        if not await is_existing_community(community_id):
-            return False
-        community = await session.get(Community, community_id)
-        return community.owner == user.id
+async def is_community_owner(user: User, community_id: uuid.UUID) -> bool:
+    return (await get_community_access(user.id, community_id)).is_owner
 
 
-async def is_community_member(user_id: uuid.UUID, community_id: uuid.UUID):
-    async with get_async_session_context() as session:
-        if not await is_existing_community(community_id):
-            return {"error": "Community not found"}
+async def is_community_member(user_id: uuid.UUID, community_id: uuid.UUID) -> bool:
+    return (await get_community_access(user_id, community_id)).is_member
 
-        result = await session.execute(
-            select(UserCommunityTable).where(
-                and_(
-                    UserCommunityTable.user_id == user_id,
-                    UserCommunityTable.community_id == community_id
-                )
+
+# Result of the single authorization query shared by the community handlers
+@dataclass(frozen=True)
+class CommunityAccess:
+    exists: bool
+    is_member: bool
+    is_owner: bool
+    is_flashcard_set_owner: bool = False
+
+
+# Membership and ownership are read through the cache, the writers above delete these keys after committing
+# The TTL bounds staleness for anything that slips past invalidation (e.g. other workers with the memory backend)
+COMMUNITY_NOT_FOUND = ""
+
+
+def community_owner_key(community_id: uuid.UUID) -> str:
+    return f"community:{community_id}:owner"
+
+
+def community_member_key(user_id: uuid.UUID, community_id: uuid.UUID) -> str:
+    return f"community:{community_id}:member:{user_id}"
+
+
+# Resolves community existence, membership and ownership (and optionally flashcard set ownership) in one query
+# Checks without a flashcard set are answered from the cache when both keys are present
+async def get_community_access(user_id: uuid.UUID, community_id: uuid.UUID,
+                               flashcard_set_id: uuid.UUID = None) -> CommunityAccess:
+    if flashcard_set_id is None:
+        owner = await cache.get(community_owner_key(community_id))
+        if owner == COMMUNITY_NOT_FOUND:
+            return CommunityAccess(exists=False, is_member=False, is_owner=False)
+        if owner is not None:
+            member = await cache.get(community_member_key(user_id, community_id))
+            if member is not None:
+                return CommunityAccess(exists=True, is_member=member == "1", is_owner=owner == str(user_id))
+
+    async with get_async_session_context() as session:
+        columns = [Community.owner, UserCommunityTable.user_id.label("member_id")]
+        if flashcard_set_id is not None:  # Only touch flashcard_sets when a set is being checked
+            columns.append(
+                select(FlashCardSet.user_id).filter_by(id=flashcard_set_id).scalar_subquery().label("set_owner")
             )
+        result = await session.execute(
+            select(*columns)
+            .outerjoin(UserCommunityTable, and_(
+                UserCommunityTable.community_id == Community.id,
+                UserCommunityTable.user_id == user_id
+            ))
+            .where(Community.id == community_id)
         )
-        return {"is_member": result.fetchone() is not None}
+        row = result.first()
+
+    if row is None:
+        await cache.set(community_owner_key(community_id), COMMUNITY_NOT_FOUND)
+        return CommunityAccess(exists=False, is_member=False, is_owner=False)
+
+    await cache.set(community_owner_key(community_id), str(row.owner))
+    await cache.set(community_member_key(user_id, community_id), "1" if row.member_id is not None else "0")
+    return CommunityAccess(
+        exists=True,
+        is_member=row.member_id is not None,
+        is_owner=row.owner == user_id,
+        is_flashcard_set_owner=flashcard_set_id is not None and row.set_owner == user_id,
+    )
 
 
 async def get_community_members(community_id: uuid.UUID):
@@ -345,15 +612,77 @@ async def get_community_members(community_id: uuid.UUID):
         return [member.user_id for member in members]
 
 
-async def get_user_communities(user_id: uuid.UUID):
+async def get_user_communities(user_id: uuid.UUID, page: PageParams = PageParams()):
     async with get_async_session_context() as session:
-        user_communities = await session.execute(
-            select(Community.id, Community.name).join(UserCommunityTable).filter_by(user_id=user_id)
-        )
-        return [{
+        user_communities = await session.execute(page.apply(
+            select(Community.id, Community.name).join(UserCommunityTable).filter_by(user_id=user_id),
+            UserCommunityTable.community_id
+        ))
+        return page.page([{
             "id": community.id,
             "name": community.name
-        } for community in user_communities]
+        } for community in user_communities], key=lambda community: community["id"])
+
+
+# Everything the plugin needs when a view opens: the user, their communities and a summary of each community's note
+# groups and flashcard sets. Three queries however many communities the user is in, counts are aggregated in SQL
+async def get_dashboard(user: User):
+    member_community_ids = select(UserCommunityTable.community_id).filter_by(user_id=user.id)
+    async with get_async_session_context() as session:
+        communities = await session.execute(
+            select(Community.id, Community.name, Community.description, Community.owner)
+            .where(Community.id.in_(member_community_ids)).order_by(Community.name)
+        )
+        note_groups = await session.execute(
+            select(SharedNoteGroupTable.id, SharedNoteGroupTable.community_id, SharedNoteGroupTable.name,
+                   SharedNoteGroupTable.version, func.count(Note.id).label("note_count"))
+            .outerjoin(Note, Note.shared_id == SharedNoteGroupTable.id)
+            .where(SharedNoteGroupTable.community_id.in_(member_community_ids))
+            .group_by(SharedNoteGroupTable.id).order_by(SharedNoteGroupTable.name)
+        )
+        flashcard_sets = await session.execute(
+            select(FlashCardSet.id, FlashCardSetCommunityTable.community_id, FlashCardSet.name, FlashCardSet.version,
+                   FlashCardSet.user_id, func.count(FlashCard.id).label("card_count"))
+            .join(FlashCardSet, FlashCardSet.id == FlashCardSetCommunityTable.flashcard_set_id)
+            .outerjoin(FlashCard, FlashCard.flashcard_set_id == FlashCardSet.id)
+            .where(FlashCardSetCommunityTable.community_id.in_(member_community_ids))
+            .group_by(FlashCardSetCommunityTable.community_id, FlashCardSet.id).order_by(FlashCardSet.name)
+        )
+
+        communities_by_id = {community.id: {
+            "id": str(community.id),
+            "name": community.name,
+            "description": community.description,
+            "is_owner": community.owner == user.id,
+            "note_groups": [],
+            "flashcard_sets": [],
+        } for community in communities}
+        for group in note_groups:
+            communities_by_id[group.community_id]["note_groups"].append({
+                "id": str(group.id),
+                "name": group.name,
+                "version": group.version,
+                "note_count": group.note_count,
+            })
+        for flashcard_set in flashcard_sets:
+            communities_by_id[flashcard_set.community_id]["flashcard_sets"].append({
+                "id": str(flashcard_set.id),
+                "name": flashcard_set.name,
+                "version": flashcard_set.version,
+                "card_count": flashcard_set.card_count,
+                "is_owner": flashcard_set.user_id == user.id,
+            })
+
+    return {
+        "user": {
+            "id": str(user.id),
+            "email": user.email,
+            "is_active": user.is_active,
+            "is_verified": user.is_verified,
+            "is_superuser": user.is_superuser,
+        },
+        "communities": list(communities_by_id.values()),
+    }
 
 
 async def is_flashcard_set_owner(user: User, flashcard_set_id: uuid.UUID):
@@ -368,47 +697,55 @@ async def is_flashcard_set_owner(user: User, flashcard_set_id: uuid.UUID):
 # Create the flashcards and flashcard set tied to user
 # If community_id is provided, share the flashcard set with the community
 async def upload_flashcard_set(set_name: str, flashcards: list[tuple], user: User, community_id: uuid.UUID = None):
-    async with get_async_session_context() as session:
-        flashcard_set = FlashCardSet(user_id=user.id, name=set_name)
-        session.add(flashcard_set)
-        await session.commit()
-        await session.refresh(flashcard_set)
-
-        for question, answer in flashcards:
-            flashcard = FlashCard(user_id=user.id, question=question, answer=answer, flashcard_set_id=flashcard_set.id)
-            session.add(flashcard)
-
-        flashcard_user_table = FlashCardSetUserTable(user_id=user.id, flashcard_set_id=flashcard_set.id)
-        session.add(flashcard_user_table)
-
-        await session.commit()
+    # Validate everything up front so a rejected upload never leaves an orphan set behind
+    if any(len(flashcard) != 2 for flashcard in flashcards):
+        return {"error": "Each flashcard must have a question and an answer"}
+    if community_id:
+        access = await get_community_access(user.id, community_id)
+        if not access.exists:
+            return {"error": "Community not found"}
+        if not access.is_member:
+            return {"error": "User is not a member of the community"}
 
+    # Single transaction, cards are written with one executemany instead of one ORM object each
+    flashcard_set_id = uuid.uuid4()
+    async with get_async_session_context() as session:
+        await session.execute(
+            insert(FlashCardSet.__table__).values(id=flashcard_set_id, user_id=user.id, name=set_name)
+        )
+        await session.execute(
+            insert(FlashCardSetUserTable.__table__).values(user_id=user.id, flashcard_set_id=flashcard_set_id)
+        )
+        if flashcards:
+            await session.execute(insert(FlashCard.__table__), [
+                {"user_id": user.id, "question": question, "answer": answer, "flashcard_set_id": flashcard_set_id}
+                for question, answer in flashcards
+            ])
+            await index_flashcard_set(session, flashcard_set_id)
         if community_id:
-            if not await is_existing_community(community_id):
-                return {"error": "Community not found"}
-            if not await is_community_member(user.id, community_id):
-                return {"error": "User is not a member of the community"}
-
-            flashcard_set_table = FlashCardSetCommunityTable(community_id=community_id,
-                                                             flashcard_set_id=flashcard_set.id)
-            session.add(flashcard_set_table)
-            await session.commit()
-            return {"message": "Flashcard set uploaded to community"}
+            await session.execute(
+                insert(FlashCardSetCommunityTable.__table__).values(community_id=community_id,
+                                                                    flashcard_set_id=flashcard_set_id)
+            )
+        await session.commit()
 
-        return {"message": "Flashcard set uploaded to private"}
+    if community_id:
+        return {"message": "Flashcard set uploaded to community"}
+    return {"message": "Flashcard set uploaded to private"}
 
 
 # Updates community accessibility permission to view a flashcard set depending on bool visibility
 async def update_flashcard_set_community_visibility(user: User, flashcard_set_id: uuid.UUID, community_id: uuid.UUID,
                                                     visibility: bool):
-    async with get_async_session_context() as session:
-        if not await is_existing_community(community_id):
-            return {"error": "Community not found"}
-        if not await is_community_member(user.id, community_id):
-            return {"error": "User is not a member of the community"}
-        if not await is_flashcard_set_owner(user, flashcard_set_id):
-            return {"error": "User is not the owner of the flashcard set"}
+    access = await get_community_access(user.id, community_id, flashcard_set_id)
+    if not access.exists:
+        return {"error": "Community not found"}
+    if not access.is_member:
+        return {"error": "User is not a member of the community"}
+    if not access.is_flashcard_set_owner:
+        return {"error": "User is not the owner of the flashcard set"}
 
+    async with get_async_session_context() as session:
         flashcard_set_user_table = await session.get(FlashCardSetUserTable, (user.id, flashcard_set_id))
         if not flashcard_set_user_table:
             return {"error": "Flashcard set not found"}
@@ -427,11 +764,15 @@ async def update_flashcard_set_community_visibility(user: User, flashcard_set_id
             )
             await session.execute(stmt)
 
+        await session.execute(
+            update(FlashCardSet).filter_by(id=flashcard_set_id).values(version=FlashCardSet.version + 1)
+        )
         await session.commit()
         return {"message": "Flashcard set visibility updated"}
 
 
 # Deletes flashcard set and all associated flashcards - Uses String or UUID
+# One DELETE on the set, the database cascades it to the cards, user/community links and search index
 async def delete_flashcard_set(user: User, flashcard_set_id: uuid.UUID = None, flashcard_set_name: str = None):
     async with get_async_session_context() as session:
         if not flashcard_set_id and not flashcard_set_name:
@@ -439,49 +780,50 @@ async def delete_flashcard_set(user: User, flashcard_set_id: uuid.UUID = None, f
 
         if flashcard_set_name:
             flashcard_set = await session.execute(
-                select(FlashCardSet).filter_by(name=flashcard_set_name)
+                select(FlashCardSet.id).filter_by(name=flashcard_set_name)
             )
-            flashcard_set = flashcard_set.scalar_one_or_none()
-            if not flashcard_set:
+            flashcard_set_id = flashcard_set.scalar_one_or_none()
+            if not flashcard_set_id:
                 return {"error": "Flashcard set not found"}
-            flashcard_set_id = flashcard_set.id
 
-        if not await is_flashcard_set_owner(user, flashcard_set_id):
-            return {"error": "User is not the owner of the flashcard set"}
-
-        flashcards = await session.execute(
-            select(FlashCard).filter_by(flashcard_set_id=flashcard_set_id)
+        deleted = await session.execute(
+            delete(FlashCardSet).filter_by(id=flashcard_set_id, user_id=user.id).returning(FlashCardSet.id)
         )
-        for flashcard in flashcards.scalars():
-            await session.delete(flashcard)
-
-        flashcard_set = await session.get(FlashCardSet, flashcard_set_id)
-        await session.delete(flashcard_set)
+        if deleted.first() is None:
+            return {"error": "User is not the owner of the flashcard set"}
         await session.commit()
         return {"message": "Flashcard set deleted"}
 
 
-# ------------------------------------------------------ Flashcard Getters ------------------------------------------------------
-async def get_all_flashcard_sets_from_user(user: User):
+# Bulk version of delete_flashcard_set, ids of sets the user doesn't own are ignored
+async def delete_flashcard_sets(user: User, flashcard_set_ids: list[uuid.UUID]):
     async with get_async_session_context() as session:
-        flashcard_sets = await session.execute(
-            select(FlashCardSet).filter_by(user_id=user.id)
+        deleted = await session.execute(
+            delete(FlashCardSet).where(FlashCardSet.id.in_(flashcard_set_ids), FlashCardSet.user_id == user.id)
+            .returning(FlashCardSet.id)
         )
-        return [await get_flashcard_set_with_flashcards(flashcard_set.id) for flashcard_set in flashcard_sets.scalars()]
+        deleted_count = len(deleted.all())
+        await session.commit()
+        return {"message": "Flashcard sets deleted", "deleted": deleted_count}
 
 
-async def get_all_flashcard_sets_from_community(user: User, community_id: uuid.UUID):
-    async with get_async_session_context() as session:
-        if not await is_existing_community(community_id):
-            return {"error": "Community not found"}
-        if not await is_community_member(user.id, community_id):
-            return {"error": "User is not a member of the community"}
+# ------------------------------------------------------ Flashcard Getters ------------------------------------------------------
+async def get_all_flashcard_sets_from_user(user: User, page: PageParams = PageParams()):
+    return await get_flashcard_sets_with_flashcards(FlashCardSet.user_id == user.id, page=page)
 
-        flashcard_sets = await session.execute(
-            select(FlashCardSetCommunityTable).filter_by(community_id=community_id)
-        )
-        return [await get_flashcard_set_with_flashcards(flashcard_set.flashcard_set_id) for flashcard_set in
-                flashcard_sets.scalars()]
+
+async def get_all_flashcard_sets_from_community(user: User, community_id: uuid.UUID, page: PageParams = PageParams()):
+    access = await get_community_access(user.id, community_id)
+    if not access.exists:
+        return {"error": "Community not found"}
+    if not access.is_member:
+        return {"error": "User is not a member of the community"}
+
+    # Page through the (community_id, flashcard_set_id) primary key first, then load just that page of sets
+    return await get_flashcard_sets_with_flashcards(FlashCardSet.id.in_(page.apply(
+        select(FlashCardSetCommunityTable.flashcard_set_id).filter_by(community_id=community_id),
+        FlashCardSetCommunityTable.flashcard_set_id
+    )), page=page)
 
 
 async def get_all_flashcards_from_set_id(flashcard_set_id: uuid.UUID):
@@ -506,21 +848,74 @@ async def get_specified_flashcard_set(flashcard_set_id: uuid.UUID = None, flashc
                 return {"error": "Flashcard set not found"}
             flashcard_set_id = flashcard_set.id
 
-        flashcard_set = await session.get(FlashCardSet, flashcard_set_id)
-        return await get_flashcard_set_with_flashcards(flashcard_set.id)
+    return await get_flashcard_set_with_flashcards(flashcard_set_id)
 
 
-async def get_flashcard_set_with_flashcards(flashcard_set_id: uuid.UUID):
+# Single primary key lookup used to answer conditional GETs without loading the cards
+# None if the set doesn't exist or the user can't see it (not theirs and not shared with one of their communities)
+async def get_flashcard_set_version(user: User, flashcard_set_id: uuid.UUID) -> Optional[int]:
     async with get_async_session_context() as session:
-        flashcard_set = await session.get(FlashCardSet, flashcard_set_id)
-        flashcard_set_dict = flashcard_set._asdict()
-        flashcard_set_dict["email"] = (await get_user_by_id(flashcard_set.user_id)).email
-        flashcards = await get_all_flashcards_from_set_id(flashcard_set_id)
+        result = await session.execute(
+            select(FlashCardSet.version).where(FlashCardSet.id == flashcard_set_id, visible_flashcard_sets(user.id))
+        )
+        return result.scalar_one_or_none()
+
+
+async def bump_flashcard_set_versions(*criteria):
+    async with get_async_session_context() as session:
+        await session.execute(update(FlashCardSet).where(*criteria).values(version=FlashCardSet.version + 1))
+        await session.commit()
 
-        return {
-            "FlashCardSet": flashcard_set_dict,
-            "FlashCards": flashcards,
-        }
+
+async def get_flashcard_set_with_flashcards(flashcard_set_id: uuid.UUID, *criteria):
+    flashcard_sets = await get_flashcard_sets_with_flashcards(FlashCardSet.id == flashcard_set_id, *criteria)
+    if not flashcard_sets:
+        return {"error": "Flashcard set not found"}
+    return flashcard_sets[0]
+
+
+async def get_visible_flashcard_set(user: User, flashcard_set_id: uuid.UUID):
+    return await get_flashcard_set_with_flashcards(flashcard_set_id, visible_flashcard_sets(user.id))
+
+
+# Loads every flashcard set matching the criteria together with its owner's email and its flashcards
+# Constant number of queries regardless of the number of sets: sets, then owners and cards via IN-lists
+async def get_flashcard_sets_with_flashcards(*criteria, page: PageParams = None):
+    async with get_async_session_context() as session:
+        statement = select(FlashCardSet).where(*criteria)
+        if page:
+            statement = page.apply(statement, FlashCardSet.id)
+        flashcard_sets = await session.execute(statement)
+        flashcard_sets = flashcard_sets.scalars().all()
+        if page:  # Trim the look-ahead row before loading owners and cards
+            flashcard_sets_page = page.page(flashcard_sets, key=lambda flashcard_set: flashcard_set.id)
+            flashcard_sets = flashcard_sets_page.items
+        if not flashcard_sets:
+            return flashcard_sets_page if page else []
+
+        owners = await session.execute(
+            select(User.id, User.email).where(User.id.in_({flashcard_set.user_id for flashcard_set in flashcard_sets}))
+        )
+        emails = {owner.id: owner.email for owner in owners}
+
+        flashcard_sets_by_id = {}
+        for flashcard_set in flashcard_sets:
+            flashcard_set_dict = flashcard_set._asdict()
+            flashcard_set_dict["email"] = emails.get(flashcard_set.user_id)
+            flashcard_sets_by_id[flashcard_set.id] = {
+                "FlashCardSet": flashcard_set_dict,
+                "FlashCards": [],
+            }
+
+        flashcards = await session.execute(
+            select(FlashCard).where(FlashCard.flashcard_set_id.in_(flashcard_sets_by_id.keys()))
+        )
+        for flashcard in flashcards.scalars():
+            flashcard_sets_by_id[flashcard.flashcard_set_id]["FlashCards"].append(flashcard._asdict())
+
+        if page:
+            return Page(list(flashcard_sets_by_id.values()), flashcard_sets_page.next_cursor)
+        return list(flashcard_sets_by_id.values())
 
 
 async def get_flashcard_set_by_name_id(flashcard_set_id: uuid.UUID, user_id: uuid.UUID):
@@ -531,30 +926,63 @@ async def get_flashcard_set_by_name_id(flashcard_set_id: uuid.UUID, user_id: uui
         flashcard_set = flashcard_set.scalar_one_or_none()
         if not flashcard_set:
             return {"error": "Flashcard set not found"}
-        return await get_flashcard_set_with_flashcards(flashcard_set.id)
+
+    return await get_flashcard_set_with_flashcards(flashcard_set.id)
 
 
 # ------------------------------------------------------ IO ------------------------------------------------------
 
-async def zip_files(notes, zip_filename: str):
-    zip_filename = zip_filename + ".zip"
+# Write-only file object for zipfile that hands back whatever has been written since the last drain
+class ZipStream(io.RawIOBase):
+    def __init__(self):
+        self.chunks = []
 
-    s = io.BytesIO()
-    zf = zipfile.ZipFile(s, "w")
+    def writable(self):
+        return True
 
-    for note in notes:
-        note_obj = note['Note']
-        file_name = note_obj.file_name
-        content = note_obj.content
-        zf.writestr(file_name, content)
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
 
-    zf.close()
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
 
-    resp = Response(s.getvalue(), media_type="application/x-zip-compressed", headers={
-        'Content-Disposition': f'attachment;filename={zip_filename}'
+
+# Reading and compressing each chunk runs on the worker threads, one chunk at a time so the download keeps streaming
+async def stream_zip(notes):
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, "w") as zf:
+        for file_name, content_hash, size in notes:
+            with blob_store.open(content_hash) as blob, zf.open(zip_entry(file_name, size), "w") as entry:
+                while await run_blocking(copy_chunk, blob, entry):
+                    yield stream.drain()
+    yield stream.drain()
+
+
+# Serves a single note straight from the blob store, as a file response when the backend keeps local files
+def note_file_response(note: Note):
+    path = blob_store.path(note.content_hash)
+    if path is not None:
+        return FileResponse(path, media_type=note.mime_type, filename=note.file_name)
+
+    def iter_blob():
+        with blob_store.open(note.content_hash) as blob:
+            while chunk := blob.read(BLOB_CHUNK_SIZE):
+                yield chunk
+
+    return StreamingResponse(iter_blob(), media_type=note.mime_type, headers={
+        'Content-Disposition': f'attachment;filename={note.file_name}'
     })
 
-    return resp
+
+def zip_files(notes, zip_filename: str):
+    zip_filename = zip_filename + ".zip"
+
+    return StreamingResponse(stream_zip(notes), media_type="application/x-zip-compressed", headers={
+        'Content-Disposition': f'attachment;filename={zip_filename}'
+    })
 
 
 # ------------------------------------------------------ Setup ------------------------------------------------------
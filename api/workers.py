@@ -0,0 +1,31 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+# Blocking work done while serving a request (hashing and writing uploads to the blob store, compressing zip
+# downloads, reading notes for the search index) runs on a bounded thread pool instead of the event loop
+# Threads rather than processes: hashlib and zlib release the GIL on large buffers, and the work operates on open files
+# and zip streams that can't be sent to another process. Whole archives built by background jobs use the process pool
+# in api/jobs.py instead
+WORKER_THREADS = int(os.environ.get("WORKER_THREADS", 4))  # Blocking calls that run at once per server process
+
+executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(WORKER_THREADS, thread_name_prefix="api-worker")
+    return executor
+
+
+async def run_blocking(function, *args):
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), function, *args)
+
+
+def shutdown_workers():
+    global executor
+    if executor is not None:
+        executor.shutdown(cancel_futures=True)
+        executor = None
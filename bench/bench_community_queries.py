@@ -0,0 +1,88 @@
+# SQL emitted by community access checks and edits against a large community, cold and with a warm cache
+# The statement counts are asserted by tests/test_community_queries.py, this reports them with timings at scale
+# Usage: python -m bench.bench_community_queries [--members 10000] [--sets 1000] [--runs 50]
+import argparse
+import asyncio
+import time
+import uuid
+
+from bench.common import use_temp_database, create_bench_user, record_statements, tables_in
+
+
+async def seed(owner, members: int, sets: int) -> uuid.UUID:
+    from api import users
+    from api.db import engine, User, UserCommunityTable, FlashCardSet, FlashCardSetCommunityTable
+
+    community_id = (await users.create_community("Bench Community", owner))["Community Created"]
+    user_ids = [uuid.uuid4() for _ in range(members)]
+    set_ids = [uuid.uuid4() for _ in range(sets)]
+    async with engine.begin() as conn:
+        await conn.execute(User.__table__.insert(), [
+            {"id": user_id, "email": f"{user_id}@example.com", "hashed_password": "x", "is_active": True,
+             "is_superuser": False, "is_verified": False} for user_id in user_ids
+        ])
+        await conn.execute(UserCommunityTable.__table__.insert(), [
+            {"user_id": user_id, "community_id": community_id} for user_id in user_ids
+        ])
+        await conn.execute(FlashCardSet.__table__.insert(), [
+            {"id": set_id, "user_id": owner.id, "name": f"Set {i}"} for i, set_id in enumerate(set_ids)
+        ])
+        await conn.execute(FlashCardSetCommunityTable.__table__.insert(), [
+            {"community_id": community_id, "flashcard_set_id": set_id} for set_id in set_ids
+        ])
+    return community_id
+
+
+async def load_community(community_id: uuid.UUID):
+    from api.db import async_session_maker, Community
+
+    async with async_session_maker() as session:
+        return await session.get(Community, community_id)
+
+
+async def main(members: int, sets: int, runs: int):
+    from api import users
+    from api.cache import cache
+    from api.db import create_db_and_tables
+
+    await create_db_and_tables()
+    owner = await create_bench_user()
+    community_id = await seed(owner, members, sets)
+
+    operations = {
+        "session.get": lambda i: load_community(community_id),
+        "ownership check": lambda i: users.is_community_owner(owner, community_id),
+        "membership check": lambda i: users.is_community_member(owner.id, community_id),
+        "rename": lambda i: users.update_community_name(owner, community_id, f"Bench Community {i}"),
+    }
+
+    print(f"{members} members, {sets} flashcard sets")
+    print(f"{'operation':<18} {'cold stmts':>10} {'warm stmts':>10} {'cold ms':>8} {'warm ms':>8}  tables")
+    for name, operation in operations.items():
+        await cache.clear()
+        start = time.perf_counter()
+        with record_statements() as cold_statements:
+            await operation(0)
+        cold_elapsed = (time.perf_counter() - start) * 1000
+        with record_statements() as warm_statements:
+            await operation(1)
+        start = time.perf_counter()
+        for i in range(runs):
+            await operation(i)
+        warm_elapsed = (time.perf_counter() - start) / runs * 1000
+        tables = tables_in(cold_statements)
+        print(f"{name:<18} {len(cold_statements):>10} {len(warm_statements):>10} {cold_elapsed:>8.2f} "
+              f"{warm_elapsed:>8.2f}  {', '.join(sorted(tables))}")
+
+    print(f"cache: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--members", type=int, default=10000)
+    parser.add_argument("--sets", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    use_temp_database()
+    asyncio.run(main(args.members, args.sets, args.runs))
@@ -0,0 +1,69 @@
+# Throughput of concurrent authenticated API reads for several connection pool sizes
+# Each pool size runs in a fresh process since the engine is configured from the environment at import time
+# SQLite serializes access to its file, so pool size only shows in the numbers against a server database: set
+# BENCH_DATABASE_URL (e.g. a disposable Postgres database, see bench/common.py) to sweep against it
+# Usage: python -m bench.bench_concurrency [--pool-sizes 1 2 5 10] [--requests 400] [--concurrency 40]
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+from bench.common import use_temp_database, create_bench_user
+
+
+async def run_worker(requests: int, concurrency: int):
+    import httpx
+    from api import users
+    from api.db import create_db_and_tables, engine
+    from api.main import app
+
+    await create_db_and_tables()
+    user = await create_bench_user(f"bench-{uuid.uuid4()}@example.com")  # Unique, a BENCH_DATABASE_URL is reused
+    community_id = (await users.create_community("Bench Community", user))["Community Created"]
+    for i in range(5):
+        await users.upload_flashcard_set(f"Deck {i}", [(f"Q{j}", f"A{j}") for j in range(10)], user, community_id)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        login = await client.post("/auth/jwt/login", data={"username": user.email, "password": "password"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request():
+            async with semaphore:
+                response = await client.get(f"/communities/{community_id}/flashcard-sets", headers=headers)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    print(f"{engine.dialect.name:<10} {os.environ['DB_POOL_SIZE']:>9} {requests:>9} {elapsed:>9.3f} "
+          f"{requests / elapsed:>9.1f}")
+
+
+def main(pool_sizes: list[int], requests: int, concurrency: int):
+    print(f"{'database':<10} {'pool size':>9} {'requests':>9} {'seconds':>9} {'req/sec':>9}")
+    for pool_size in pool_sizes:
+        env = dict(os.environ, DB_POOL_SIZE=str(pool_size), DB_MAX_OVERFLOW="0")
+        subprocess.run([
+            sys.executable, "-m", "bench.bench_concurrency", "--worker",
+            "--requests", str(requests), "--concurrency", str(concurrency)
+        ], env=env, check=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[1, 2, 5, 10])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=40)
+    parser.add_argument("--worker", action="store_true")
+    args = parser.parse_args()
+
+    if args.worker:
+        use_temp_database()
+        asyncio.run(run_worker(args.requests, args.concurrency))
+    else:
+        main(args.pool_sizes, args.requests, args.concurrency)
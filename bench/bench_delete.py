@@ -0,0 +1,83 @@
+# Deleting a large flashcard set and many notes: set-based deletes with ON DELETE CASCADE vs the previous
+# load-every-row-and-session.delete approach
+# Usage: python -m bench.bench_delete [--cards 20000] [--sets 20] [--notes 500]
+import argparse
+import asyncio
+import uuid
+
+from bench.bench_note_edit import create_group
+from bench.common import use_temp_database, create_bench_user, count_statements
+
+
+async def create_flashcard_set(user, community_id, name: str, cards: int) -> uuid.UUID:
+    from sqlalchemy import select
+    from api import users
+    from api.db import async_session_maker, FlashCardSet
+
+    flashcards = [(f"Question {i} of {name}", f"Answer {i}") for i in range(cards)]
+    await users.upload_flashcard_set(name, flashcards, user, community_id)
+    async with async_session_maker() as session:
+        return (await session.execute(select(FlashCardSet.id).filter_by(name=name))).scalar_one()
+
+
+# Previous behaviour: every card is loaded into the session and deleted on its own
+async def per_row_delete(flashcard_set_id: uuid.UUID):
+    from sqlalchemy import select
+    from api.db import async_session_maker, FlashCard, FlashCardSet
+
+    async with async_session_maker() as session:
+        flashcard_set = await session.get(FlashCardSet, flashcard_set_id)
+        flashcards = await session.execute(select(FlashCard).filter_by(flashcard_set_id=flashcard_set_id))
+        for flashcard in flashcards.scalars():
+            await session.delete(flashcard)
+        await session.delete(flashcard_set)
+        await session.commit()
+
+
+def print_row(name: str, seconds: float, statements: int):
+    print(f"{name:<30} {seconds:>9.3f} {statements:>11}")
+
+
+async def main(cards: int, sets: int, notes: int):
+    from api import users
+    from api.db import create_db_and_tables
+
+    await create_db_and_tables()
+    user = await create_bench_user()
+    community_id = (await users.create_community("Bench Community", user))["Community Created"]
+
+    print(f"{'operation':<30} {'seconds':>9} {'statements':>11}")
+    flashcard_set_id = await create_flashcard_set(user, community_id, "per-row", cards)
+    print_row(f"per-row delete, {cards} cards", *await count_statements(lambda: per_row_delete(flashcard_set_id)))
+    flashcard_set_id = await create_flashcard_set(user, community_id, "set-based", cards)
+    print_row(f"set-based delete, {cards} cards",
+              *await count_statements(lambda: users.delete_flashcard_set(user, flashcard_set_id)))
+
+    flashcard_set_ids = [
+        await create_flashcard_set(user, community_id, f"bulk {i}", cards // sets) for i in range(sets)
+    ]
+    print_row(f"bulk delete, {sets} sets", *await count_statements(
+        lambda: users.delete_flashcard_sets(user, flashcard_set_ids)
+    ))
+
+    group_id, note_ids = await create_group(user, community_id, "loop", notes, 1024)
+
+    async def per_note_loop():
+        for note_id in note_ids:
+            await users.delete_note_by_id(user, note_id)
+
+    print_row(f"per-note delete, {notes} notes", *await count_statements(per_note_loop))
+    group_id, note_ids = await create_group(user, community_id, "bulk", notes, 1024)
+    print_row(f"bulk delete, {notes} notes",
+              *await count_statements(lambda: users.delete_notes(user, community_id, note_ids)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=20000)
+    parser.add_argument("--sets", type=int, default=20)
+    parser.add_argument("--notes", type=int, default=500)
+    args = parser.parse_args()
+
+    use_temp_database()
+    asyncio.run(main(args.cards, args.sets, args.notes))
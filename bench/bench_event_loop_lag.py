@@ -0,0 +1,131 @@
+# Event loop lag while several note group zips are downloaded at once: the previous zip stream (stored entries, written
+# on the event loop), the current entries (deflate for text, stored for already compressed files) written on the event
+# loop, and the current stream, which compresses each chunk on the worker threads. Lag is how late a task waking up
+# every millisecond actually runs, i.e. how long any other request on the server would have waited
+# Usage: python -m bench.bench_event_loop_lag [--downloads 8] [--notes 100] [--note-size 262144]
+import argparse
+import asyncio
+import io
+import os
+import random
+import time
+import zipfile
+
+from starlette.datastructures import UploadFile
+
+from bench.bench_load import percentile
+from bench.common import use_temp_database, create_bench_user
+
+TICK_SECONDS = 0.001
+WORDS = ["note", "vault", "link", "graph", "tag", "daily", "review", "card", "answer", "question", "community"]
+
+
+# Half markdown (compressible), half PNG-named random bytes (already compressed)
+def make_files(count: int, size: int) -> list[UploadFile]:
+    rng = random.Random(0)
+    files = []
+    for i in range(count):
+        if i % 2:
+            content, file_name = os.urandom(size), f"image-{i}.png"
+        else:
+            content = " ".join(rng.choice(WORDS) for _ in range(size // 5)).encode()[:size]
+            file_name = f"note-{i}.md"
+        files.append(UploadFile(io.BytesIO(content), size=len(content), filename=file_name))
+    return files
+
+
+# Previous behaviour: stored entries, every chunk read and written on the event loop
+async def stream_zip_on_loop(notes):
+    from api.storage import blob_store, BLOB_CHUNK_SIZE
+    from api.users import ZipStream
+
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, "w") as zf:
+        for file_name, content_hash, size in notes:
+            zip_info = zipfile.ZipInfo(file_name, time.localtime()[:6])
+            zip_info.file_size = size
+            with blob_store.open(content_hash) as blob, zf.open(zip_info, "w") as entry:
+                while chunk := blob.read(BLOB_CHUNK_SIZE):
+                    entry.write(chunk)
+                    yield stream.drain()
+    yield stream.drain()
+
+
+# The current entries (deflate chosen by file type) without the worker threads, what compressing costs the event loop
+async def stream_deflate_on_loop(notes):
+    from api.archive import zip_entry, copy_chunk
+    from api.storage import blob_store
+    from api.users import ZipStream
+
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, "w") as zf:
+        for file_name, content_hash, size in notes:
+            with blob_store.open(content_hash) as blob, zf.open(zip_entry(file_name, size), "w") as entry:
+                while copy_chunk(blob, entry):
+                    yield stream.drain()
+    yield stream.drain()
+
+
+async def monitor_lag(stop: asyncio.Event) -> list[float]:
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append((time.perf_counter() - start - TICK_SECONDS) * 1000)
+    return lags
+
+
+async def download(stream_zip, note_group_id) -> int:
+    from api import users
+
+    size = 0
+    async for chunk in stream_zip(await users.get_note_entries_by_group_id(note_group_id)):
+        size += len(chunk)
+        await asyncio.sleep(0)  # Sending the chunk to the client
+    return size
+
+
+async def measure(stream_zip, note_group_id, downloads: int) -> tuple[float, int, list[float]]:
+    stop = asyncio.Event()
+    monitoring = asyncio.create_task(monitor_lag(stop))
+    start = time.perf_counter()
+    sizes = await asyncio.gather(*(download(stream_zip, note_group_id) for _ in range(downloads)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return elapsed, sizes[0], await monitoring
+
+
+def print_row(name: str, elapsed: float, size: int, lags: list[float]):
+    print(f"{name:<22} {elapsed:>8.2f} {size / 1024 / 1024:>8.1f} {percentile(lags, 50):>9.2f} "
+          f"{percentile(lags, 99):>9.2f} {max(lags):>9.2f}")
+
+
+async def main(downloads: int, notes: int, note_size: int):
+    from sqlalchemy import select
+    from api import users
+    from api.db import async_session_maker, create_db_and_tables, SharedNoteGroupTable
+    from api.workers import WORKER_THREADS
+
+    await create_db_and_tables()
+    user = await create_bench_user()
+    community_id = (await users.create_community("Bench Community", user))["Community Created"]
+    await users.post_community_note(user, community_id, make_files(notes, note_size), "Vault")
+    async with async_session_maker() as session:
+        note_group_id = (await session.execute(select(SharedNoteGroupTable.id))).scalar_one()
+
+    print(f"{downloads} concurrent downloads of {notes} notes, {WORKER_THREADS} worker threads")
+    print(f"{'zip stream':<22} {'seconds':>8} {'zip MB':>8} {'lag p50':>9} {'lag p99':>9} {'lag max':>9}")
+    print_row("stored, event loop", *await measure(stream_zip_on_loop, note_group_id, downloads))
+    print_row("deflate, event loop", *await measure(stream_deflate_on_loop, note_group_id, downloads))
+    print_row("worker threads", *await measure(users.stream_zip, note_group_id, downloads))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--downloads", type=int, default=8)
+    parser.add_argument("--notes", type=int, default=100)
+    parser.add_argument("--note-size", type=int, default=256 * 1024)
+    args = parser.parse_args()
+
+    use_temp_database()
+    asyncio.run(main(args.downloads, args.notes, args.note_size))
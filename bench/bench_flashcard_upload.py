@@ -0,0 +1,34 @@
+# Cards/sec for flashcard set uploads of increasing deck sizes
+# Usage: python -m bench.bench_flashcard_upload [--sizes 1000 10000 100000]
+import argparse
+import asyncio
+import time
+
+from bench.common import use_temp_database, create_bench_user
+
+
+async def main(sizes: list[int]):
+    from api import users
+    from api.db import create_db_and_tables
+
+    await create_db_and_tables()
+    user = await create_bench_user()
+    community_id = (await users.create_community("Bench Community", user))["Community Created"]
+
+    print(f"{'cards':>8} {'target':>10} {'seconds':>9} {'cards/sec':>11}")
+    for size in sizes:
+        flashcards = [(f"Question {i}", f"Answer {i}") for i in range(size)]
+        for target, target_community_id in (("private", None), ("community", community_id)):
+            start = time.perf_counter()
+            await users.upload_flashcard_set(f"Deck {size}", flashcards, user, target_community_id)
+            elapsed = time.perf_counter() - start
+            print(f"{size:>8} {target:>10} {elapsed:>9.3f} {size / elapsed:>11.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    use_temp_database()
+    asyncio.run(main(args.sizes))
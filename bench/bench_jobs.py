@@ -0,0 +1,100 @@
+# Latency of a cheap route while heavy operations run, inline in the request vs submitted as background jobs
+# (zip building in the job process pool, deck imports in job worker tasks)
+# Usage: python -m bench.bench_jobs [--operations 8] [--cards 20000] [--notes 200] [--note-size 65536]
+import argparse
+import asyncio
+import io
+import os
+import time
+
+from bench.bench_load import percentile
+from bench.common import use_temp_database
+
+PROBE_INTERVAL = 0.005
+
+
+async def probe(client, url: str, stop: asyncio.Event) -> list[float]:
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get(url)
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(PROBE_INTERVAL)
+    return latencies
+
+
+async def measure(client, probe_url: str, operations) -> tuple[float, list[float]]:
+    stop = asyncio.Event()
+    probing = asyncio.create_task(probe(client, probe_url, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(operation() for operation in operations))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return elapsed, await probing
+
+
+def print_row(name: str, elapsed: float, latencies: list[float]):
+    print(f"{name:<24} {elapsed:>8.2f} {percentile(latencies, 50):>9.2f} {percentile(latencies, 95):>9.2f} "
+          f"{max(latencies):>9.2f}")
+
+
+async def main(operations: int, cards: int, notes: int, note_size: int):
+    import httpx
+    from api import jobs
+    from api.db import create_db_and_tables
+    from api.main import app
+
+    await create_db_and_tables()
+    await jobs.start_job_workers()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        await client.post("/auth/register", json={"email": "bench@example.com", "password": "password"})
+        login = await client.post("/auth/jwt/login", data={"username": "bench@example.com", "password": "password"})
+        client.headers["Authorization"] = f"Bearer {login.json()['access_token']}"
+        user_id = (await client.get("/me/dashboard")).json()["user"]["id"]
+        community_id = (await client.post("/communities/create/Bench")).json()["community_id"]["Community Created"]
+        files = [("files", (f"note {i}.md", io.BytesIO(os.urandom(note_size // 2).hex().encode()), "text/markdown"))
+                 for i in range(notes)]
+        await client.post(f"/community/{community_id}/Vault/shared-notes", files=files)
+        note_group_id = (await client.get(f"/community/{community_id}/shared-notes")).json()[0]["id"]
+        deck = {"flashcards": [[f"Question {i}", f"Answer {i}"] for i in range(cards)]}
+        probe_url = f"/communities/user/{user_id}"
+
+        async def inline_zip():
+            await client.get(f"/community/{community_id}/shared-notes/{note_group_id}")
+
+        async def job_zip():
+            await client.post(f"/jobs/note-group-zip/{community_id}/{note_group_id}")
+
+        async def inline_import():
+            await client.post("/flashcards/upload/user/Deck", json=deck)
+
+        async def job_import():
+            await client.post("/jobs/flashcard-import/Deck", json=deck)
+
+        # Jobs are timed until the queue is drained, not just until the 202
+        async def drained(submit):
+            async def operation():
+                await asyncio.gather(*(submit() for _ in range(operations)))
+                await jobs.queue.join()
+            return [operation]
+
+        print(f"{operations} operations at once, probing GET {probe_url.split('/')[1]}/... meanwhile")
+        print(f"{'operation':<24} {'seconds':>8} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+        print_row("idle", *await measure(client, probe_url, [lambda: asyncio.sleep(1)]))
+        print_row(f"inline zip x{operations}", *await measure(client, probe_url, [inline_zip] * operations))
+        print_row(f"zip job x{operations}", *await measure(client, probe_url, await drained(job_zip)))
+        print_row(f"inline import x{operations}", *await measure(client, probe_url, [inline_import] * operations))
+        print_row(f"import job x{operations}", *await measure(client, probe_url, await drained(job_import)))
+    await jobs.stop_job_workers()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--operations", type=int, default=8)
+    parser.add_argument("--cards", type=int, default=20000)
+    parser.add_argument("--notes", type=int, default=200)
+    parser.add_argument("--note-size", type=int, default=65536)
+    args = parser.parse_args()
+
+    use_temp_database()
+    asyncio.run(main(args.operations, args.cards, args.notes, args.note_size))
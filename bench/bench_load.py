@@ -0,0 +1,203 @@
+# Load test of the hot API routes against a seeded dataset, in-process through httpx's ASGI transport
+# Reports p50/p95/p99 latency and throughput per scenario; --save stores the results as a JSON baseline and --compare
+# checks a run against one (exit code 1 when a scenario's p95 or throughput regressed by more than --tolerance)
+# Baselines are only comparable on the same machine and config: save one on the main branch, then compare on the PR branch
+# Usage: python -m bench.bench_load [--requests 500] [--concurrency 20] [--scenarios login list_communities ...]
+#                                   [--save bench/baselines/load.json | --compare bench/baselines/load.json] [seed options]
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+from bench.common import use_temp_database
+from bench.seed import BENCH_PASSWORD, Dataset, add_seed_arguments, seed_config
+
+UPLOAD_DECK_CARDS = 200
+DEFAULT_TOLERANCE = 0.2
+
+
+# Each scenario sends one request for a random seeded user; login hashes a password so it is run less often
+class Scenarios:
+    def __init__(self, client, dataset: Dataset, tokens: dict, rng: random.Random):
+        self.client = client
+        self.dataset = dataset
+        self.tokens = tokens  # email -> auth headers
+        self.rng = rng
+        self.deck = {"flashcards": [[f"Question {i}", f"Answer {i}"] for i in range(UPLOAD_DECK_CARDS)]}
+
+    def pick_user(self):
+        index = self.rng.randrange(len(self.dataset.user_ids))
+        return self.dataset.user_ids[index], self.tokens[self.dataset.emails[index]]
+
+    async def login(self):
+        email = self.rng.choice(self.dataset.emails)
+        return await self.client.post("/auth/jwt/login", data={"username": email, "password": BENCH_PASSWORD})
+
+    async def list_communities(self):
+        user_id, headers = self.pick_user()
+        return await self.client.get(f"/communities/user/{user_id}", headers=headers)
+
+    async def list_flashcard_sets(self):
+        user_id, headers = self.pick_user()
+        community_id = self.rng.choice(self.dataset.memberships[user_id])
+        return await self.client.get(f"/communities/{community_id}/flashcard-sets", headers=headers)
+
+    async def download_note_zip(self):
+        user_id, headers = self.pick_user()
+        community_id = self.rng.choice(self.dataset.memberships[user_id])
+        note_group_id = self.rng.choice(self.dataset.note_group_ids[community_id])
+        return await self.client.get(f"/community/{community_id}/shared-notes/{note_group_id}", headers=headers)
+
+    async def upload_deck(self):
+        user_id, headers = self.pick_user()
+        return await self.client.post(f"/flashcards/upload/user/Load test deck {self.rng.random()}", json=self.deck,
+                                      headers=headers)
+
+
+SCENARIOS = {  # name -> share of --requests
+    "login": 0.1,
+    "list_communities": 1,
+    "list_flashcard_sets": 1,
+    "download_note_zip": 1,
+    "upload_deck": 0.5,
+}
+
+
+def percentile(latencies: list[float], p: int) -> float:
+    return statistics.quantiles(latencies, n=100, method="inclusive")[p - 1]
+
+
+async def run_scenario(operation, requests: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def request():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await operation()
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400 or response.content.startswith(b'{"error"'):  # Errors are returned as 200s
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(request() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput_rps": requests / elapsed,
+    }
+
+
+async def run(args) -> dict:
+    import httpx
+    from api.db import create_db_and_tables
+    from api.main import app
+    from bench.seed import seed
+
+    await create_db_and_tables()
+    config = seed_config(args)
+    start = time.perf_counter()
+    dataset = await seed(config)
+    print(f"Seeded {config} in {time.perf_counter() - start:.1f}s")
+
+    rng = random.Random(config.seed)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        tokens = {}
+        for email in dataset.emails:  # Log everyone in once up front, reusing tokens like real clients do
+            login = await client.post("/auth/jwt/login", data={"username": email, "password": BENCH_PASSWORD})
+            tokens[email] = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        scenarios = Scenarios(client, dataset, tokens, rng)
+
+        results = {}
+        for name in args.scenarios:
+            operation = getattr(scenarios, name)
+            await run_scenario(operation, min(args.concurrency, 10), args.concurrency)  # Warm up
+            requests = max(int(args.requests * SCENARIOS[name]), 10)
+            results[name] = await run_scenario(operation, requests, args.concurrency)
+
+    return {
+        "config": {**vars(config), "requests": args.requests, "concurrency": args.concurrency},
+        "machine": {"python": platform.python_version(), "platform": platform.platform()},
+        "results": results,
+    }
+
+
+def print_results(results: dict, baseline: dict = None):
+    header = f"{'scenario':<20} {'requests':>8} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8}"
+    print(header + ("  p95 / req/s vs baseline" if baseline else ""))
+    for name, result in results.items():
+        line = (f"{name:<20} {result['requests']:>8} {result['errors']:>6} {result['p50_ms']:>8.2f} "
+                f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['throughput_rps']:>8.1f}")
+        if baseline and name in baseline:
+            line += (f"  {change(baseline[name]['p95_ms'], result['p95_ms']):>+7.1%} "
+                     f"{change(baseline[name]['throughput_rps'], result['throughput_rps']):>+7.1%}")
+        print(line)
+
+
+def change(before: float, after: float) -> float:
+    return (after - before) / before if before else 0.0
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    failures = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        if change(baseline[name]["p95_ms"], result["p95_ms"]) > tolerance:
+            failures.append(f"{name}: p95 {baseline[name]['p95_ms']:.2f}ms -> {result['p95_ms']:.2f}ms")
+        if -change(baseline[name]["throughput_rps"], result["throughput_rps"]) > tolerance:
+            failures.append(f"{name}: throughput {baseline[name]['throughput_rps']:.1f} -> "
+                            f"{result['throughput_rps']:.1f} req/s")
+        if result["errors"] > baseline[name]["errors"]:
+            failures.append(f"{name}: {result['errors']} errors (baseline {baseline[name]['errors']})")
+    return failures
+
+
+def main(args):
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline["config"] != {**vars(seed_config(args)), "requests": args.requests, "concurrency": args.concurrency}:
+            print("WARNING: the baseline was recorded with a different config, the comparison is meaningless")
+
+    run_results = asyncio.run(run(args))
+    print_results(run_results["results"], baseline["results"] if baseline else None)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(run_results, f, indent=2)
+        print(f"Saved baseline to {args.save}")
+    if baseline:
+        failures = regressions(run_results["results"], baseline["results"], args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION: {failure}")
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--save", help="write the results to this baseline file")
+    parser.add_argument("--compare", help="compare the results with this baseline file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative p95/throughput regression (default 0.2)")
+    add_seed_arguments(parser)
+    parser.set_defaults(users=200)  # Every seeded user logs in once up front
+    args = parser.parse_args()
+
+    use_temp_database()
+    main(args)
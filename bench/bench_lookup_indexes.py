@@ -0,0 +1,150 @@
+# Lookup latency of the hot foreign-key queries with and without the indexes from migration 0003
+# Usage: python -m bench.bench_lookup_indexes [--cards 1000000] [--notes 100000] [--lookups 200]
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+from bench.common import use_temp_database
+
+CARDS_PER_SET = 100
+NOTES_PER_GROUP = 10
+MEMBERS_PER_COMMUNITY = 50
+BATCH_SIZE = 10000
+
+
+async def insert_rows(conn, table, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        await conn.execute(table.insert(), rows[start:start + BATCH_SIZE])
+
+
+async def seed(cards: int, notes: int):
+    from api.db import (
+        engine, Community, FlashCard, FlashCardSet, FlashCardSetCommunityTable, Note, SharedNoteGroupTable, User,
+        UserCommunityTable
+    )
+
+    set_count = max(cards // CARDS_PER_SET, 1)
+    group_count = max(notes // NOTES_PER_GROUP, 1)
+    community_count = max(group_count // 10, 1)
+    user_ids = [uuid.uuid4() for _ in range(max(set_count // 10, MEMBERS_PER_COMMUNITY))]
+    community_ids = [uuid.uuid4() for _ in range(community_count)]
+    set_ids = [uuid.uuid4() for _ in range(set_count)]
+    group_ids = [uuid.uuid4() for _ in range(group_count)]
+
+    async with engine.begin() as conn:
+        await insert_rows(conn, User.__table__, [
+            {"id": user_id, "email": f"{user_id}@example.com", "hashed_password": "x", "is_active": True,
+             "is_superuser": False, "is_verified": False} for user_id in user_ids
+        ])
+        await insert_rows(conn, Community.__table__, [
+            {"id": community_id, "name": f"Community {i}", "owner": user_ids[0]}
+            for i, community_id in enumerate(community_ids)
+        ])
+        await insert_rows(conn, UserCommunityTable.__table__, [
+            {"user_id": user_id, "community_id": community_id}
+            for community_id in community_ids for user_id in random.sample(user_ids, MEMBERS_PER_COMMUNITY)
+        ])
+        await insert_rows(conn, FlashCardSet.__table__, [
+            {"id": set_id, "user_id": random.choice(user_ids), "name": f"Set {i}"} for i, set_id in enumerate(set_ids)
+        ])
+        await insert_rows(conn, FlashCardSetCommunityTable.__table__, [
+            {"community_id": random.choice(community_ids), "flashcard_set_id": set_id} for set_id in set_ids
+        ])
+        for start in range(0, set_count, BATCH_SIZE // CARDS_PER_SET):
+            await conn.execute(FlashCard.__table__.insert(), [
+                {"id": uuid.uuid4(), "flashcard_set_id": set_id, "question": f"Question {i}", "answer": f"Answer {i}"}
+                for set_id in set_ids[start:start + BATCH_SIZE // CARDS_PER_SET] for i in range(CARDS_PER_SET)
+            ])
+        await insert_rows(conn, SharedNoteGroupTable.__table__, [
+            {"id": group_id, "community_id": random.choice(community_ids), "name": f"Group {i}"}
+            for i, group_id in enumerate(group_ids)
+        ])
+        await insert_rows(conn, Note.__table__, [
+            {"id": uuid.uuid4(), "shared_id": group_id, "content_hash": "0" * 64, "size": 0, "file_name": f"{i}.md"}
+            for group_id in group_ids for i in range(NOTES_PER_GROUP)
+        ])
+
+    return {"users": user_ids, "communities": community_ids, "sets": set_ids, "groups": group_ids}
+
+
+def get_lookups(ids):
+    from sqlalchemy import select
+    from api.db import FlashCard, FlashCardSet, FlashCardSetCommunityTable, Note, SharedNoteGroupTable, UserCommunityTable
+
+    return {
+        "flashcards by set": lambda: select(FlashCard.id).filter_by(flashcard_set_id=random.choice(ids["sets"])),
+        "notes by group": lambda: select(Note.id).filter_by(shared_id=random.choice(ids["groups"])),
+        "sets by owner": lambda: select(FlashCardSet.id).filter_by(user_id=random.choice(ids["users"])),
+        "groups by community": lambda: select(SharedNoteGroupTable.id).filter_by(
+            community_id=random.choice(ids["communities"])),
+        "members by community": lambda: select(UserCommunityTable.user_id).filter_by(
+            community_id=random.choice(ids["communities"])),
+        "communities by set": lambda: select(FlashCardSetCommunityTable.community_id).filter_by(
+            flashcard_set_id=random.choice(ids["sets"])),
+    }
+
+
+async def measure(ids, lookups: int) -> dict[str, float]:
+    from api.db import engine
+
+    results = {}
+    async with engine.connect() as conn:
+        for name, build_query in get_lookups(ids).items():
+            start = time.perf_counter()
+            for _ in range(lookups):
+                (await conn.execute(build_query())).fetchall()
+            results[name] = (time.perf_counter() - start) / lookups * 1000
+    return results
+
+
+def migrate(connection, revision: str):
+    from alembic import command
+    from alembic.config import Config
+    from api.db import MIGRATIONS_DIR
+
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    config.attributes["connection"] = connection
+    command.downgrade(config, revision) if revision == "0002" else command.upgrade(config, revision)
+
+
+# Foreign keys off while tables are rebuilt, as in create_db_and_tables
+async def migrate_to(revision: str):
+    from api.db import engine
+
+    async with engine.connect() as conn:
+        await conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        await conn.run_sync(migrate, revision)
+        await conn.commit()
+        await conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+
+
+async def main(cards: int, notes: int, lookups: int):
+    from api.db import engine, create_db_and_tables
+
+    await create_db_and_tables()
+    start = time.perf_counter()
+    ids = await seed(cards, notes)
+    print(f"Seeded {cards} cards / {notes} notes in {time.perf_counter() - start:.1f}s")
+
+    await migrate_to("0002")
+    before = await measure(ids, lookups)
+    await migrate_to("head")
+    after = await measure(ids, lookups)
+
+    print(f"{'lookup':<22} {'before ms':>10} {'after ms':>10} {'speedup':>9}")
+    for name in before:
+        print(f"{name:<22} {before[name]:>10.3f} {after[name]:>10.3f} {before[name] / after[name]:>8.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=1000000)
+    parser.add_argument("--notes", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    use_temp_database()
+    asyncio.run(main(args.cards, args.notes, args.lookups))
@@ -0,0 +1,75 @@
+# Editing files in a note group: batched add_and_delete_notes vs the previous per-file delete + re-post loop
+# Usage: python -m bench.bench_note_edit [--files 500] [--edits 200] [--file-size 4096]
+import argparse
+import asyncio
+import io
+import os
+
+from starlette.datastructures import UploadFile
+
+from bench.common import use_temp_database, create_bench_user, count_statements
+
+
+def make_files(count: int, size: int, prefix: str = "") -> list[UploadFile]:
+    return [
+        UploadFile(io.BytesIO(os.urandom(size)), size=size, filename=f"{prefix}note-{i}.md")
+        for i in range(count)
+    ]
+
+
+async def create_group(user, community_id, name: str, files: int, file_size: int):
+    from sqlalchemy import select
+    from api import users
+    from api.db import async_session_maker, Note, SharedNoteGroupTable
+
+    await users.post_community_note(user, community_id, make_files(files, file_size), name)
+    async with async_session_maker() as session:
+        group_id = (await session.execute(select(SharedNoteGroupTable.id).filter_by(name=name))).scalar_one()
+        note_ids = (await session.execute(select(Note.id).filter_by(shared_id=group_id))).scalars().all()
+    return group_id, note_ids
+
+
+async def main(files: int, edits: int, file_size: int):
+    from api import users
+    from api.db import create_db_and_tables
+
+    await create_db_and_tables()
+    user = await create_bench_user()
+    community_id = (await users.create_community("Bench Community", user))["Community Created"]
+
+    # Previous behaviour: every file is deleted and re-posted on its own (and lands in a new group)
+    group_id, note_ids = await create_group(user, community_id, "loop", files, file_size)
+    new_files = make_files(edits, file_size, "edited-")
+
+    async def per_file_loop():
+        for note_id in note_ids[:edits]:
+            await users.delete_note_by_id(user, note_id)
+        for file in new_files:
+            await users.post_community_note(user, community_id, [file], "loop")
+
+    loop_seconds, loop_statements = await count_statements(per_file_loop)
+
+    group_id, note_ids = await create_group(user, community_id, "batched", files, file_size)
+    new_files = make_files(edits, file_size, "edited-")
+
+    async def batched():
+        await users.add_and_delete_notes(note_ids[:edits], new_files, community_id, group_id, user)
+
+    batched_seconds, batched_statements = await count_statements(batched)
+
+    print(f"{edits} of {files} files edited ({file_size} bytes each)")
+    print(f"{'approach':<16} {'seconds':>9} {'statements':>11}")
+    print(f"{'per-file loop':<16} {loop_seconds:>9.3f} {loop_statements:>11}")
+    print(f"{'batched':<16} {batched_seconds:>9.3f} {batched_statements:>11}")
+    print(f"speedup: {loop_seconds / batched_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--edits", type=int, default=200)
+    parser.add_argument("--file-size", type=int, default=4096)
+    args = parser.parse_args()
+
+    use_temp_database()
+    asyncio.run(main(args.files, args.edits, args.file_size))
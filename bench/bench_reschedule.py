@@ -0,0 +1,89 @@
+# Rescheduling every review state of a user after a change of scheduler parameters: the ORM per-row loop vs the
+# column path of api/study.py in plain Python and with NumPy, each writing back with one bulk UPDATE
+# Usage: python -m bench.bench_reschedule [--cards 50000]
+import argparse
+import asyncio
+import time
+from dataclasses import replace
+
+from bench.bench_study import seed
+from bench.common import count_statements, use_temp_database
+
+
+# Per-row baseline: every state loaded as an ORM object, recomputed and flushed on its own
+async def per_row_reschedule(user_id, old, new) -> int:
+    from datetime import timedelta
+    from sqlalchemy import select
+    from api import study
+    from api.db import async_session_maker, ReviewState
+
+    rescheduled = 0
+    async with async_session_maker() as session:
+        states = await session.execute(select(ReviewState).filter_by(user_id=user_id))
+        for state in states.scalars():
+            interval = study.rescale_interval(state.interval, state.repetitions, old, new)
+            if interval != state.interval:
+                state.interval = interval
+                state.due_at = study.as_utc(state.reviewed_at) + timedelta(days=interval)
+                rescheduled += 1
+        await session.commit()
+    return rescheduled
+
+
+async def column_reschedule(user_id, old, new) -> int:
+    from api import study
+    from api.db import async_session_maker
+
+    async with async_session_maker() as session:
+        rescheduled = await study.reschedule_review_states(session, user_id, old, new)
+        await session.commit()
+    return rescheduled
+
+
+def print_row(name: str, seconds: float, statements: int):
+    print(f"{name:<30} {seconds:>9.3f} {statements:>11}")
+
+
+async def main(cards: int):
+    from api import study
+    from api.db import create_db_and_tables
+
+    await create_db_and_tables()
+    user_ids, _ = await seed(1, cards)
+    user_id = user_ids[0]
+    # Alternating the modifier so every run moves about the same cards
+    default = study.DEFAULT_SCHEDULER_PARAMS
+    longer = replace(default, interval_modifier=1.5)
+    numpy = study.np
+
+    print(f"{'rescheduling ' + str(cards) + ' states':<30} {'seconds':>9} {'statements':>11}")
+    print_row("ORM per-row loop", *await count_statements(lambda: per_row_reschedule(user_id, default, longer)))
+    study.np = None
+    print_row("columns, Python", *await count_statements(lambda: column_reschedule(user_id, longer, default)))
+    study.np = numpy
+    if numpy is None:
+        print("columns, NumPy: not installed (pip install numpy)")
+        return
+    print_row("columns, NumPy", *await count_statements(lambda: column_reschedule(user_id, default, longer)))
+
+    # The recomputation alone, without the database round trips
+    intervals = numpy.random.default_rng(0).integers(1, 120, cards)
+    repetitions = numpy.random.default_rng(1).integers(1, 10, cards)
+    interval_list, repetition_list = intervals.tolist(), repetitions.tolist()
+    start = time.perf_counter()
+    [study.rescale_interval(interval, repetition, default, longer)
+     for interval, repetition in zip(interval_list, repetition_list)]
+    python_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    study.rescale_intervals(intervals, repetitions, default, longer)
+    numpy_seconds = time.perf_counter() - start
+    print(f"\nrecomputing the intervals only: Python {python_seconds * 1000:.2f} ms, NumPy {numpy_seconds * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=50000)
+    args = parser.parse_args()
+
+    use_temp_database()
+    asyncio.run(main(args.cards))
@@ -0,0 +1,116 @@
+# Full-text search latency over a large flashcard corpus, compared with a LIKE scan of the same cards
+# Usage: python -m bench.bench_search [--cards 1000000] [--communities 100] [--runs 20]
+import argparse
+import asyncio
+import itertools
+import random
+import time
+import uuid
+
+from bench.common import use_temp_database, create_bench_user
+
+CARDS_PER_SET = 100
+BATCH_SIZE = 10000
+VOCABULARY_SIZE = 20000
+WORDS_PER_SIDE = 8
+MEMBER_OF = 5  # Communities the searching user belongs to
+
+
+# Zipf-like word frequencies so there are both very common and rare terms, like real card text
+def make_vocabulary() -> tuple[list[str], list[float]]:  # Words and cumulative weights
+    words = [f"w{i}x{random.randint(0, 999)}" for i in range(VOCABULARY_SIZE)]
+    return words, list(itertools.accumulate(1 / (rank + 1) for rank in range(VOCABULARY_SIZE)))
+
+
+async def seed(user, cards: int, communities: int, words: list[str], cum_weights: list[float]):
+    from api.db import engine, Community, UserCommunityTable, FlashCard, FlashCardSet, FlashCardSetCommunityTable
+
+    owner = await create_bench_user("owner@example.com")  # Sets are visible to the searching user through communities
+    community_ids = [uuid.uuid4() for _ in range(communities)]
+    set_ids = [uuid.uuid4() for _ in range(max(cards // CARDS_PER_SET, 1))]
+    async with engine.begin() as conn:
+        await conn.execute(Community.__table__.insert(), [
+            {"id": community_id, "name": f"Community {i}", "owner": user.id} for i, community_id in enumerate(community_ids)
+        ])
+        await conn.execute(UserCommunityTable.__table__.insert(), [
+            {"user_id": user.id, "community_id": community_id} for community_id in community_ids[:MEMBER_OF]
+        ])
+        await conn.execute(FlashCardSet.__table__.insert(), [
+            {"id": set_id, "user_id": owner.id, "name": f"Set {i}"} for i, set_id in enumerate(set_ids)
+        ])
+        await conn.execute(FlashCardSetCommunityTable.__table__.insert(), [
+            {"community_id": random.choice(community_ids), "flashcard_set_id": set_id} for set_id in set_ids
+        ])
+        for start in range(0, len(set_ids), BATCH_SIZE // CARDS_PER_SET):
+            await conn.execute(FlashCard.__table__.insert(), [
+                {
+                    "id": uuid.uuid4(), "flashcard_set_id": set_id,
+                    "question": " ".join(random.choices(words, cum_weights=cum_weights, k=WORDS_PER_SIDE)),
+                    "answer": " ".join(random.choices(words, cum_weights=cum_weights, k=WORDS_PER_SIDE)),
+                }
+                for set_id in set_ids[start:start + BATCH_SIZE // CARDS_PER_SET] for _ in range(CARDS_PER_SET)
+            ])
+
+
+async def like_scan(user_id, term: str, limit: int):
+    from sqlalchemy import select, or_
+    from api.db import async_session_maker, FlashCard, FlashCardSet
+    from api.search import visible_flashcard_sets
+
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(FlashCard.id).join(FlashCardSet, FlashCardSet.id == FlashCard.flashcard_set_id)
+            .where(or_(FlashCard.question.like(f"%{term}%"), FlashCard.answer.like(f"%{term}%")))
+            .where(visible_flashcard_sets(user_id)).limit(limit)
+        )
+        return result.all()
+
+
+async def timed(operation, runs: int) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        await operation()
+    return (time.perf_counter() - start) / runs * 1000
+
+
+async def main(cards: int, communities: int, runs: int):
+    from api.db import create_db_and_tables
+    from api.pagination import OffsetPageParams
+    from api.search import rebuild_search_index, search_flashcards
+
+    await create_db_and_tables()
+    user = await create_bench_user()
+    words, cum_weights = make_vocabulary()
+
+    start = time.perf_counter()
+    await seed(user, cards, communities, words, cum_weights)
+    print(f"Seeded {cards} cards in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    await rebuild_search_index()
+    print(f"Built the search index in {time.perf_counter() - start:.1f}s")
+
+    page = OffsetPageParams(20)
+    queries = {
+        "common word": words[0],
+        "mid-frequency word": words[500],
+        "rare word": words[-1],
+        "two words": f"{words[3]} {words[40]}",
+        "prefix": words[7][:-2],
+    }
+    print(f"{'query':<20} {'results':>8} {'search ms':>10} {'LIKE ms':>10}")
+    for name, query in queries.items():
+        results = await search_flashcards(user.id, query, page)
+        search_ms = await timed(lambda: search_flashcards(user.id, query, page), runs)
+        like_ms = await timed(lambda: like_scan(user.id, query.split()[0], page.limit), max(runs // 10, 1))
+        print(f"{name:<20} {len(results.items):>8} {search_ms:>10.2f} {like_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=1000000)
+    parser.add_argument("--communities", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    use_temp_database()
+    asyncio.run(main(args.cards, args.communities, args.runs))
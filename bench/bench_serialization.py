@@ -0,0 +1,76 @@
+# Serialization CPU and bytes on the wire for a large flashcard set: FastAPI's default JSON path (jsonable_encoder +
+# json.dumps) vs orjson, and uncompressed vs gzip/brotli responses, both in isolation and end to end through the app
+# Usage: python -m bench.bench_serialization [--cards 10000] [--runs 20]
+import argparse
+import asyncio
+import gzip
+import time
+import uuid
+
+from bench.common import use_temp_database, create_bench_user
+
+
+def cpu_ms(operation, runs: int) -> float:
+    start = time.process_time()
+    for _ in range(runs):
+        operation()
+    return (time.process_time() - start) / runs * 1000
+
+
+async def main(cards: int, runs: int):
+    import httpx
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from api import users
+    from api.auth import jwt_strategy
+    from api.compression import GZIP_LEVEL, BROTLI_QUALITY, brotli
+    from api.db import create_db_and_tables
+    from api.main import app
+
+    await create_db_and_tables()
+    user = await create_bench_user()
+    flashcards = [(f"What is the meaning of term number {i}?", f"Term {i} means something rather specific.")
+                  for i in range(cards)]
+    await users.upload_flashcard_set("Bench Deck", flashcards, user)
+    flashcard_set_id = uuid.UUID((await users.get_all_flashcard_sets_from_user(user)).items[0]["FlashCardSet"]["id"])
+    payload = await users.get_specified_flashcard_set(flashcard_set_id=flashcard_set_id)
+
+    body = ORJSONResponse(payload).body
+    print(f"{cards} cards, {len(body)} bytes of JSON")
+    print(f"{'serialization':<30} {'CPU ms':>8}")
+    print(f"{'jsonable_encoder + json':<30} {cpu_ms(lambda: JSONResponse(jsonable_encoder(payload)), runs):>8.2f}")
+    print(f"{'orjson':<30} {cpu_ms(lambda: ORJSONResponse(payload), runs):>8.2f}")
+
+    print(f"\n{'encoding':<30} {'bytes':>10} {'ratio':>6} {'CPU ms':>8}")
+    print(f"{'identity':<30} {len(body):>10} {1:>6.2f} {0:>8.2f}")
+    gzipped = gzip.compress(body, GZIP_LEVEL)
+    print(f"{f'gzip level {GZIP_LEVEL}':<30} {len(gzipped):>10} {len(gzipped) / len(body):>6.2f} "
+          f"{cpu_ms(lambda: gzip.compress(body, GZIP_LEVEL), runs):>8.2f}")
+    if brotli:
+        compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+        print(f"{f'brotli quality {BROTLI_QUALITY}':<30} {len(compressed):>10} {len(compressed) / len(body):>6.2f} "
+              f"{cpu_ms(lambda: brotli.compress(body, quality=BROTLI_QUALITY), runs):>8.2f}")
+    else:
+        print("brotli not installed (pip install brotli), skipped")
+
+    print(f"\n{'GET /flashcards/flashcard-sets/{id}':<30} {'wire bytes':>10} {'ms':>8}")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        client.headers["Authorization"] = f"Bearer {await jwt_strategy.write_token(user)}"
+        for accept_encoding in ["identity", "gzip"] + (["br"] if brotli else []):
+            headers = {"Accept-Encoding": accept_encoding}
+            response = await client.get(f"/flashcards/flashcard-sets/{flashcard_set_id}", headers=headers)
+            start = time.perf_counter()
+            for _ in range(runs):
+                await client.get(f"/flashcards/flashcard-sets/{flashcard_set_id}", headers=headers)
+            elapsed = (time.perf_counter() - start) / runs * 1000
+            print(f"{accept_encoding:<30} {response.num_bytes_downloaded:>10} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    use_temp_database()
+    asyncio.run(main(args.cards, args.runs))
@@ -0,0 +1,119 @@
+# Spaced repetition at 1M review states (users x cards they study): the due-cards query with and without the
+# (user_id, due_at) index, and recording a study session as one batch vs one request per review
+# Usage: python -m bench.bench_study [--users 100] [--cards 10000] [--lookups 200] [--reviews 500]
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from bench.bench_load import percentile
+from bench.bench_lookup_indexes import insert_rows, CARDS_PER_SET
+from bench.common import count_statements, use_temp_database
+
+DUE_INDEX = "ix_review_states_user_id_due_at"
+
+
+# Every user is a member of one community sharing all the sets, and has reviewed every card
+async def seed(users: int, cards: int) -> tuple[list[uuid.UUID], list[uuid.UUID]]:
+    from api.db import (
+        engine, Community, FlashCard, FlashCardSet, FlashCardSetCommunityTable, ReviewState, User, UserCommunityTable
+    )
+
+    rng = random.Random(0)
+    now = datetime.now(timezone.utc)
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    set_ids = [uuid.uuid4() for _ in range(max(cards // CARDS_PER_SET, 1))]
+    card_ids = [uuid.uuid4() for _ in range(len(set_ids) * CARDS_PER_SET)]
+    community_id = uuid.uuid4()
+
+    async with engine.begin() as conn:
+        await insert_rows(conn, User.__table__, [
+            {"id": user_id, "email": f"{user_id}@example.com", "hashed_password": "x", "is_active": True,
+             "is_superuser": False, "is_verified": False} for user_id in user_ids
+        ])
+        await insert_rows(conn, Community.__table__, [{"id": community_id, "name": "Bench", "owner": user_ids[0]}])
+        await insert_rows(conn, UserCommunityTable.__table__, [
+            {"user_id": user_id, "community_id": community_id} for user_id in user_ids
+        ])
+        await insert_rows(conn, FlashCardSet.__table__, [
+            {"id": set_id, "user_id": user_ids[0], "name": f"Set {i}"} for i, set_id in enumerate(set_ids)
+        ])
+        await insert_rows(conn, FlashCardSetCommunityTable.__table__, [
+            {"community_id": community_id, "flashcard_set_id": set_id} for set_id in set_ids
+        ])
+        await insert_rows(conn, FlashCard.__table__, [
+            {"id": card_id, "flashcard_set_id": set_ids[i // CARDS_PER_SET], "question": f"Question {i}",
+             "answer": f"Answer {i}"} for i, card_id in enumerate(card_ids)
+        ])
+        for user_id in user_ids:
+            await insert_rows(conn, ReviewState.__table__, [
+                {"user_id": user_id, "flashcard_id": card_id, "ease": rng.randint(1300, 3000),
+                 "interval": rng.randint(1, 120), "repetitions": rng.randint(1, 10), "lapses": rng.randint(0, 3),
+                 "due_at": now + timedelta(days=rng.uniform(-30, 90)), "reviewed_at": now - timedelta(days=1)}
+                for card_id in card_ids
+            ])
+    return user_ids, card_ids
+
+
+async def time_due_queries(user_ids: list[uuid.UUID], lookups: int) -> list[float]:
+    from api import study
+    from api.db import User
+
+    latencies = []
+    for user_id in random.choices(user_ids, k=lookups):
+        start = time.perf_counter()
+        await study.get_due_cards(User(id=user_id))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def print_latencies(name: str, latencies: list[float]):
+    print(f"{name:<36} {percentile(latencies, 50):>9.2f} {percentile(latencies, 95):>9.2f}")
+
+
+async def main(users: int, cards: int, lookups: int, reviews: int):
+    from sqlalchemy import func, select, text
+    from api import study
+    from api.db import async_session_maker, create_db_and_tables, engine, ReviewState, User
+
+    await create_db_and_tables()
+    start = time.perf_counter()
+    user_ids, card_ids = await seed(users, cards)
+    async with async_session_maker() as session:
+        states = (await session.execute(select(func.count()).select_from(ReviewState))).scalar_one()
+    print(f"Seeded {states} review states in {time.perf_counter() - start:.1f}s")
+
+    print(f"{'due cards (50 per request)':<36} {'p50 ms':>9} {'p95 ms':>9}")
+    print_latencies("with the (user_id, due_at) index", await time_due_queries(user_ids, lookups))
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP INDEX {DUE_INDEX}"))
+    print_latencies("without it", await time_due_queries(user_ids, lookups))
+    async with engine.begin() as conn:
+        await conn.execute(text(f"CREATE INDEX {DUE_INDEX} ON review_states (user_id, due_at)"))
+
+    user = User(id=user_ids[0])
+    session_reviews = [(card_id, random.randint(0, 5), None) for card_id in random.sample(card_ids, reviews)]
+
+    async def per_review():
+        for review in session_reviews:
+            await study.record_reviews(user, [review])
+
+    print(f"\n{'recording ' + str(reviews) + ' reviews':<36} {'seconds':>9} {'statements':>11}")
+    seconds, statements = await count_statements(per_review)
+    print(f"{'one request per review':<36} {seconds:>9.3f} {statements:>11}")
+    seconds, statements = await count_statements(lambda: study.record_reviews(user, session_reviews))
+    print(f"{'one batch':<36} {seconds:>9.3f} {statements:>11}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--cards", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--reviews", type=int, default=500)
+    args = parser.parse_args()
+
+    use_temp_database()
+    asyncio.run(main(args.users, args.cards, args.lookups, args.reviews))
@@ -0,0 +1,56 @@
+import atexit
+import os
+import re
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+# Points the API at a throwaway SQLite database and blob directory, must run before any api module is imported
+# Set BENCH_DATABASE_URL to benchmark against another database (e.g. a disposable Postgres) instead
+def use_temp_database() -> str:
+    directory = tempfile.mkdtemp(prefix="obsidian-communities-bench-")
+    atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    os.environ["DATABASE_URL"] = os.environ.get("BENCH_DATABASE_URL", f"sqlite+aiosqlite:///{directory}/bench.db")
+    os.environ["BLOB_STORAGE_DIR"] = os.path.join(directory, "blobs")
+    return directory
+
+
+async def create_bench_user(email: str = "bench@example.com"):
+    from api import users
+
+    await users.create_user(email, "password")
+    return (await users.get_user_by_email(email))[0]
+
+
+# SQL statements sent to the database while the block runs, through the engine's before_cursor_execute event
+# Shared by the benchmarks and the query count tests in tests/
+@contextmanager
+def record_statements():
+    from sqlalchemy import event
+    from api.db import engine
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+# Tables read or written by the statements
+def tables_in(statements: list[str]) -> set[str]:
+    return {table for statement in statements for table in re.findall(r'(?:FROM|JOIN|UPDATE)\s+"?(\w+)"?', statement)}
+
+
+# Runs the operation, returns its duration in seconds and the number of statements it sent
+async def count_statements(operation) -> tuple[float, int]:
+    with record_statements() as statements:
+        start = time.perf_counter()
+        await operation()
+        return time.perf_counter() - start, len(statements)
@@ -0,0 +1,158 @@
+# Seeds a database with a synthetic but realistically shaped dataset: users, communities with members, flashcard sets
+# (private and shared) with cards, and shared note groups backed by real blobs
+# Uses bulk inserts instead of the API so large datasets seed in seconds; the search index is rebuilt at the end
+# Usage: python -m bench.seed [--users 1000] [--communities 50] [--sets-per-user 5] [--cards-per-set 50]
+#                             [--groups-per-community 10] [--notes-per-group 20]
+# Seeds DATABASE_URL (BENCH_DATABASE_URL when set) - point it at a disposable database
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+
+BENCH_PASSWORD = "password"
+COMMUNITIES_PER_USER = 3
+NOTE_SIZES = (512, 4096, 32768)  # Mostly small markdown files, a few larger ones
+BATCH_SIZE = 10000
+
+
+@dataclass
+class SeedConfig:
+    users: int = 1000
+    communities: int = 50
+    sets_per_user: int = 5
+    cards_per_set: int = 50
+    groups_per_community: int = 10
+    notes_per_group: int = 20
+    seed: int = 0  # Random seed, so the same config always produces the same dataset
+
+
+@dataclass
+class Dataset:
+    emails: list[str] = field(default_factory=list)
+    user_ids: list[uuid.UUID] = field(default_factory=list)
+    community_ids: list[uuid.UUID] = field(default_factory=list)
+    memberships: dict[uuid.UUID, list[uuid.UUID]] = field(default_factory=dict)  # user id -> community ids
+    note_group_ids: dict[uuid.UUID, list[uuid.UUID]] = field(default_factory=dict)  # community id -> group ids
+
+
+async def insert_batched(conn, table, rows: list[dict]):
+    for start in range(0, len(rows), BATCH_SIZE):
+        await conn.execute(table.insert(), rows[start:start + BATCH_SIZE])
+
+
+def note_blobs(rng: random.Random, count: int) -> list[tuple[str, int]]:  # (content_hash, size)
+    from api.storage import blob_store
+
+    blobs = []
+    for i in range(count):
+        size = rng.choice(NOTE_SIZES)
+        line = f"# Note {i}\n\nSome text about topic {rng.randint(0, 10000)} for the benchmark.\n".encode()
+        data = (line * (size // len(line) + 1))[:size]
+        blobs.append((blob_store.put(data), size))
+    return blobs
+
+
+async def seed(config: SeedConfig) -> Dataset:
+    from fastapi_users.password import PasswordHelper
+    from api.db import (
+        engine, User, Community, UserCommunityTable, FlashCardSet, FlashCard, FlashCardSetCommunityTable,
+        SharedNoteGroupTable, Note
+    )
+    from api.search import rebuild_search_index
+
+    rng = random.Random(config.seed)
+    dataset = Dataset()
+    hashed_password = PasswordHelper().hash(BENCH_PASSWORD)  # Hashing is deliberately slow, share one hash
+
+    user_rows, community_rows, membership_rows = [], [], []
+    set_rows, card_rows, set_community_rows, group_rows, note_rows = [], [], [], [], []
+    for i in range(config.users):
+        user_id = uuid.UUID(int=rng.getrandbits(128))
+        dataset.emails.append(f"bench-{i}@example.com")
+        dataset.user_ids.append(user_id)
+        user_rows.append({"id": user_id, "email": dataset.emails[-1], "hashed_password": hashed_password,
+                          "is_active": True, "is_superuser": False, "is_verified": True})
+
+    for i in range(config.communities):
+        community_id = uuid.UUID(int=rng.getrandbits(128))
+        dataset.community_ids.append(community_id)
+        community_rows.append({"id": community_id, "name": f"Community {i}", "owner": rng.choice(dataset.user_ids)})
+
+    for user_id in dataset.user_ids:
+        communities = rng.sample(dataset.community_ids, min(COMMUNITIES_PER_USER, config.communities))
+        dataset.memberships[user_id] = communities
+        membership_rows += [{"user_id": user_id, "community_id": community_id} for community_id in communities]
+        for i in range(config.sets_per_user):
+            set_id = uuid.UUID(int=rng.getrandbits(128))
+            set_rows.append({"id": set_id, "user_id": user_id, "name": f"Deck {i}"})
+            if communities and rng.random() < 0.5:  # About half the sets are shared with one of the user's communities
+                set_community_rows.append({"community_id": rng.choice(communities), "flashcard_set_id": set_id})
+            card_rows += [
+                {"id": uuid.UUID(int=rng.getrandbits(128)), "user_id": user_id, "flashcard_set_id": set_id,
+                 "question": f"Question {j} about topic {rng.randint(0, 10000)}", "answer": f"Answer {j}"}
+                for j in range(config.cards_per_set)
+            ]
+
+    blobs = note_blobs(rng, max(config.notes_per_group, 1) * 4)
+    for community_id in dataset.community_ids:
+        dataset.note_group_ids[community_id] = []
+        for i in range(config.groups_per_community):
+            group_id = uuid.UUID(int=rng.getrandbits(128))
+            dataset.note_group_ids[community_id].append(group_id)
+            group_rows.append({"id": group_id, "community_id": community_id, "name": f"Vault {i}"})
+            for j in range(config.notes_per_group):
+                content_hash, size = rng.choice(blobs)
+                note_rows.append({"id": uuid.UUID(int=rng.getrandbits(128)), "shared_id": group_id,
+                                  "user_id": rng.choice(dataset.user_ids), "content_hash": content_hash, "size": size,
+                                  "mime_type": "text/markdown", "file_name": f"folder {j % 3}/note {j}.md"})
+
+    async with engine.begin() as conn:
+        for table, rows in (
+            (User.__table__, user_rows), (Community.__table__, community_rows),
+            (UserCommunityTable.__table__, membership_rows), (FlashCardSet.__table__, set_rows),
+            (FlashCard.__table__, card_rows), (FlashCardSetCommunityTable.__table__, set_community_rows),
+            (SharedNoteGroupTable.__table__, group_rows), (Note.__table__, note_rows),
+        ):
+            await insert_batched(conn, table, rows)
+    await rebuild_search_index()
+    return dataset
+
+
+async def main(config: SeedConfig):
+    from api.db import create_db_and_tables
+
+    await create_db_and_tables()
+    start = time.perf_counter()
+    dataset = await seed(config)
+    print(f"Seeded {len(dataset.user_ids)} users and {len(dataset.community_ids)} communities "
+          f"into {os.environ['DATABASE_URL']} in {time.perf_counter() - start:.1f}s")
+    print(f"Log in as {dataset.emails[0]} / {BENCH_PASSWORD}")
+
+
+def add_seed_arguments(parser: argparse.ArgumentParser):
+    defaults = SeedConfig()
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--communities", type=int, default=defaults.communities)
+    parser.add_argument("--sets-per-user", type=int, default=defaults.sets_per_user)
+    parser.add_argument("--cards-per-set", type=int, default=defaults.cards_per_set)
+    parser.add_argument("--groups-per-community", type=int, default=defaults.groups_per_community)
+    parser.add_argument("--notes-per-group", type=int, default=defaults.notes_per_group)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def seed_config(args: argparse.Namespace) -> SeedConfig:
+    return SeedConfig(args.users, args.communities, args.sets_per_user, args.cards_per_set,
+                      args.groups_per_community, args.notes_per_group, args.seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    add_seed_arguments(parser)
+    args = parser.parse_args()
+
+    if "BENCH_DATABASE_URL" in os.environ:
+        os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+    asyncio.run(main(seed_config(args)))
@@ -0,0 +1,78 @@
+import { user } from "./globals";
+
+export interface DashboardNoteGroup {
+    id: string;
+    name: string;
+    version: number;
+    note_count: number;
+}
+
+export interface DashboardFlashcardSet {
+    id: string;
+    name: string;
+    version: number;
+    card_count: number;
+    is_owner: boolean;
+}
+
+export interface DashboardCommunity {
+    id: string;
+    name: string;
+    description: string | null;
+    is_owner: boolean;
+    note_groups: Array<DashboardNoteGroup>;
+    flashcard_sets: Array<DashboardFlashcardSet>;
+}
+
+export interface Dashboard {
+    user: {
+        id: string;
+        email: string;
+        is_active: boolean;
+        is_verified: boolean;
+        is_superuser: boolean;
+    };
+    communities: Array<DashboardCommunity>;
+}
+
+// Paginated list routes return one page at a time, the next one is requested with the X-Next-Cursor of the last
+// until the header is absent
+export async function fetchAllPages<T>(url: string, token: string): Promise<Array<T>> {
+    let items: Array<T> = [];
+    let cursor: string | null = null;
+    do {
+        const pageUrl: string = cursor === null ? url : `${url}?cursor=${encodeURIComponent(cursor)}`;
+        const response = await fetch(pageUrl, {
+            method: "GET",
+            headers: {
+                'Authorization': `Bearer ${token}`
+            },
+        });
+        if (!response.ok) {
+            throw new Error(`Request to ${url} failed with status ${response.status}`);
+        }
+        const page = await response.json();
+        if (!Array.isArray(page)) {
+            throw new Error(`Request to ${url} failed: ${JSON.stringify(page)}`);
+        }
+        items = items.concat(page);
+        cursor = response.headers.get("X-Next-Cursor");
+    } while (cursor);
+    return items;
+}
+
+// The user, their communities and each community's note groups and flashcard sets in a single request
+export async function fetchDashboard(token: string): Promise<Dashboard> {
+    const response = await fetch(`http://127.0.0.1:8000/me/dashboard`, {
+        method: "GET",
+        headers: {
+            'Authorization': `Bearer ${token}`
+        },
+    });
+    if (!response.ok) {
+        throw new Error(`Dashboard request failed with status ${response.status}`);
+    }
+    const dashboard: Dashboard = await response.json();
+    user.id = dashboard.user.id;
+    return dashboard;
+}
@@ -2,6 +2,7 @@ import {Editor, MarkdownFileInfo, MarkdownView, Modal, Notice, Plugin, setIcon,
 import {SerializedFlashcardSet} from "./settings";
 import Communities from "./main";
 import {user} from "./globals";
+import {fetchAllPages} from "./dashboard";
 import {FlashcardWriteGame, VIEW_TYPE_FLASHCARD_WRITE_GAME} from "./flashcard-games/write";
 
 export class FlashcardSet {
@@ -183,12 +184,8 @@ class FlashcardsShareModal extends Modal {
             return;
         }
         this.setContent("Retrieving your communities...");
-        fetch(`http://127.0.0.1:8000/communities/user/${user.id}`, {
-            method: "GET",
-            headers: {
-                'Authorization': `Bearer ${user.token}`
-            },
-        }).then(res => res.json()).then((communities) => {
+        fetchAllPages<{id: string, name: string}>(`http://127.0.0.1:8000/communities/user/${user.id}`, user.token)
+        .then((communities) => {
             this.render(communities);
         }).catch((err) => {
             this.setContent("Failed to retrieve your communities. Please try again later.");
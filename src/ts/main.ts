@@ -4,6 +4,7 @@ import Flashcards from "./flashcards";
 import JSZip from "jszip";
 import CommunitiesSettings, {DEFAULT_SETTINGS} from "./settings";
 import { user } from "./globals";
+import { fetchDashboard, DashboardCommunity, DashboardNoteGroup, DashboardFlashcardSet } from "./dashboard";
 // Hub, VIEW_TYPE_HUB;
 
 let accessToken: string = "";
@@ -324,10 +325,7 @@ class Hub extends ItemView {
 }
 
 class ContentView extends ItemView {
-    listOfCommunities:Array<{
-            id: string,
-            name: string
-    }> = [];
+    listOfCommunities:Array<DashboardCommunity> = [];
 
     userId: string;
 
@@ -368,25 +366,11 @@ class ContentView extends ItemView {
         container.createEl('h2', { text: 'Your Communities' });
         const listContainer = container.createEl('ul');
 
-        // Fetch user ID and community data
+        // Fetch user ID and community data (note groups and flashcard sets included) in one request
         try {
-            const userResponse = await fetch(`http://127.0.0.1:8000/users/me`, {
-                method: "GET",
-                headers: {
-                    'Authorization': `Bearer ${Communities.getInstance().getAccToken()}`
-                },
-            });
-            const userData = await userResponse.json();
-            this.userId = userData["id"];
-
-            const communitiesResponse = await fetch(`http://127.0.0.1:8000/communities/user/${this.userId}`, {
-                method: "GET",
-                headers: {
-                    'Authorization': `Bearer ${Communities.getInstance().getAccToken()}`
-                },
-            });
-            const communitiesData = await communitiesResponse.json();
-            this.listOfCommunities = communitiesData;
+            const dashboard = await fetchDashboard(Communities.getInstance().getAccToken());
+            this.userId = dashboard.user.id;
+            this.listOfCommunities = dashboard.communities;
 
             if(this.listOfCommunities.length == 0) {
                 return;
@@ -395,7 +379,7 @@ class ContentView extends ItemView {
             this.listOfCommunities.forEach(community => {
                 const listItem = listContainer.createEl('li');
                 listItem.createEl('button', { text: community.name }).addEventListener("click", () => {
-                    new DownloadNoteGroupModal(Communities.getInstance().app, community.id).open();
+                    new DownloadNoteGroupModal(Communities.getInstance().app, community).open();
                 });
             });
         } catch (error) {
@@ -508,13 +492,7 @@ class ContentView extends ItemView {
 
             this.userId = data["id"];
 
-            fetch(`http://127.0.0.1:8000/communities/user/${this.userId}`, {
-                    method: "GET",
-                    headers: {
-                        'Authorization': `Bearer ${Communities.getInstance().getAccToken()}`
-                    },
-                })
-                .then(res => res.json())
+            fetchAllPages(`http://127.0.0.1:8000/communities/user/${this.userId}`, Communities.getInstance().getAccToken())
                 .then(data => {console.log(data)
 
                 this.listOfCommunities = data;
@@ -562,10 +540,7 @@ class ShareNoteGroupModal extends Modal {
     userId: string;
     communityId: string;
     noteGroupName: string;
-    listOfCommunities:Array<{
-        id: string,
-        name: string
-    }> = [];
+    listOfCommunities:Array<DashboardCommunity> = [];
     fieldsEl: HTMLElement;
 
     constructor(app: App) {
@@ -576,59 +551,45 @@ class ShareNoteGroupModal extends Modal {
             return;
         }
 
-        fetch(`http://127.0.0.1:8000/users/me`, {
-                method: "GET",
-                headers: {
-                    'Authorization': `Bearer ${Communities.getInstance().getAccToken()}`
-                },
-            })
-            .then(res => res.json())
-            .then(data => {
-                console.log(data)
-                this.userId = data["id"];
-
-                fetch(`http://127.0.0.1:8000/communities/user/${this.userId}`, {
-                    method: "GET",
-                    headers: {
-                        'Authorization': `Bearer ${Communities.getInstance().getAccToken()}`
-                    },
-                })
-                .then(res => res.json())
-                .then(data => {console.log(data)
+        fetchDashboard(Communities.getInstance().getAccToken())
+            .then(dashboard => {
+                this.userId = dashboard.user.id;
+                this.listOfCommunities = dashboard.communities;
+                if(this.listOfCommunities.length == 0) {
+                    this.setContent("Join a community to share notes");
+                    return;
+                }
+                this.communityId = this.listOfCommunities[0].id;
 
-                    this.listOfCommunities = data;
-                    this.communityId = data[0].id;
+                this.fieldsEl = this.contentEl.createEl('div', { cls: 'fields' });
 
-                    this.fieldsEl = this.contentEl.createEl('div', { cls: 'fields' });
+                new Setting(this.fieldsEl)
+                    .setName('Select Community:')
+                    .addDropdown((dropdown) => {
+                        for(const community of this.listOfCommunities) {
+                            dropdown.addOption(community.id, community.name);
+                        }
+                        dropdown.onChange((value) => this.communityId = value)
+                    })
 
-                    new Setting(this.fieldsEl)
-                        .setName('Select Community:')
-                        .addDropdown((dropdown) => {
-                            for(const community of this.listOfCommunities) {
-                                dropdown.addOption(community.id, community.name);
-                            }
-                            dropdown.onChange((value) => this.communityId = value)
+                new Setting(this.fieldsEl)
+                    .setName('Name of Note Group:')
+                    .addText((text) => {
+                        text.onChange((value) => {
+                            this.noteGroupName = value;
                         })
+                    })
 
-                    new Setting(this.fieldsEl)
-                        .setName('Name of Note Group:')
-                        .addText((text) => {
-                            text.onChange((value) => {
-                                this.noteGroupName = value;
+                new Setting(this.contentEl)
+                    .addButton((btn) =>
+                        btn
+                            .setButtonText('Submit')
+                            .setCta()
+                            .onClick(() => {
+                                this.onSubmit();
                             })
-                        })
-
-                    new Setting(this.contentEl)
-                        .addButton((btn) =>
-                            btn
-                                .setButtonText('Submit')
-                                .setCta()
-                                .onClick(() => {
-                                    this.onSubmit();
-                                })
-                        );
-                    });
-        });
+                    );
+            });
     }
 
     async onSubmit() {
@@ -687,21 +648,14 @@ class DownloadNoteGroupModal extends Modal {
     //noteGroupName: string;
     noteGroupId: string;
     flashCardSetId: string;
-    listOfGroups:Array<{
-        id: string,
-        name: string
-    }> = [];
-    listOfFlashcardSets:Array<{
-        FlashCardSet: {
-            id: string,
-            name: string
-        },
-    }> = [];
+    listOfGroups:Array<DashboardNoteGroup> = [];
+    listOfFlashcardSets:Array<DashboardFlashcardSet> = [];
     fieldsEl: HTMLElement;
 
-    constructor(app: App, commId: string) {
+    // The community summary from the dashboard already lists its note groups and flashcard sets
+    constructor(app: App, community: DashboardCommunity) {
         super(app);
-        this.communityId = commId;
+        this.communityId = community.id;
         this.setTitle("Download Contents: ");
         if (user.id === "") {
             this.setContent("Please login to download shared notes");
@@ -719,84 +673,62 @@ class DownloadNoteGroupModal extends Modal {
                             })
                     );
 
-        fetch(`http://127.0.0.1:8000/community/${this.communityId}/shared-notes`, {
-            method: "GET",
-            headers: {
-                'Authorization': `Bearer ${Communities.getInstance().getAccToken()}`
-            },
-        })
-        .then(res => res.json())
-        .then(data => {console.log(data)
-
-            this.listOfGroups = data;
-            //this.noteGroupName = data[0].name;
-            if(data.length == 0) {
-                this.contentEl.createEl("span", { text: "No Note Groups Found" });
-                this.contentEl.createEl("br");
-            } else {
-                this.noteGroupId = data[0].id;
+        this.listOfGroups = community.note_groups;
+        if(this.listOfGroups.length == 0) {
+            this.contentEl.createEl("span", { text: "No Note Groups Found" });
+            this.contentEl.createEl("br");
+        } else {
+            this.noteGroupId = this.listOfGroups[0].id;
 
-                this.fieldsEl = this.contentEl.createEl('div', { cls: 'fields' });
+            this.fieldsEl = this.contentEl.createEl('div', { cls: 'fields' });
 
-                new Setting(this.fieldsEl)
-                    .setName('Select Note Group:')
-                    .addDropdown((dropdown) => {
-                        for(const group of this.listOfGroups) {
-                            dropdown.addOption(group.id, group.name);
-                        }
-                        dropdown.onChange((value) => this.noteGroupId = value)
-                    })
-
-                new Setting(this.contentEl)
-                    .addButton((btn) =>
-                        btn
-                            .setButtonText('Download')
-                            .setCta()
-                            .onClick(() => {
-                                this.onNoteGroupSubmit();
-                            })
-                    );
-            }
-        });
+            new Setting(this.fieldsEl)
+                .setName('Select Note Group:')
+                .addDropdown((dropdown) => {
+                    for(const group of this.listOfGroups) {
+                        dropdown.addOption(group.id, `${group.name} (${group.note_count} notes)`);
+                    }
+                    dropdown.onChange((value) => this.noteGroupId = value)
+                })
 
-        fetch(`http://127.0.0.1:8000/communities/${this.communityId}/flashcard-sets`, {
-            method: "GET",
-            headers: {
-                'Authorization': `Bearer ${Communities.getInstance().getAccToken()}`
-            },
-        })
-        .then(res => res.json())
-        .then(data => {console.log(data)
+            new Setting(this.contentEl)
+                .addButton((btn) =>
+                    btn
+                        .setButtonText('Download')
+                        .setCta()
+                        .onClick(() => {
+                            this.onNoteGroupSubmit();
+                        })
+                );
+        }
 
-            this.listOfFlashcardSets = data;
-            //this.noteGroupName = data[0].name;
-            if(data.length == 0) {
-                this.contentEl.createEl("span", { text: "No Flash Card Sets Found" });
-            } else {
-                this.flashCardSetId = data[0]["FlashCardSet"].id;
+        this.listOfFlashcardSets = community.flashcard_sets;
+        if(this.listOfFlashcardSets.length == 0) {
+            this.contentEl.createEl("span", { text: "No Flash Card Sets Found" });
+        } else {
+            this.flashCardSetId = this.listOfFlashcardSets[0].id;
 
-                this.fieldsEl = this.contentEl.createEl('div', { cls: 'fields' });
+            this.fieldsEl = this.contentEl.createEl('div', { cls: 'fields' });
 
-                new Setting(this.fieldsEl)
-                    .setName('Select Flash Card Set:')
-                    .addDropdown((dropdown) => {
-                        for(const set of this.listOfFlashcardSets) {
-                            dropdown.addOption(set["FlashCardSet"].id, set["FlashCardSet"].name);
-                        }
-                        dropdown.onChange((value) => this.flashCardSetId = value)
-                    })
+            new Setting(this.fieldsEl)
+                .setName('Select Flash Card Set:')
+                .addDropdown((dropdown) => {
+                    for(const set of this.listOfFlashcardSets) {
+                        dropdown.addOption(set.id, `${set.name} (${set.card_count} cards)`);
+                    }
+                    dropdown.onChange((value) => this.flashCardSetId = value)
+                })
 
-                new Setting(this.contentEl)
-                    .addButton((btn) =>
-                        btn
-                            .setButtonText('Download')
-                            .setCta()
-                            .onClick(() => {
-                                this.onFlashCardSetSubmit();
-                            })
-                    );
-            }
-        });
+            new Setting(this.contentEl)
+                .addButton((btn) =>
+                    btn
+                        .setButtonText('Download')
+                        .setCta()
+                        .onClick(() => {
+                            this.onFlashCardSetSubmit();
+                        })
+                );
+        }
     }
 
     async onFlashCardSetSubmit() {
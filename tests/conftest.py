@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The API reads its database settings on import, so the tests point it at a throwaway database first
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.common import use_temp_database
+
+use_temp_database()
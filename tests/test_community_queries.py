@@ -0,0 +1,81 @@
+import asyncio
+import uuid
+
+from api import users
+from api.cache import cache
+from api.db import (
+    async_session_maker, create_db_and_tables, engine, Community, FlashCardSet, FlashCardSetCommunityTable, User,
+    UserCommunityTable
+)
+from bench.common import create_bench_user, record_statements, tables_in
+
+MEMBERS = 20
+SETS = 5
+
+
+# A community with members and shared flashcard sets, which a fetch or access check must not load
+async def seed_community(owner: User) -> uuid.UUID:
+    community_id = (await users.create_community(f"Community {uuid.uuid4()}", owner))["Community Created"]
+    user_ids = [uuid.uuid4() for _ in range(MEMBERS)]
+    set_ids = [uuid.uuid4() for _ in range(SETS)]
+    async with engine.begin() as conn:
+        await conn.execute(User.__table__.insert(), [
+            {"id": user_id, "email": f"{user_id}@example.com", "hashed_password": "x", "is_active": True,
+             "is_superuser": False, "is_verified": False} for user_id in user_ids
+        ])
+        await conn.execute(UserCommunityTable.__table__.insert(), [
+            {"user_id": user_id, "community_id": community_id} for user_id in user_ids
+        ])
+        await conn.execute(FlashCardSet.__table__.insert(), [
+            {"id": set_id, "user_id": owner.id, "name": f"Set {i}"} for i, set_id in enumerate(set_ids)
+        ])
+        await conn.execute(FlashCardSetCommunityTable.__table__.insert(), [
+            {"community_id": community_id, "flashcard_set_id": set_id} for set_id in set_ids
+        ])
+    return community_id
+
+
+def run(test):
+    async def with_community():
+        await create_db_and_tables()
+        owner = await create_bench_user(f"owner-{uuid.uuid4()}@example.com")
+        await cache.clear()
+        try:
+            await test(owner, await seed_community(owner))
+        finally:
+            await engine.dispose()  # Pooled connections belong to this event loop
+    asyncio.run(with_community())
+
+
+# Relationships are lazy="raise": fetching a community must not load its members or flashcard sets
+def test_community_fetch_reads_only_the_community_row():
+    async def test(owner, community_id):
+        with record_statements() as statements:
+            async with async_session_maker() as session:
+                await session.get(Community, community_id)
+        assert len(statements) == 1
+        assert tables_in(statements) == {"communities"}
+
+    run(test)
+
+
+# The single access check query reads the community's owner and joins the user's membership row, nothing else
+def test_cold_access_check_is_one_query():
+    async def test(owner, community_id):
+        with record_statements() as statements:
+            assert await users.is_community_owner(owner, community_id)
+        assert len(statements) == 1
+        assert tables_in(statements) == {"communities", "user_communities_table"}
+
+    run(test)
+
+
+def test_warm_access_checks_skip_the_database():
+    async def test(owner, community_id):
+        await users.is_community_owner(owner, community_id)
+        with record_statements() as statements:
+            assert await users.is_community_owner(owner, community_id)
+            assert await users.is_community_member(owner.id, community_id)
+        assert statements == []
+
+    run(test)
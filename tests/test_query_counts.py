@@ -0,0 +1,59 @@
+import asyncio
+
+import httpx
+import pytest
+
+from api import auth
+from api.db import create_db_and_tables, engine
+from api.main import app
+from bench.common import count_statements
+
+# SQL statements per request of the listing routes, which must not grow with the number of rows listed
+# (related rows are loaded with one IN-list query per relationship, never one query per listed row)
+# Requests are counted warm: the membership check is cached and the token revocations are already loaded
+EXPECTED_STATEMENTS = {
+    "communities of a user": 1,
+    "flashcard sets of a user": 3,  # The sets, their owners' emails, their cards
+    "flashcard sets of a community": 3,
+}
+
+
+async def log_in(client: httpx.AsyncClient, email: str) -> str:
+    await client.post("/auth/register", json={"email": email, "password": "password"})
+    login = await client.post("/auth/jwt/login", data={"username": email, "password": "password"})
+    client.headers["Authorization"] = f"Bearer {login.json()['access_token']}"
+    return (await client.get("/me/dashboard")).json()["user"]["id"]
+
+
+# A user owning `listed` communities, with `listed` two-card sets shared to the first one
+async def listing_statements(listed: int) -> dict[str, int]:
+    await create_db_and_tables()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        user_id = await log_in(client, f"listing-{listed}@example.com")
+        community_ids = [(await client.post(f"/communities/create/Community {listed}-{i}")).json()
+                         ["community_id"]["Community Created"] for i in range(listed)]
+        for i in range(listed):
+            await client.post(f"/flashcards/upload/community/Set {i}/{community_ids[0]}",
+                              json={"flashcards": [["Question 1", "Answer 1"], ["Question 2", "Answer 2"]]})
+
+        urls = {
+            "communities of a user": f"/communities/user/{user_id}",
+            "flashcard sets of a user": f"/flashcards/flashcard-sets/user/{user_id}",
+            "flashcard sets of a community": f"/communities/{community_ids[0]}/flashcard-sets",
+        }
+        statements = {}
+        for name, url in urls.items():
+            assert len((await client.get(url)).json()) == listed
+
+            async def request():
+                assert (await client.get(url)).status_code == 200
+
+            statements[name] = (await count_statements(request))[1]
+    await engine.dispose()  # Pooled connections belong to this event loop
+    return statements
+
+
+@pytest.mark.parametrize("listed", [1, 10])
+def test_listing_statement_counts(listed, monkeypatch):
+    monkeypatch.setattr(auth, "REVOCATION_REFRESH_SECONDS", float("inf"))
+    assert asyncio.run(listing_statements(listed)) == EXPECTED_STATEMENTS